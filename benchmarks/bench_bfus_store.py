@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""BFUS-store: bygga katalog, indexsök (exakt/prefix), filterskanning, avtal."""
+
+from __future__ import annotations
+
+import random
+from itertools import islice
+
+from harness import benchmark
+
+from bfus_store import BFUSStore, ServiceCatalog
+
+SEED = 1234
+ROWS = 100_000
+
+
+def _rows(n: int):
+    rnd = random.Random(SEED)
+    regions = ["Region A", "Region B", "Region C"]
+    statuses = ["Aktiv", "Planerad", "Avslutad"]
+    return [
+        ("Ny anläggning", str(100000 + i), "Exempelrad", f"{rnd.randrange(10**16):016d}",
+         rnd.choice(regions), rnd.choice(statuses), "2025-01-10")
+        for i in range(n)
+    ]
+
+
+_catalog = None
+
+
+def _cat() -> ServiceCatalog:
+    global _catalog
+    if _catalog is None:
+        _catalog = ServiceCatalog(_rows(ROWS))
+    return _catalog
+
+
+@benchmark("bfus_catalog.build[100k]", number=1, repeat=3, items=ROWS)
+def _():
+    rows = _rows(ROWS)
+    return lambda: ServiceCatalog(rows)
+
+
+@benchmark("bfus_catalog.search[exact]", number=5000)
+def _():
+    cat = _cat()
+    return lambda: list(cat.search(tjanstenr="145323", exact=True))
+
+
+@benchmark("bfus_catalog.search[prefix,first_page]", number=2000)
+def _():
+    cat = _cat()
+    return lambda: next(cat.search(tjanstenr="14").pages(200), None)
+
+
+@benchmark("bfus_catalog.search[filter_scan,first_page]", number=200)
+def _():
+    cat = _cat()
+    return lambda: list(islice(cat.search(tjanstestatus="Avslutad", affarsenhet="Region C").row_ids(), 200))
+
+
+@benchmark("bfus_store.create_agreement", number=20000)
+def _():
+    store = BFUSStore()
+    data = {"kundnr": "K-000001", "produkt": "Produkt 1", "kundref": "445323"}
+    return lambda: store.create_agreement(data)
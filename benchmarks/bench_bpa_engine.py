@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""BPA-motorn headless: ett ärende, en batch ärenden, validering och regeluppslag."""
+
+from __future__ import annotations
+
+import random
+
+from harness import Skip, benchmark
+
+from bpa_demo_v2 import AGREEMENT_RULES, BPAEngine, ElsmartSource, HeadlessBFUS, HeadlessLime
+from bpa_rules import DecisionTable
+from elsmart_validation import luhn_check_digit
+
+SEED = 1234
+BATCH = 1000
+
+
+def _cases(n: int):
+    rnd = random.Random(SEED)
+    return [
+        {
+            "case_id": f"L-{i:07d}",
+            "ref_nr": f"E-{rnd.randrange(10000):04d}-{rnd.randrange(100):02d}",
+            "tjanstenr": str(100000 + i),
+            "kundnr": f"K-{rnd.randrange(10**6):06d}",
+        }
+        for i in range(n)
+    ]
+
+
+def _engine() -> BPAEngine:
+    return BPAEngine(HeadlessLime(), ElsmartSource(), HeadlessBFUS(), log=lambda s: None)
+
+
+def _run_case(engine: BPAEngine, case):
+    engine.lime.api_load_case(case)
+    engine.reset()
+    for step in engine.steps():
+        step.action()
+
+
+@benchmark("bpa_engine[per_case]", number=200)
+def _():
+    engine = _engine()
+    case = _cases(1)[0]
+    return lambda: _run_case(engine, case)
+
+
+@benchmark("bpa_engine[batch]", number=1, repeat=5, items=BATCH)
+def _():
+    engine = _engine()
+    cases = _cases(BATCH)
+
+    def run():
+        for case in cases:
+            _run_case(engine, case)
+        engine.bfus.api_reset()
+    return run
+
+
+@benchmark("bpa_engine[run_batch]", number=1, repeat=5, items=BATCH)
+def _():
+    engine = _engine()
+    cases = _cases(BATCH)
+
+    def run():
+        for _ in engine.run_batch(cases):
+            pass
+        engine.bfus.api_reset()
+    return run
+
+
+@benchmark("decision_table.lookup", number=20000)
+def _():
+    table = DecisionTable(AGREEMENT_RULES, keys=("kommun", "saking", "kundtyp"))
+    return lambda: table.lookup(kommun="ESKILSTUNA", saking="16A", kundtyp="Fastighetstyp")
+
+
+@benchmark("validate_batch[100k]", number=1, repeat=5, items=100_000)
+def _():
+    try:
+        from elsmart_validation import validate_batch
+        import numpy  # noqa: F401
+    except ImportError:
+        raise Skip("numpy saknas")
+    rnd = random.Random(SEED)
+    payloads = []
+    for _ in range(100_000):
+        body = "".join(rnd.choice("0123456789") for _ in range(15))
+        payloads.append({
+            "anlaggnings_id": body + luhn_check_digit(body),
+            "ref_nr": "E-0000-00",
+            "matarnr": "00000000000000",
+            "saking": rnd.choice(["16A", "20A", "25A", "—"]),
+        })
+    return lambda: validate_batch(payloads)
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Skärmfångst (rpa_capture) – konvertering och, med skärm, riktiga grabs.
+
+convert[*] mäter bara kopiorna efter fångsten på en syntetisk 1920x1080-bild:
+gamla vägen (np.array på RGB-bilden + cvtColor till ny array) mot BGRA → BGR
+in i en återanvänd buffert, för hela skärmen och för en verifieringsruta.
+grab[*] kräver DISPLAY (och mss för mss-varianterna).
+"""
+
+from __future__ import annotations
+
+import os
+
+from harness import Skip, benchmark
+
+W, H = 1920, 1080
+REGION = (900, 500, 130, 60)  # ungefär layoutcachens ruta runt en knapp
+
+
+def _cv():
+    try:
+        import cv2
+        import numpy as np
+    except ImportError:
+        raise Skip("opencv/numpy saknas")
+    return cv2, np
+
+
+def _frames():
+    cv2, np = _cv()
+    rng = np.random.default_rng(1234)
+    rgb = rng.integers(0, 256, size=(H, W, 3), dtype=np.uint8)
+    bgra = cv2.cvtColor(rgb, cv2.COLOR_RGB2BGRA)
+    return rgb, bgra
+
+
+@benchmark("capture.convert[old_full]", number=20)
+def _():
+    cv2, np = _cv()
+    rgb, _ = _frames()
+    return lambda: cv2.cvtColor(np.array(rgb), cv2.COLOR_RGB2BGR)
+
+
+@benchmark("capture.convert[prealloc_full]", number=20)
+def _():
+    cv2, np = _cv()
+    _, bgra = _frames()
+    out = np.empty((H, W, 3), dtype=np.uint8)
+    return lambda: cv2.cvtColor(bgra, cv2.COLOR_BGRA2BGR, dst=out)
+
+
+@benchmark("capture.convert[prealloc_region]", number=2000)
+def _():
+    cv2, np = _cv()
+    _, bgra = _frames()
+    x, y, w, h = REGION
+    raw = bgra[y:y+h, x:x+w].copy()  # mss levererar bara rutan
+    out = np.empty((h, w, 3), dtype=np.uint8)
+    return lambda: cv2.cvtColor(raw, cv2.COLOR_BGRA2BGR, dst=out)
+
+
+def _backend(name: str):
+    _cv()
+    if not os.environ.get("DISPLAY"):
+        raise Skip("ingen DISPLAY")
+    from rpa_capture import open_capture
+    try:
+        return open_capture(name)
+    except Exception as e:
+        raise Skip(str(e))
+
+
+@benchmark("capture.grab[pil_full]", number=5)
+def _():
+    cap = _backend("pil")
+    return lambda: cap.grab()
+
+
+@benchmark("capture.grab[mss_full]", number=20)
+def _():
+    cap = _backend("mss")
+    return lambda: cap.grab()
+
+
+@benchmark("capture.grab[mss_region]", number=500)
+def _():
+    cap = _backend("mss")
+    return lambda: cap.grab(REGION)
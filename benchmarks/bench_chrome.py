@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+Elsmart i Chrome (rpa_browser): tid tills sidan är läsbar – driver.get plus
+väntan på div.kv__row, som i read_elsmart – med de gamla inställningarna
+("default") mot prestandaprofilen ("fast").
+
+page_ready[*] återanvänder en Chrome (batchläget); cold_start[*] mäter start +
+första sidan + quit (en körning med --run). read_many[N] läser READ_MANY_URLS
+sidor med read_elsmart_many och N samtidiga Chrome (fast-profilen).
+
+Sidan serveras från repo-roten av en lokal http.server. Kräver selenium och
+Chrome/chromedriver; "default" kräver dessutom DISPLAY (synligt fönster).
+"""
+
+from __future__ import annotations
+
+import atexit
+import functools
+import http.server
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from harness import ROOT, Skip, benchmark
+
+READY_TIMEOUT = 10.0
+READ_MANY_URLS = 12
+
+
+@functools.lru_cache(maxsize=None)
+def _server_url() -> str:
+    handler = functools.partial(_QuietHandler, directory=str(ROOT))
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    atexit.register(httpd.shutdown)
+    return f"http://127.0.0.1:{httpd.server_address[1]}/index.html"
+
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def _browser():
+    try:
+        import rpa_browser
+        from selenium.webdriver.common.by import By
+    except ImportError:
+        raise Skip("selenium saknas")
+    if rpa_browser.webdriver is None:
+        raise Skip("selenium saknas")
+    return rpa_browser, By
+
+
+def _start(profile: str, user_data_dir: Path):
+    rpa_browser, _ = _browser()
+    if profile == "default" and not os.environ.get("DISPLAY"):
+        raise Skip("ingen DISPLAY (default-profilen har synligt fönster)")
+    try:
+        return rpa_browser.new_driver(profile, user_data_dir=user_data_dir)
+    except Exception as e:
+        raise Skip(f"Chrome startar inte: {e}".splitlines()[0])
+
+
+def _load(driver, url: str, By):
+    driver.get(url)
+    end = time.perf_counter() + READY_TIMEOUT
+    while not driver.find_elements(By.CSS_SELECTOR, "div.kv__row"):
+        if time.perf_counter() > end:
+            raise TimeoutError("kv__row syns inte")
+
+
+def _page_ready(profile: str):
+    _, By = _browser()
+    driver = _start(profile, Path(tempfile.mkdtemp(prefix=f"bench_chrome_{profile}_")))
+    atexit.register(driver.quit)
+    url = _server_url()
+    return lambda: _load(driver, url, By)
+
+
+def _cold_start(profile: str):
+    rpa_browser, By = _browser()
+    _start(profile, Path(tempfile.mkdtemp(prefix="bench_chrome_probe_"))).quit()  # Skip om Chrome saknas
+    data_dir = Path(tempfile.mkdtemp(prefix=f"bench_chrome_{profile}_"))  # beständig mellan varven
+    url = _server_url()
+
+    def run():
+        driver = rpa_browser.new_driver(profile, user_data_dir=data_dir)
+        try:
+            _load(driver, url, By)
+        finally:
+            driver.quit()
+    return run
+
+
+@benchmark("elsmart_chrome.page_ready[default]", number=10)
+def _():
+    return _page_ready("default")
+
+
+@benchmark("elsmart_chrome.page_ready[fast]", number=10)
+def _():
+    return _page_ready("fast")
+
+
+@benchmark("elsmart_chrome.cold_start[default]", number=1, repeat=3)
+def _():
+    return _cold_start("default")
+
+
+@benchmark("elsmart_chrome.cold_start[fast]", number=1, repeat=3)
+def _():
+    return _cold_start("fast")
+
+
+def _read_many(concurrency: int):
+    rpa_browser, _ = _browser()
+    _start("fast", Path(tempfile.mkdtemp(prefix="bench_chrome_probe_"))).quit()  # Skip om Chrome saknas
+    import rpa_robot_with_start_button_v2 as robot
+
+    pool = rpa_browser.DriverPool(concurrency, "fast")
+    atexit.register(pool.close)
+    urls = [f"{_server_url()}?case={i}" for i in range(READ_MANY_URLS)]
+
+    def run():
+        for _, url, payload in robot.read_elsmart_many(urls, concurrency, pool):
+            if isinstance(payload, Exception):
+                raise payload
+    return run
+
+
+@benchmark("elsmart_chrome.read_many[1]", number=1, repeat=3, items=READ_MANY_URLS)
+def _():
+    return _read_many(1)
+
+
+@benchmark("elsmart_chrome.read_many[4]", number=1, repeat=3, items=READ_MANY_URLS)
+def _():
+    return _read_many(4)
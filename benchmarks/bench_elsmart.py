@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""Elsmart: parsning av index.html (liten) och en syntetisk stor sida."""
+
+from __future__ import annotations
+
+import re
+import tempfile
+from pathlib import Path
+
+from harness import ROOT, benchmark
+
+from bpa_demo_v2 import ELSMART_HTML, ElsmartSource, parse_elsmart_html
+
+LARGE_ROWS = 5000
+
+
+def _large_page() -> Path:
+    """index.html med kv-raderna upprepade tills sidan har ~LARGE_ROWS rader."""
+    html = ELSMART_HTML.read_text(encoding="utf-8")
+    rows = re.findall(r'<div class="kv__row">.*?</div>', html, flags=re.S)
+    body = "\n".join(
+        rows[i % len(rows)].replace("</dt>", f" {i}</dt>", 1) for i in range(LARGE_ROWS)
+    )
+    big = html.replace("</section>", f'<dl class="kv">{body}</dl></section>', 1)
+    path = Path(tempfile.mkdtemp(prefix="bench_elsmart_")) / "large.html"
+    path.write_text(big, encoding="utf-8")
+    return path
+
+
+@benchmark("parse_elsmart_html[small]", number=200)
+def _():
+    return lambda: parse_elsmart_html(ELSMART_HTML)
+
+
+@benchmark("parse_elsmart_html[large]", number=5, items=LARGE_ROWS)
+def _():
+    path = _large_page()
+    return lambda: parse_elsmart_html(path)
+
+
+@benchmark("elsmart_source.api_get_payload[unchanged]", number=2000)
+def _():
+    src = ElsmartSource(ROOT / "index.html")
+    return src.api_get_payload
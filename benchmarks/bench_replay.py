@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+RPA-flöden mot inspelade skärmbilder (rpa_replay).
+
+Spela in med rpa_robot_with_start_button_v2.py --record benchmarks/recordings/<namn>
+--run; första inspelningen (i namnordning) används. recordings/synthetic/ är
+en liten syntetisk inspelning (make_recording.py) som finns med i repot.
+Pauser hoppas över, så tiden är template matching + beskärning för hela flödet.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+from harness import Skip, benchmark
+
+HERE = Path(__file__).resolve().parent
+RECORDINGS = HERE / "recordings"
+
+
+def _replay():
+    try:
+        import cv2  # noqa: F401
+        from rpa_replay import Replay
+    except ImportError as e:
+        raise Skip(f"saknas: {e.name}")
+    recs = sorted(p for p in RECORDINGS.glob("*") if (p / "session.jsonl").exists()) if RECORDINGS.exists() else []
+    if not recs:
+        raise Skip("inga inspelningar i benchmarks/recordings/")
+    replay = Replay(recs[0])
+    replay.preload()
+    return replay
+
+
+@benchmark("replay[full_match]", number=1, repeat=3)
+def _():
+    from rpa_replay import run_replay
+    replay = _replay()
+    return lambda: run_replay(replay)
+
+
+@benchmark("replay[layout_cache]", number=5, repeat=3)
+def _():
+    from rpa_layout_cache import LayoutCache
+    from rpa_replay import run_replay
+    replay = _replay()
+    layout = LayoutCache(None)
+    run_replay(replay, layout)  # första varvet fyller cachen
+    return lambda: run_replay(replay, layout)
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Template matching (rpa_vision.match_template) mot skärmbilder.
+
+Inspelade skärmbilder läggs i benchmarks/screens/*.png. Saknas sådana byggs en
+syntetisk 1920x1080-bild där alla templates klistras in på fasta positioner.
+"""
+
+from __future__ import annotations
+
+import random
+from pathlib import Path
+
+from harness import ROOT, Skip, benchmark
+
+HERE = Path(__file__).resolve().parent
+SCREENS = HERE / "screens"
+TEMPLATES = ROOT / "templates"
+SEED = 1234
+
+_frame = None
+
+
+def _cv():
+    try:
+        import cv2
+        import numpy as np
+    except ImportError:
+        raise Skip("opencv/numpy saknas")
+    return cv2, np
+
+
+def _synthetic_frame():
+    cv2, np = _cv()
+    rnd = random.Random(SEED)
+    h, w = 1080, 1920
+    frame = np.full((h, w, 3), 240, dtype=np.uint8)
+    placed = {}
+    x, y, row_h = 10, 10, 0
+    for tpl in sorted(TEMPLATES.glob("*.png")):
+        img = cv2.imread(str(tpl), cv2.IMREAD_COLOR)
+        if img is None:
+            continue
+        th, tw = img.shape[:2]
+        if x + tw + 10 > w:
+            x, y, row_h = 10, y + row_h + 10 + rnd.randrange(20), 0
+        if y + th > h:
+            break
+        frame[y:y+th, x:x+tw] = img
+        placed[tpl.name] = (x, y, tw, th)
+        x += tw + 10 + rnd.randrange(40)
+        row_h = max(row_h, th)
+    return frame, placed
+
+
+def _screen():
+    """(bild, {template: rect}) – första inspelade skärmbilden, annars syntetisk."""
+    global _frame
+    if _frame is None:
+        cv2, _ = _cv()
+        recorded = sorted(SCREENS.glob("*.png")) if SCREENS.exists() else []
+        if recorded:
+            _frame = (cv2.imread(str(recorded[0]), cv2.IMREAD_COLOR), {})
+        else:
+            _frame = _synthetic_frame()
+    return _frame
+
+
+def _target() -> Path:
+    return TEMPLATES / "bfus_btn_skapa_avtal.png"
+
+
+@benchmark("match_template[full_frame]", number=10)
+def _():
+    _cv()
+    from rpa_vision import match_template
+    frame, _ = _screen()
+    tpl = _target()
+    return lambda: match_template(frame, tpl, threshold=0.0)
+
+
+@benchmark("match_template[region]", number=200)
+def _():
+    _cv()
+    from rpa_vision import match_template
+    frame, placed = _screen()
+    tpl = _target()
+    x, y, w, h = placed.get(tpl.name, (0, 0, 400, 200))
+    region = (max(0, x - 40), max(0, y - 40), w + 80, h + 80)
+    return lambda: match_template(frame, tpl, threshold=0.0, region=region)
+
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+Minimal benchmark-harness (stdlib).
+
+Ett benchmark registreras med @benchmark(...) på en setup-funktion som gör allt
+förarbete och returnerar den funktion som ska mätas:
+
+    @benchmark("bfus_catalog.search[exact]", number=1000)
+    def _():
+        cat = ...
+        return lambda: cat.search(tjanstenr="445323", exact=True)
+
+Setup får kasta Skip("orsak") om t.ex. numpy/opencv saknas.
+"""
+
+from __future__ import annotations
+
+import json
+import platform
+import statistics
+import subprocess
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+class Skip(Exception):
+    pass
+
+
+@dataclass
+class Benchmark:
+    name: str
+    setup: Callable[[], Callable[[], object]]
+    number: int = 1     # anrop per mätning
+    repeat: int = 5     # antal mätningar
+    items: int = 1      # "enheter" per anrop (ärenden, rader ...) för throughput
+
+
+REGISTRY: List[Benchmark] = []
+
+
+def benchmark(name: str, number: int = 1, repeat: int = 5, items: int = 1):
+    def deco(setup: Callable[[], Callable[[], object]]):
+        REGISTRY.append(Benchmark(name, setup, number=number, repeat=repeat, items=items))
+        return setup
+    return deco
+
+
+@dataclass
+class Result:
+    name: str
+    seconds: List[float] = field(default_factory=list)  # tid per anrop, en per mätning
+    items: int = 1
+    skipped: str = ""
+
+    def to_json(self) -> Dict:
+        if self.skipped:
+            return {"skipped": self.skipped}
+        med = statistics.median(self.seconds)
+        return {
+            "min": min(self.seconds),
+            "median": med,
+            "mean": statistics.fmean(self.seconds),
+            "stdev": statistics.stdev(self.seconds) if len(self.seconds) > 1 else 0.0,
+            "repeat": len(self.seconds),
+            "items": self.items,
+            "items_per_sec": self.items / med if med > 0 else None,
+        }
+
+
+def run_one(b: Benchmark, quick: bool = False) -> Result:
+    try:
+        fn = b.setup()
+    except Skip as e:
+        return Result(b.name, skipped=str(e) or "skip")
+
+    number = max(1, b.number // 10) if quick else b.number
+    repeat = min(b.repeat, 2) if quick else b.repeat
+
+    fn()  # uppvärmning (cache, lazy import)
+    res = Result(b.name, items=b.items)
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        res.seconds.append((time.perf_counter() - t0) / number)
+    return res
+
+
+def git_commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             capture_output=True, text=True, timeout=10)
+        sha = out.stdout.strip() or "unknown"
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True, timeout=10).stdout.strip()
+        return sha + ("-dirty" if dirty else "")
+    except Exception:
+        return "unknown"
+
+
+def report(results: List[Result]) -> Dict:
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+        },
+        "results": {r.name: r.to_json() for r in results},
+    }
+
+
+def fmt_time(sec: float) -> str:
+    if sec < 1e-6:
+        return f"{sec * 1e9:.0f} ns"
+    if sec < 1e-3:
+        return f"{sec * 1e6:.1f} µs"
+    if sec < 1:
+        return f"{sec * 1e3:.2f} ms"
+    return f"{sec:.3f} s"
+
+
+def compare(current: Dict, baseline: Dict, threshold: float = 0.10) -> List[str]:
+    """Returnerar namn på benchmarks som blivit mer än threshold långsammare."""
+    regressions = []
+    base = baseline.get("results", {})
+    print(f"\nJämförelse mot {baseline.get('meta', {}).get('commit', '?')}:")
+    for name, cur in current["results"].items():
+        old: Optional[Dict] = base.get(name)
+        if not old or "median" not in old or "median" not in cur:
+            continue
+        ratio = cur["median"] / old["median"] if old["median"] else float("inf")
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  ← långsammare"
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            flag = "  ← snabbare"
+        print(f"  {name:<48} {fmt_time(old['median']):>10} → {fmt_time(cur['median']):>10}  x{ratio:.2f}{flag}")
+    return regressions
+
+
+def save(data: Dict, path: Path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding="utf-8")
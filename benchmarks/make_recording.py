@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+Syntetisk inspelning för bench_replay (benchmarks/recordings/synthetic/).
+
+Robotens flöden körs bildvägen utan skrivbord: skärmen är den syntetiska
+bilden från bench_template_matching (alla templates utplacerade), tangent-
+och mustryck går ingenstans och BFUS-socketen för comboboxkontrollen
+(read_back) svarar med raden som Ctrl+Home/Down/Enter valde. Som vid
+uppspelning är changed/settled-väntorna sanna direkt.
+
+  python benchmarks/make_recording.py [--out KATALOG]
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import shutil
+import sys
+from pathlib import Path
+from typing import Optional, Tuple
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE.parent))  # repo-roten: roboten, rpa_replay, ...
+sys.path.insert(0, str(HERE))
+
+import numpy as np  # noqa: E402
+
+from bench_template_matching import _synthetic_frame  # noqa: E402
+from rpa_capture import CaptureBackend, Region, clamp  # noqa: E402
+from rpa_input import InputBackend  # noqa: E402
+
+OUT = HERE / "recordings" / "synthetic"
+
+PAYLOAD = {
+    "ref_nr": "EL-2024-0001",
+    "datum_mottaget": "2024-05-02",
+    "kommun": "Västerås",
+    "matarnr": "735999",
+    "anlaggnings_id": "735999100000000017",
+    "teknisk_nr": "T-4711",
+    "saking": "20A",
+}
+TJANSTENR = "445323"
+
+
+class _Screen(CaptureBackend):
+    name = "synthetic"
+
+    def __init__(self, frame: np.ndarray):
+        super().__init__()
+        self._frame = frame
+
+    def size(self) -> Tuple[int, int]:
+        return self._frame.shape[1], self._frame.shape[0]
+
+    def grab(self, region: Optional[Region] = None) -> np.ndarray:
+        if region is None:
+            return self._frame
+        x, y, w, h = clamp(region, self.size())
+        return self._frame[y:y+h, x:x+w]
+
+
+class _Keys(InputBackend):
+    """Inga riktiga tryck; håller bara reda på raden i en utfälld combobox."""
+    name = "synthetic"
+
+    def __init__(self):
+        self.row = 0
+        self.chosen = 0
+
+    def click(self, x: int, y: int, duration: float = 0.25):
+        pass
+
+    def hotkey(self, *keys: str):
+        if keys == ("ctrl", "home"):
+            self.row = 0
+
+    def press(self, key: str):
+        if key == "down":
+            self.row += 1
+        elif key == "enter":
+            self.chosen = self.row
+
+    def write(self, text: str):
+        pass
+
+    def sleep(self, seconds: float):
+        pass
+
+
+class _Bfus:
+    """Det read_back behöver av AutomationClient: comboboxen visar senast valda rad."""
+
+    def __init__(self, robot, keys: _Keys):
+        self._choices = {name: choices for _, name, choices in robot.COMBOS.values()}
+        self._keys = keys
+
+    def get(self, name: str) -> str:
+        return self._choices[name][self._keys.chosen]
+
+    def close(self):
+        pass
+
+
+def record(out: Path = OUT):
+    import rpa_robot_with_start_button_v2 as robot
+    from rpa_replay import Recorder
+
+    if out.exists():
+        shutil.rmtree(out)
+    keys = _Keys()
+    recorder = Recorder(out, _Screen(_synthetic_frame()[0]), keys)
+    robot.CAPTURE, robot.INPUT, robot.RECORDER = recorder.capture, recorder.input, recorder
+    robot.USE_AUTOMATION = False
+    robot._automation["bfus"] = _Bfus(robot, keys)
+    robot.WAIT.screen_probes = False
+    random.seed(0)  # som run_replay
+    try:
+        robot._flow(robot.bfus_fill_overgripande, PAYLOAD, TJANSTENR)
+        ids = robot._flow(robot.lime_check_checklist_and_get_ids)
+        robot._flow(robot.bfus_create_avtal_flow, PAYLOAD, ids)
+    finally:
+        recorder.close()
+    print(f"{out}: {recorder.frames} skärmbild(er)")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Syntetisk robotinspelning för bench_replay")
+    ap.add_argument("--out", type=Path, default=OUT)
+    args = ap.parse_args()
+    record(args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Kör benchmark-sviten och sparar resultat som JSON.
+
+Kör:
+  python benchmarks/run.py                      # alla, sparar benchmarks/results/<commit>.json
+  python benchmarks/run.py -k bpa_engine        # bara namn som innehåller "bpa_engine"
+  python benchmarks/run.py --quick              # färre varv (snabb rökkontroll)
+  python benchmarks/run.py --compare benchmarks/results/abc1234.json --fail-on-regression
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib
+import json
+import sys
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE.parent))  # repo-roten: bpa_demo_v2, bfus_store, ...
+sys.path.insert(0, str(HERE))
+
+import harness  # noqa: E402
+
+MODULES = [
+    "bench_elsmart",
+    "bench_bpa_engine",
+    "bench_bfus_store",
+    "bench_template_matching",
+    "bench_capture",
+    "bench_replay",
+    "bench_chrome",
+]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-k", "--filter", default="", help="kör bara benchmarks vars namn innehåller texten")
+    ap.add_argument("--quick", action="store_true", help="färre anrop/mätningar")
+    ap.add_argument("--out", type=Path, default=None, help="JSON-fil (default: benchmarks/results/<commit>.json)")
+    ap.add_argument("--compare", type=Path, default=None, help="tidigare JSON att jämföra mot")
+    ap.add_argument("--threshold", type=float, default=0.10, help="tillåten försämring vid --compare (andel)")
+    ap.add_argument("--fail-on-regression", action="store_true")
+    args = ap.parse_args()
+
+    for mod in MODULES:
+        importlib.import_module(mod)
+
+    results = []
+    for b in harness.REGISTRY:
+        if args.filter and args.filter not in b.name:
+            continue
+        r = harness.run_one(b, quick=args.quick)
+        results.append(r)
+        data = r.to_json()
+        if r.skipped:
+            print(f"{b.name:<50} hoppas över: {r.skipped}")
+        else:
+            rate = data["items_per_sec"]
+            rate_txt = f"{rate:,.0f} /s" if rate else ""
+            print(f"{b.name:<50} {harness.fmt_time(data['median']):>10}  (min {harness.fmt_time(data['min'])})"
+                  f"  {rate_txt}")
+
+    report = harness.report(results)
+    out = args.out or HERE / "results" / f"{report['meta']['commit']}.json"
+    harness.save(report, out)
+    print(f"\nSparat: {out}")
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        regressions = harness.compare(report, baseline, threshold=args.threshold)
+        if regressions and args.fail_on_regression:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,40 @@
+import argparse
+import os
+from itertools import islice
 import tkinter as tk
+from pathlib import Path
 from tkinter import ttk, messagebox
 
+import tk_automation
+from bfus_store import ServiceCatalog, load_catalog
+from tk_virtual_table import VirtualTable
+
 # ============================================================
 # BFUS – GUI-klon (Modern, mörk + vit) – uppdaterad enligt ändringar
 # - Vänsterkolumn: övre navigering + nedre mörk knappsektion
 # - "Övergripande uppgifter" med specificerade fält
 # - Flikar: Allmänt, Avtal, Aktörshistorik, Installation, Nyckelhantering, AMM
 # - Söktjänst öppnar extra fönster (Toplevel)
+# - Söktjänst söker i en tjänstekatalog (bfus_store), CSV via --catalog
+# - Stora tabeller är virtualiserade (tk_virtual_table) – bara synliga rader ritas
+# - Valfri automationssocket (tk_automation) via --automation-socket
 # - Generiska värden
 # ============================================================
 
 APP_TITLE = "BFUS – Prototyp"
+SEARCH_CHUNK = 5000      # rad-id per after()-tick när sökresultatet strömmas in i tabellen
+
+# Val i readonly-comboboxarna; roboten väljer via index i samma listor
+SAKINGAR = ["—", "16A", "20A", "25A", "35A", "50A"]
+AVTAL_CHOICES = {
+    "company": ["Exempelbolag A", "Exempelbolag B", "Exempelbolag C"],
+    "goal": ["Nätavtal", "Tillfälligt avtal", "Övrigt"],
+    "forbruk": ["Hushåll", "Fastighet", "Industri", "Övrigt"],
+    "deb_satt": ["Månadsvis", "Kvartalsvis", "Årsvis"],
+    "deb_formel": ["Formel A", "Formel B", "Formel C"],
+    "pp1": ["PP1-A", "PP1-B", "PP1-C"],
+    "pp2": ["PP2-A", "PP2-B", "PP2-C"],
+}
 
 def apply_modern_style(root: tk.Tk):
     style = ttk.Style(root)
@@ -92,9 +116,12 @@ def make_labeled_combo(parent, text, values, width=24):
     return row, cb
 
 class SearchServiceWindow(tk.Toplevel):
-    def __init__(self, master, palette):
+    def __init__(self, master, palette, catalog: ServiceCatalog):
         super().__init__(master)
         self.palette = palette
+        self.catalog = catalog
+        self._search_job = None
+        self._search_ids = None
         self.title("Sök tjänst")
         self.geometry("920x670")
         self.minsize(860, 620)
@@ -147,6 +174,15 @@ class SearchServiceWindow(tk.Toplevel):
         r, cb_status = make_labeled_combo(lf, "Tjänstestatus:", ["", "Aktiv", "Planerad", "Avslutad"])
         rows.append((r, cb_status, ""))
 
+        self.fields = {
+            "tjanstenr": e_tjanstnr,
+            "anlaggnings_id": e_anl_id,
+            "nyhet": cb_ny,
+            "affarsenhet": cb_aff,
+            "beskrivning": e_bes,
+            "tjanstestatus": cb_status,
+        }
+
         for row, w, default in rows:
             row.pack(fill="x", pady=4)
             try:
@@ -184,18 +220,10 @@ class SearchServiceWindow(tk.Toplevel):
         grid_frame.pack(fill="both", expand=True)
 
         cols = ("Nyhet", "Tjänst", "Beskrivning", "Anläggnings-id", "Affärsenhet", "Tjänstestatus", "Status börjar")
-        self.tree = ttk.Treeview(grid_frame, columns=cols, show="headings", height=3)
-        for c in cols:
-            self.tree.heading(c, text=c)
-            w = 170 if c == "Beskrivning" else 130
-            if c == "Anläggnings-id":
-                w = 170
-            self.tree.column(c, width=w, anchor="w")
-        self.tree.pack(side="left", fill="both", expand=True)
-
-        ysb = ttk.Scrollbar(grid_frame, orient="vertical", command=self.tree.yview)
-        self.tree.configure(yscroll=ysb.set)
-        ysb.pack(side="right", fill="y")
+        self.table = VirtualTable(grid_frame, cols, height=3, default_width=130,
+                                  widths={"Beskrivning": 170, "Anläggnings-id": 170})
+        self.table.pack(fill="both", expand=True)
+        tk_automation.set_name(self.table, "Träffar")
 
         bottom = ttk.Frame(wrap)
         bottom.pack(fill="x", pady=(10, 0))
@@ -207,7 +235,7 @@ class SearchServiceWindow(tk.Toplevel):
         ttk.Button(bottom, text="Avbryt", command=self.destroy, style="Ghost.TButton").pack(side="right", padx=(8, 0))
         ttk.Button(bottom, text="OK", command=self.ok, style="Secondary.TButton").pack(side="right", padx=(8, 0))
 
-        self.tree.bind("<<TreeviewSelect>>", self.update_counts)
+        self.table.bind_select(self.update_counts)
 
         ttk.Label(tab_extra, text="(Simulerad vy) Extra sökfält kan läggas här.", padding=14).pack(anchor="w")
 
@@ -228,34 +256,56 @@ class SearchServiceWindow(tk.Toplevel):
             yield from self._walk_widgets(w)
 
     def run_search(self, clear_only=False):
-        for i in self.tree.get_children():
-            self.tree.delete(i)
+        self._cancel_search()
+        self.table.clear()
 
         if clear_only:
             self.status_lbl.config(text="Antal rader: 0 • Markerade: 0")
             return
 
-        rows = [
-            ("Ny anläggning", "Tjänst", "Exempelrad A", "0000000000000001", "Region A", "Aktiv", "2025-01-10"),
-            ("Ändring", "Tjänst", "Exempelrad B", "0000000000000002", "Region B", "Planerad", "2025-02-01"),
-            ("", "Tjänst", "Exempelrad C", "0000000000000003", "Region C", "Avslutad", "2024-12-15"),
-        ]
-        for r in rows:
-            self.tree.insert("", "end", values=r)
-
-        self.status_lbl.config(text=f"Antal rader: {len(rows)} • Markerade: 0")
+        criteria = {name: w.get().strip() for name, w in self.fields.items()}
+        result = self.catalog.search(**criteria)
+        # Tabellen får en lazy vy (bara rad-id); träffarna strömmas in i bitar
+        # via after() så att Tk-loopen aldrig blockeras av en stor sökning.
+        self.table.set_rows(result.rows_view())
+        self._search_ids = result.row_ids()
+        self._pump_search()
+
+    def _pump_search(self):
+        self._search_job = None
+        if self._search_ids is None:
+            return
+        chunk = list(islice(self._search_ids, SEARCH_CHUNK))
+        if chunk:
+            self.table.append(chunk)
+        if len(chunk) < SEARCH_CHUNK:
+            self._search_ids = None
+        else:
+            self._search_job = self.after(1, self._pump_search)
+        self.update_counts()
+
+    def _cancel_search(self):
+        if self._search_job is not None:
+            self.after_cancel(self._search_job)
+            self._search_job = None
+        self._search_ids = None
+
+    def destroy(self):
+        self._cancel_search()
+        super().destroy()
 
     def update_counts(self, *_):
-        total = len(self.tree.get_children())
-        marked = len(self.tree.selection())
-        self.status_lbl.config(text=f"Antal rader: {total} • Markerade: {marked}")
+        total = len(self.table)
+        marked = 0 if self.table.selected_index() is None else 1
+        more = "+" if self._search_ids is not None else ""
+        self.status_lbl.config(text=f"Antal rader: {total}{more} • Markerade: {marked}")
 
     def ok(self):
-        sel = self.tree.selection()
-        if not sel:
+        values = self.table.selected_values()
+        if values is None:
             messagebox.showwarning("Sök tjänst", "Välj en rad först (simulerat).")
             return
-        values = self.tree.item(sel[0], "values")
+        self.master.vars["tjanstenr"].set(values[1])
         self.master.vars["anlaggnings_id"].set(values[3])
         self.master.vars["affarsenhet"].set(values[4])
         self.master.vars["tjanstestatus"].set(values[5])
@@ -334,14 +384,14 @@ class AgreementWizard(tk.Toplevel):
         r = ttk.Frame(lf); r.pack(fill="x", pady=5)
         ttk.Label(r, text="Avtalsägande företag:", width=22).pack(side="left")
         self.cb_company = ttk.Combobox(r, state="readonly", width=28,
-                                      values=["Exempelbolag A", "Exempelbolag B", "Exempelbolag C"])
+                                      values=AVTAL_CHOICES["company"])
         self.cb_company.current(0)
         self.cb_company.pack(side="left", fill="x", expand=True)
 
         r = ttk.Frame(lf); r.pack(fill="x", pady=5)
         ttk.Label(r, text="Avtalsmål:", width=22).pack(side="left")
         self.cb_goal = ttk.Combobox(r, state="readonly", width=28,
-                                   values=["Nätavtal", "Tillfälligt avtal", "Övrigt"])
+                                   values=AVTAL_CHOICES["goal"])
         self.cb_goal.current(0)
         self.cb_goal.pack(side="left", fill="x", expand=True)
 
@@ -364,7 +414,7 @@ class AgreementWizard(tk.Toplevel):
         r = ttk.Frame(lf); r.pack(fill="x", pady=5)
         ttk.Label(r, text="Förbrukartyp:", width=22).pack(side="left")
         self.cb_forbruk = ttk.Combobox(r, state="readonly", width=28,
-                                      values=["Hushåll", "Fastighet", "Industri", "Övrigt"])
+                                      values=AVTAL_CHOICES["forbruk"])
         self.cb_forbruk.current(0)
         self.cb_forbruk.pack(side="left", fill="x", expand=True)
 
@@ -395,14 +445,14 @@ class AgreementWizard(tk.Toplevel):
         r = ttk.Frame(lf2); r.pack(fill="x", pady=5)
         ttk.Label(r, text="Debiteringssätt:", width=22).pack(side="left")
         self.cb_deb_satt = ttk.Combobox(r, state="readonly", width=28,
-                                      values=["Månadsvis", "Kvartalsvis", "Årsvis"])
+                                      values=AVTAL_CHOICES["deb_satt"])
         self.cb_deb_satt.current(0)
         self.cb_deb_satt.pack(side="left", fill="x", expand=True)
 
         r = ttk.Frame(lf2); r.pack(fill="x", pady=5)
         ttk.Label(r, text="Debiteringsformel:", width=22).pack(side="left")
         self.cb_deb_formel = ttk.Combobox(r, state="readonly", width=28,
-                                         values=["Formel A", "Formel B", "Formel C"])
+                                         values=AVTAL_CHOICES["deb_formel"])
         self.cb_deb_formel.current(0)
         self.cb_deb_formel.pack(side="left", fill="x", expand=True)
 
@@ -416,14 +466,14 @@ class AgreementWizard(tk.Toplevel):
         r = ttk.Frame(lf); r.pack(fill="x", pady=5)
         ttk.Label(r, text="Prisparameter 1:", width=22).pack(side="left")
         self.cb_pp1 = ttk.Combobox(r, state="readonly", width=28,
-                                  values=["PP1-A", "PP1-B", "PP1-C"])
+                                  values=AVTAL_CHOICES["pp1"])
         self.cb_pp1.current(0)
         self.cb_pp1.pack(side="left", fill="x", expand=True)
 
         r = ttk.Frame(lf); r.pack(fill="x", pady=5)
         ttk.Label(r, text="Prisparameter 2:", width=22).pack(side="left")
         self.cb_pp2 = ttk.Combobox(r, state="readonly", width=28,
-                                  values=["PP2-A", "PP2-B", "PP2-C"])
+                                  values=AVTAL_CHOICES["pp2"])
         self.cb_pp2.current(0)
         self.cb_pp2.pack(side="left", fill="x", expand=True)
 
@@ -507,8 +557,9 @@ class AgreementWizard(tk.Toplevel):
         self.destroy()
 
 class BFUSApp(tk.Tk):
-    def __init__(self):
+    def __init__(self, catalog: ServiceCatalog = None):
         super().__init__()
+        self.catalog = catalog if catalog is not None else ServiceCatalog.default()
         self.palette = apply_modern_style(self)
         self.title(APP_TITLE)
         self.geometry("1280x800")
@@ -677,7 +728,7 @@ class BFUSApp(tk.Tk):
 
         r = ttk.Frame(c3)
         ttk.Label(r, text="Säkring:", width=18).pack(side="left")
-        cb_sak = ttk.Combobox(r, values=["—", "16A", "20A", "25A", "35A", "50A"], state="readonly", width=24,
+        cb_sak = ttk.Combobox(r, values=SAKINGAR, state="readonly", width=24,
                               textvariable=self.vars["saking"])
         cb_sak.pack(side="left", fill="x", expand=True)
         r.pack(fill="x", pady=5)
@@ -703,21 +754,12 @@ class BFUSApp(tk.Tk):
         table_wrap.pack(fill="both", expand=True)
 
         cols = ("ID", "Typ", "Status", "Start", "Slut", "Notering")
-        tree = ttk.Treeview(table_wrap, columns=cols, show="headings", height=12)
-        for c in cols:
-            tree.heading(c, text=c)
-            tree.column(c, width=120 if c != "Notering" else 300, anchor="w")
-        tree.pack(side="left", fill="both", expand=True)
-
-        ysb = ttk.Scrollbar(table_wrap, orient="vertical", command=tree.yview)
-        tree.configure(yscroll=ysb.set)
-        ysb.pack(side="right", fill="y")
-
-        for row in [
+        self.history = VirtualTable(table_wrap, cols, height=12, widths={"Notering": 300}, rows=[
             ("1001", "Händelse", "Klar", "2025-01-10", "", "Exempelnotering"),
             ("1002", "Händelse", "Pågår", "2025-01-12", "", "Exempelnotering"),
-        ]:
-            tree.insert("", "end", values=row)
+        ])
+        self.history.pack(fill="both", expand=True)
+        tk_automation.set_name(self.history, "Historik")
 
         ttk.Label(tabs["Avtal"], text="(Simulerad vy) Avtalsinformation.", padding=14).pack(anchor="w")
         ttk.Label(tabs["Aktörshistorik"], text="(Simulerad vy) Historik för aktörer.", padding=14).pack(anchor="w")
@@ -732,7 +774,7 @@ class BFUSApp(tk.Tk):
         tk.Label(status, text="F1 = Hjälp", bg=self.palette["SIDELITE"], fg=self.palette["MUTED"]).pack(side="right", padx=12)
 
     def open_search(self):
-        SearchServiceWindow(self, self.palette)
+        SearchServiceWindow(self, self.palette, self.catalog)
 
     def open_agreement(self):
         # Öppnar wizard för "Skapa avtal" (simulerad)
@@ -742,5 +784,16 @@ class BFUSApp(tk.Tk):
     def save(self):
         messagebox.showinfo("BFUS", "Sparat (simulerat).")
 
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--catalog", type=Path, default=os.environ.get("BFUS_CATALOG") or None,
+                    help="CSV med tjänstekatalog för Sök tjänst (default: generiska demo-rader)")
+    ap.add_argument("--automation-socket", type=Path, default=None,
+                    help="Unix-socket för tk_automation (default: TK_AUTOMATION_DIR/bfus.sock om satt)")
+    args = ap.parse_args()
+    app = BFUSApp(catalog=load_catalog(args.catalog))
+    tk_automation.maybe_start(app, "bfus", args.automation_socket)
+    app.mainloop()
+
 if __name__ == "__main__":
-    BFUSApp().mainloop()
+    main()
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+BFUS "backend" – tjänstekatalog för popupen "Sök tjänst".
+
+- Katalogen lagras kolumnvis (en lista per kolumn) så att 1M+ rader ryms i minnet.
+- Tjänstenummer och Anläggnings-id har sorterade index (array av rad-id) som
+  används både för exakt match och prefixmatch (bisect, O(log n)).
+- Sökningen returnerar ett SearchResult som itereras lazy, sida för sida,
+  så att UI:t bara materialiserar de rader som faktiskt visas.
+
+Laddas från CSV med rubrikrad (se COLUMNS), t.ex.:
+  nyhet,tjanstenr,beskrivning,anlaggnings_id,affarsenhet,tjanstestatus,status_borjar
+"""
+
+from __future__ import annotations
+
+import bisect
+import csv
+import sys
+import threading
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from bpa_records import Agreement, ServiceUpdate
+
+
+# Kolumnordning = kolumnordning i Treeview i "Sök tjänst"
+COLUMNS = (
+    "nyhet",
+    "tjanstenr",
+    "beskrivning",
+    "anlaggnings_id",
+    "affarsenhet",
+    "tjanstestatus",
+    "status_borjar",
+)
+
+# Kolumner med få unika värden internas så att 1M rader delar samma str-objekt
+INTERNED_COLUMNS = ("nyhet", "beskrivning", "affarsenhet", "tjanstestatus", "status_borjar")
+
+# Kolumner med sorterat index (exakt + prefix)
+INDEXED_COLUMNS = ("tjanstenr", "anlaggnings_id")
+
+ServiceRow = Tuple[str, str, str, str, str, str, str]
+
+# Generiska demo-rader (samma värden som Lime/Elsmart-klonerna använder)
+DEFAULT_ROWS: List[ServiceRow] = [
+    ("Ny anläggning", "445323", "Exempelrad A", "0000000000000000", "Region A", "Aktiv", "2025-01-10"),
+    ("Ändring", "445324", "Exempelrad B", "0000000000000002", "Region B", "Planerad", "2025-02-01"),
+    ("", "445325", "Exempelrad C", "0000000000000003", "Region C", "Avslutad", "2024-12-15"),
+]
+
+
+class ServiceCatalog:
+    """Kolumnlagrad tjänstekatalog med sorterade index på tjänstenr/anläggnings-id."""
+
+    def __init__(self, rows: Iterable[Sequence[str]] = ()):
+        self._cols: Dict[str, List[str]] = {c: [] for c in COLUMNS}
+        self._index: Dict[str, array] = {}
+        self.extend(rows)
+
+    # ---- laddning
+    @classmethod
+    def from_csv(cls, path: Path) -> "ServiceCatalog":
+        """Läser CSV strömmande (rad för rad) och bygger index en gång på slutet."""
+        cat = cls()
+        with Path(path).open(newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header is None:
+                return cat
+            pos = [header.index(c) if c in header else -1 for c in COLUMNS]
+            cat.extend(
+                (tuple(r[p] if 0 <= p < len(r) else "" for p in pos) for r in reader),
+            )
+        return cat
+
+    @classmethod
+    def default(cls) -> "ServiceCatalog":
+        return cls(DEFAULT_ROWS)
+
+    def extend(self, rows: Iterable[Sequence[str]]):
+        cols = [self._cols[c] for c in COLUMNS]
+        interned = [c in INTERNED_COLUMNS for c in COLUMNS]
+        for row in rows:
+            for col, val, intern in zip(cols, row, interned):
+                col.append(sys.intern(val) if intern else val)
+        self._rebuild_index()
+
+    def _rebuild_index(self):
+        n = len(self)
+        for name in INDEXED_COLUMNS:
+            col = self._cols[name]
+            self._index[name] = array("I", sorted(range(n), key=col.__getitem__))
+
+    # ---- åtkomst
+    def __len__(self) -> int:
+        return len(self._cols["tjanstenr"])
+
+    def row(self, rid: int) -> ServiceRow:
+        return tuple(self._cols[c][rid] for c in COLUMNS)  # type: ignore[return-value]
+
+    def _range(self, column: str, key: str, exact: bool) -> Tuple[int, int]:
+        """Returnerar [lo, hi) i det sorterade indexet för exakt eller prefix-match."""
+        idx = self._index[column]
+        col = self._cols[column]
+        lo = bisect.bisect_left(idx, key, key=col.__getitem__)
+        if exact:
+            hi = bisect.bisect_right(idx, key, lo=lo, key=col.__getitem__)
+        else:
+            hi = bisect.bisect_left(idx, key + "\uffff", lo=lo, key=col.__getitem__)
+        return lo, hi
+
+    def search(self, tjanstenr: str = "", anlaggnings_id: str = "", exact: bool = False,
+               **filters: str) -> "SearchResult":
+        """
+        Söker i katalogen. Tomma fält ignoreras.
+        tjanstenr/anlaggnings_id går via index (prefix, eller exakt med exact=True).
+        Övriga filters (nyhet, affarsenhet, tjanstestatus, beskrivning) jämförs exakt
+        på de rader som indexet släpper igenom.
+        """
+        keyed = [(c, v) for c, v in (("tjanstenr", tjanstenr.strip()),
+                                     ("anlaggnings_id", anlaggnings_id.strip())) if v]
+        checks: List[Tuple[List[str], str, bool]] = []
+
+        source: Optional[Tuple[array, int, int]] = None
+        if keyed:
+            # Driv sökningen från det smalaste indexintervallet, kontrollera resten per rad
+            ranges = [(self._range(c, v, exact), c, v) for c, v in keyed]
+            ranges.sort(key=lambda t: t[0][1] - t[0][0])
+            (lo, hi), col, _ = ranges[0]
+            source = (self._index[col], lo, hi)
+            for _, c, v in ranges[1:]:
+                checks.append((self._cols[c], v, exact))
+
+        for name, val in filters.items():
+            if name not in self._cols:
+                raise KeyError(f"Okänd kolumn: {name}")
+            if val:
+                checks.append((self._cols[name], val, True))
+
+        return SearchResult(self, source, checks)
+
+
+class SearchResult:
+    """Lazy sökresultat – raderna hämtas först när de itereras/pagineras."""
+
+    def __init__(self, catalog: ServiceCatalog, source: Optional[Tuple[array, int, int]],
+                 checks: List[Tuple[List[str], str, bool]]):
+        self.catalog = catalog
+        self._source = source
+        self._checks = checks
+
+    @property
+    def upper_bound(self) -> int:
+        """Max antal träffar (exakt när inga radfilter finns)."""
+        if self._source is None:
+            return len(self.catalog)
+        _, lo, hi = self._source
+        return hi - lo
+
+    @property
+    def is_exact_count(self) -> bool:
+        return not self._checks
+
+    def row_ids(self) -> Iterator[int]:
+        if self._source is None:
+            candidates: Iterable[int] = range(len(self.catalog))
+        else:
+            idx, lo, hi = self._source
+            candidates = (idx[i] for i in range(lo, hi))
+
+        if not self._checks:
+            yield from candidates
+            return
+
+        checks = self._checks
+        for rid in candidates:
+            for col, val, exact in checks:
+                cell = col[rid]
+                if (cell != val) if exact else (not cell.startswith(val)):
+                    break
+            else:
+                yield rid
+
+    def __iter__(self) -> Iterator[ServiceRow]:
+        row = self.catalog.row
+        for rid in self.row_ids():
+            yield row(rid)
+
+    def rows_view(self) -> "CatalogRows":
+        """Tom lazy vy mot katalogen – fylls på med rad-id från row_ids()."""
+        return CatalogRows(self.catalog)
+
+    def pages(self, page_size: int = 200) -> Iterator[List[ServiceRow]]:
+        """Yieldar sidor med högst page_size rader tills resultatet är slut."""
+        page: List[ServiceRow] = []
+        for r in self:
+            page.append(r)
+            if len(page) >= page_size:
+                yield page
+                page = []
+        if page:
+            yield page
+
+
+class CatalogRows:
+    """
+    Sekvens av katalograder som bara lagrar rad-id (4 byte/rad).
+    Raden (tuple) byggs först vid __getitem__, dvs. när tabellen ritar den.
+    """
+
+    def __init__(self, catalog: ServiceCatalog, ids: Iterable[int] = ()):
+        self.catalog = catalog
+        self.ids = array("I", ids)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, i: int) -> ServiceRow:
+        return self.catalog.row(self.ids[i])
+
+    def extend(self, ids: Iterable[int]):
+        self.ids.extend(ids)
+
+
+def load_catalog(path: Optional[Path]) -> ServiceCatalog:
+    """Laddar katalog från CSV om sökväg anges, annars de generiska demo-raderna."""
+    if path is None:
+        return ServiceCatalog.default()
+    return ServiceCatalog.from_csv(path)
+
+
+class BFUSStore:
+    """
+    Headless BFUS-modell: övergripande uppgifter per tjänst + skapade avtal.
+    Samma data som BFUS-fönstret i BPA-demon visar, men för många ärenden.
+
+    Bulk-varianterna (update_overview_many/create_agreements) tillämpar en hel
+    lista i en transaktion: alla poster valideras först, sedan skrivs de giltiga
+    i ett svep under låset. Resultatet är en post per indata, i samma ordning:
+      {"ok": True, ...} eller {"ok": False, "error": "..."}
+    """
+
+    OVERVIEW_KEYS = ("tjanstenr", "anlaggnings_id", "saking")
+    AGREEMENT_KEYS = ("kundnr", "kundref")
+
+    def __init__(self):
+        # Slottade poster i stället för en dict per tjänst/avtal (minne vid 1M ärenden)
+        self.services: Dict[str, ServiceUpdate] = {}
+        self.agreements: Dict[str, Agreement] = {}
+        self._next_agreement = 1
+        self._lock = threading.Lock()
+
+    def update_overview(self, tjanstenr: str, anlaggnings_id: str, saking: str) -> Dict[str, str]:
+        service = ServiceUpdate.from_dict({"tjanstenr": tjanstenr, "anlaggnings_id": anlaggnings_id, "saking": saking})
+        with self._lock:
+            self.services[tjanstenr] = service
+        return service.to_dict()
+
+    def create_agreement(self, data: Dict[str, str]) -> str:
+        with self._lock:
+            agreement_id = f"A-{self._next_agreement:06d}"
+            self._next_agreement += 1
+            self.agreements[agreement_id] = Agreement.from_dict({**data, "agreement_id": agreement_id})
+        return agreement_id
+
+    @staticmethod
+    def _missing(item: Dict[str, str], keys: Sequence[str]) -> str:
+        missing = [k for k in keys if not item.get(k)]
+        return f"saknar {', '.join(missing)}" if missing else ""
+
+    def update_overview_many(self, items: Sequence[Dict[str, str]]) -> List[Dict]:
+        results: List[Dict] = []
+        staged: Dict[str, ServiceUpdate] = {}
+        for item in items:
+            error = self._missing(item, self.OVERVIEW_KEYS)
+            if error:
+                results.append({"ok": False, "error": error})
+                continue
+            service = ServiceUpdate.from_dict(item)
+            staged[service.tjanstenr] = service
+            results.append({"ok": True, "service": service.to_dict()})
+        with self._lock:
+            self.services.update(staged)
+        return results
+
+    def create_agreements(self, items: Sequence[Dict[str, str]]) -> List[Dict]:
+        errors = [self._missing(item, self.AGREEMENT_KEYS) for item in items]
+        results: List[Dict] = []
+        with self._lock:
+            for item, error in zip(items, errors):
+                if error:
+                    results.append({"ok": False, "error": error})
+                    continue
+                agreement_id = f"A-{self._next_agreement:06d}"
+                self._next_agreement += 1
+                self.agreements[agreement_id] = Agreement.from_dict({**item, "agreement_id": agreement_id})
+                results.append({"ok": True, "agreement_id": agreement_id})
+        return results
+
+    def reset(self):
+        with self._lock:
+            self.services.clear()
+            self.agreements.clear()
+            self._next_agreement = 1
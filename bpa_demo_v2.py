@@ -21,18 +21,51 @@ BPA-princip i denna demo:
 
 from __future__ import annotations
 
+import argparse
 import re
+import threading
 import time
 import datetime as _dt
 import tkinter as tk
-from tkinter import ttk, messagebox
-from dataclasses import dataclass
+from tkinter import ttk, messagebox, filedialog
+from dataclasses import dataclass, field
+from itertools import count, islice
 from pathlib import Path
-from typing import Dict, List, Optional, Callable, Generator, Tuple
-
+from typing import Dict, Iterable, Iterator, List, Optional, Callable, Generator, Tuple
+
+from bfus_store import BFUSStore
+from bpa_metrics import EngineMetrics, fmt_seconds
+from bpa_profiling import StepProfiler, parse_steps
+from bpa_records import Case, CaseContext, ElsmartPayload
+from bpa_rules import DecisionTable
+from case_generator import load_cases
+from elsmart_validation import validate_one
+from tk_bridge import MainThreadProxy, UiBridge
+from tk_virtual_table import VirtualTable
 
 ROOT = Path(__file__).resolve().parent
 ELSMART_HTML = ROOT / "index.html"
+AGREEMENT_RULES = ROOT / "rules" / "agreement_rules.csv"
+ELSMART_FIELDS = ["Ref. nr.", "Datum mottaget", "Kommun", "Mätarnr.", "Anläggnings-id", "Teknisk nr."]
+BFUS_BATCH = 50  # max antal ärenden per bulk-anrop mot BFUS i run_batch
+FRAME_MS = 16  # en frame vid 60 fps – UI-omritningar slås ihop till högst en per frame
+
+DEFAULT_CASE = {
+    "case_id": "L-0001",
+    "ref_nr": "E-0000-00",
+    "tjanstenr": "445323",
+    "kundnr": "K-000001",
+    "status": "Nytt",
+    "reason": "",
+    "checklist_done": False,
+}
+CHECKLIST = [
+    "Kontrollera ärendetyp",
+    "Kontrollera anläggnings-id",
+    "Kontrollera kontaktuppgifter",
+    "Skapa/uppdatera BFUS",
+    "Skapa nätavtal",
+]
 
 
 # -----------------------------
@@ -56,6 +89,46 @@ def parse_elsmart_html(path: Path) -> Dict[str, str]:
     return out
 
 
+class ElsmartSource:
+    """
+    Elsmart-data utan UI (samma "API" som ElsmartWindow).
+    Filen parsas bara om när mtime/storlek ändrats. Används direkt av motorn
+    när demo körs headless, och av ElsmartWindow för visualisering.
+    Bara fälten i PAGE_FIELDS sparas (som ElsmartPayload), inte sidans övriga rader.
+    """
+
+    def __init__(self, path: Path = ELSMART_HTML):
+        self.path = path
+        self.record = ElsmartPayload()
+        self._stamp: Optional[Tuple[int, int]] = None
+
+    def api_refresh(self) -> bool:
+        """Läser in data vid behov. Returnerar True om innehållet ändrats."""
+        st = self.path.stat()
+        stamp = (st.st_mtime_ns, st.st_size)
+        if stamp == self._stamp:
+            return False
+        record = ElsmartPayload.from_page(parse_elsmart_html(self.path))
+        # Säkring saknas i index.html – använd ett värde som finns i BFUS combobox (demo)
+        if not record.saking:
+            record.saking = "16A"
+        self._stamp = stamp
+        changed = record != self.record
+        self.record = record
+        return changed
+
+    @property
+    def data(self) -> Dict[str, str]:
+        return self.record.to_page()
+
+    def payload(self) -> Dict[str, str]:
+        return self.record.to_page()
+
+    def api_get_payload(self) -> Dict[str, str]:
+        self.api_refresh()
+        return self.payload()
+
+
 # -----------------------------
 # UI: LIME
 # -----------------------------
@@ -66,15 +139,7 @@ class LimeWindow(tk.Toplevel):
         self.geometry("640x760")
         self.minsize(600, 700)
 
-        self.case = {
-            "case_id": "L-0001",
-            "ref_nr": "E-0000-00",
-            "tjanstenr": "445323",
-            "kundnr": "K-000001",
-            "status": "Nytt",
-            "reason": "",
-            "checklist_done": False,
-        }
+        self.case = dict(DEFAULT_CASE)
 
         # --- layout
         C_BG = "#111827"
@@ -139,13 +204,7 @@ class LimeWindow(tk.Toplevel):
         ttk.Separator(card, orient="horizontal").pack(fill="x", padx=12, pady=(0, 10))
 
         self.chk_vars: List[tk.BooleanVar] = []
-        for text in [
-            "Kontrollera ärendetyp",
-            "Kontrollera anläggnings-id",
-            "Kontrollera kontaktuppgifter",
-            "Skapa/uppdatera BFUS",
-            "Skapa nätavtal",
-        ]:
+        for text in CHECKLIST:
             v = tk.BooleanVar(value=False)
             self.chk_vars.append(v)
             ttk.Checkbutton(card, text=text, variable=v).pack(anchor="w", padx=14, pady=2)
@@ -190,15 +249,7 @@ class LimeWindow(tk.Toplevel):
 
     def api_reset(self):
         # Reset to defaults
-        self.case.update({
-            "case_id": "L-0001",
-            "ref_nr": "E-0000-00",
-            "tjanstenr": "445323",
-            "kundnr": "K-000001",
-            "status": "Nytt",
-            "reason": "",
-            "checklist_done": False,
-        })
+        self.case.update(DEFAULT_CASE)
         self.var_tjanstenr.set(self.case["tjanstenr"])
         self.var_kundnr.set(self.case["kundnr"])
         self.api_clear_checklist()
@@ -209,13 +260,16 @@ class LimeWindow(tk.Toplevel):
 # UI: ELSMART (visualisering)
 # -----------------------------
 class ElsmartWindow(tk.Toplevel):
-    def __init__(self, master: tk.Tk):
+    def __init__(self, master: tk.Tk, source: Optional[ElsmartSource] = None):
         super().__init__(master)
         self.title("Elsmart – BPA-demo (data)")
         self.geometry("520x520")
         self.minsize(480, 480)
 
-        self.data: Dict[str, str] = {}
+        self.source = source or ElsmartSource()
+        # Det som senast ritades i tabellen – api_refresh diffar mot detta
+        self._rendered: List[str] = [""] * len(ELSMART_FIELDS)
+        self._render_job: Optional[str] = None
 
         top = tk.Frame(self, bg="#0f172a", height=48)
         top.pack(fill="x")
@@ -226,39 +280,54 @@ class ElsmartWindow(tk.Toplevel):
         body = ttk.Frame(self, padding=12)
         body.pack(fill="both", expand=True)
 
-        self.tree = ttk.Treeview(body, columns=("k", "v"), show="headings", height=16)
-        self.tree.heading("k", text="Fält")
-        self.tree.heading("v", text="Värde")
-        self.tree.column("k", width=180, anchor="w")
-        self.tree.column("v", width=300, anchor="w")
-        self.tree.pack(fill="both", expand=True)
+        self.table = VirtualTable(body, ("k", "v"), height=16, widths={"k": 180, "v": 300},
+                                  rows=[(k, "") for k in ELSMART_FIELDS])
+        self.table.tree.heading("k", text="Fält")
+        self.table.tree.heading("v", text="Värde")
+        self.table.pack(fill="both", expand=True)
 
         self.status = ttk.Label(self, text="Redo")
         self.status.pack(anchor="w", padx=12, pady=(0, 10))
 
+        # Dolt fönster ritas inte om; när det visas igen ritar vi ikapp
+        self.bind("<Map>", lambda e: self._schedule_render())
+
         self.api_refresh()
 
+    @property
+    def data(self) -> Dict[str, str]:
+        return self.source.data
+
     def api_refresh(self):
         try:
-            self.data = parse_elsmart_html(ELSMART_HTML)
+            self.source.api_refresh()
         except Exception as e:
             self.status.config(text=f"Fel: {e}")
             return
+        self._schedule_render()
 
-        for i in self.tree.get_children():
-            self.tree.delete(i)
+    def _schedule_render(self):
+        # Flera refresh inom samma frame ger en enda omritning
+        if self._render_job is None:
+            self._render_job = self.after(FRAME_MS, self._render)
 
-        for k in ["Ref. nr.", "Datum mottaget", "Kommun", "Mätarnr.", "Anläggnings-id", "Teknisk nr."]:
-            self.tree.insert("", "end", values=(k, self.data.get(k, "")))
+    def _render(self):
+        self._render_job = None
+        if not self.winfo_viewable():
+            return
+
+        data = self.data
+        for i, k in enumerate(ELSMART_FIELDS):
+            value = data.get(k, "")
+            if value != self._rendered[i]:
+                self.table.set_cell(i, "v", value)
+                self._rendered[i] = value
 
         self.status.config(text=f"Uppdaterad: {_dt.datetime.now().strftime('%H:%M:%S')}")
 
     def api_get_payload(self) -> Dict[str, str]:
         self.api_refresh()
-        # Lägg till en "saking" som finns i BFUS combobox (demo)
-        payload = dict(self.data)
-        payload["Säkring"] = "16A"
-        return payload
+        return self.source.payload()
 
 
 # -----------------------------
@@ -291,6 +360,7 @@ class BFUSWindow(tk.Toplevel):
             "kundref": "",
             "agreement_id": "",
         }
+        self._next_agreement = 1  # avtals-id löpnummer (som BFUSStore)
 
         self._build_ui()
 
@@ -433,8 +503,16 @@ class BFUSWindow(tk.Toplevel):
         self.agreement.update(data)
         # skapa "id" för demo
         if not self.agreement.get("agreement_id"):
-            self.agreement["agreement_id"] = f"A-{int(time.time())%10000:04d}"
+            self.agreement["agreement_id"] = self._new_agreement_id()
+        self._show_agreement()
+        return self.agreement["agreement_id"]
+
+    def _new_agreement_id(self) -> str:
+        agreement_id = f"A-{self._next_agreement:06d}"
+        self._next_agreement += 1
+        return agreement_id
 
+    def _show_agreement(self):
         # uppdatera wizard om den är öppen
         if self.agreement_win and self.agreement_win.winfo_exists():
             self.agreement_win.api_load_from_model(self.agreement)
@@ -445,7 +523,38 @@ class BFUSWindow(tk.Toplevel):
             f"Produkt: {self.agreement.get('produkt','')} • Kundref: {self.agreement.get('kundref','')}"
         )
         self.var_status.set("Avtal skapat")
-        return self.agreement["agreement_id"]
+
+    def api_update_overview_many(self, items: List[Dict[str, str]]) -> List[Dict]:
+        """Bulk-variant: modellen uppdateras per post, UI:t ritas om en gång (sista posten)."""
+        results = []
+        for item in items:
+            if not all(item.get(k) for k in BFUSStore.OVERVIEW_KEYS):
+                results.append({"ok": False, "error": "ofullständig post"})
+                continue
+            self.service.update({k: item[k] for k in BFUSStore.OVERVIEW_KEYS})
+            results.append({"ok": True, "service": dict(self.service)})
+        if any(r["ok"] for r in results):
+            self.api_update_overview(**self.service)
+        return results
+
+    def api_create_agreements(self, items: List[Dict[str, str]]) -> List[Dict]:
+        """Bulk-variant som BFUSStore.create_agreements: resultat per post, UI:t ritas om en gång."""
+        results = []
+        for item in items:
+            missing = [k for k in BFUSStore.AGREEMENT_KEYS if not item.get(k)]
+            if missing:
+                results.append({"ok": False, "error": f"saknar {', '.join(missing)}"})
+                continue
+            try:
+                self.agreement.update(item)
+                self.agreement["agreement_id"] = self._new_agreement_id()
+            except Exception as e:  # en felaktig post ska inte stoppa resten
+                results.append({"ok": False, "error": str(e)})
+                continue
+            results.append({"ok": True, "agreement_id": self.agreement["agreement_id"]})
+        if any(r["ok"] for r in results):
+            self._show_agreement()
+        return results
 
     def api_reset(self):
         self.service.update({"tjanstenr": "", "anlaggnings_id": "", "saking": "—"})
@@ -686,6 +795,70 @@ class AgreementWizard(tk.Toplevel):
         self.destroy()
 
 
+# -----------------------------
+# Headless-system (samma "API" som fönstren, utan Tk)
+# -----------------------------
+class HeadlessLime:
+    """
+    LIME-modell utan UI. api_load_case() byter ärende mellan körningar.
+    Ärendet hålls som en slottad Case-post (checklistan som bitmask), så att
+    stand-in-tjänsten klarar många samtidiga ärenden i minnet.
+    """
+
+    __slots__ = ("case",)
+
+    def __init__(self, case: Optional[Dict[str, str]] = None):
+        self.case = Case.from_dict(DEFAULT_CASE)
+        if case:
+            self.api_load_case(case)
+
+    @property
+    def checklist(self) -> List[bool]:
+        return [bool(self.case.checklist >> i & 1) for i in range(len(CHECKLIST))]
+
+    def api_load_case(self, case: Dict[str, str]):
+        self.case = Case.from_dict({**DEFAULT_CASE, **case})
+
+    def api_get_case(self) -> Dict[str, str]:
+        return self.case.to_dict(len(CHECKLIST))
+
+    def api_set_status(self, status: str, reason: str = ""):
+        self.case.status = status
+        self.case.reason = reason
+
+    def api_set_check_item(self, index: int, done: bool = True):
+        if 0 <= index < len(CHECKLIST):
+            self.case.set_check(index, done)
+
+    def api_clear_checklist(self):
+        self.case.checklist = 0
+
+    def api_reset(self):
+        self.api_load_case(DEFAULT_CASE)
+
+
+class HeadlessBFUS:
+    """BFUS-modell utan UI, ovanpå BFUSStore."""
+
+    def __init__(self, store: Optional[BFUSStore] = None):
+        self.store = store or BFUSStore()
+
+    def api_update_overview(self, tjanstenr: str, anlaggnings_id: str, saking: str):
+        self.store.update_overview(tjanstenr, anlaggnings_id, saking)
+
+    def api_create_agreement(self, data: Dict[str, str]) -> str:
+        return self.store.create_agreement(data)
+
+    def api_update_overview_many(self, items: List[Dict[str, str]]) -> List[Dict]:
+        return self.store.update_overview_many(items)
+
+    def api_create_agreements(self, items: List[Dict[str, str]]) -> List[Dict]:
+        return self.store.create_agreements(items)
+
+    def api_reset(self):
+        self.store.reset()
+
+
 # -----------------------------
 # BPA engine + controller (visual)
 # -----------------------------
@@ -695,27 +868,77 @@ class Step:
     action: Callable[[], None]
 
 
+@dataclass
+class CaseRun:
+    """Ett ärende i BPAEngine.run_batch/stream: egna system-handtag och egen kontext."""
+    case_id: str
+    lime: object
+    elsmart: object
+    ctx: CaseContext = field(default_factory=CaseContext)
+    validated_ok: bool = False
+    error: str = ""
+    t0_ns: int = 0  # start för första steget (ärendelatens i metrics)
+    case_no: int = 0  # löpnummer i motorn (sampling i profiler)
+
+
+# Stegnycklar (metrics/export) i körordning
+STEP_KEYS = ("read_lime", "read_elsmart", "validate", "update_bfus", "create_agreement", "complete")
+
+
 class BPAEngine:
-    def __init__(self, lime: LimeWindow, elsmart: ElsmartWindow, bfus: BFUSWindow, log: Callable[[str], None]):
+    def __init__(self, lime: LimeWindow, elsmart: ElsmartWindow, bfus: BFUSWindow, log: Callable[[str], None],
+                 rules: Optional[DecisionTable] = None, metrics: Optional[EngineMetrics] = None,
+                 profiler: Optional[StepProfiler] = None):
         self.lime = lime
         self.elsmart = elsmart
         self.bfus = bfus
         self.log = log
+        # Avtalsregler: (kommun, säkring, kundtyp) -> företag/produkt/debitering/prisparametrar
+        self.rules = rules or DecisionTable(AGREEMENT_RULES, keys=("kommun", "saking", "kundtyp"))
+        # Latens per steg/ärende (None = ingen mätning)
+        self.metrics = metrics
+        # cProfile/tracemalloc för utvalda steg/ärenden (None = av)
+        self.profiler = profiler
+        self._case_t0 = 0
+        self._case_no = 0  # aktuellt ärendes löpnummer
+        self._case_seq = count(1)  # löpnummer; delas med fork():ade motorer
         self._steps: List[Step] = []
         self.reset()
 
     def reset(self):
         self._steps = [
-            Step("Läs ärende från LIME", self.step_read_lime),
-            Step("Hämta data från ELSMART", self.step_read_elsmart),
-            Step("Validera data", self.step_validate),
-            Step("Uppdatera BFUS (övergripande uppgifter)", self.step_update_bfus),
-            Step("Skapa avtal i BFUS", self.step_create_agreement),
-            Step("Sätt LIME-status = Klart", self.step_complete),
+            Step("Läs ärende från LIME", self._timed("read_lime", self.step_read_lime)),
+            Step("Hämta data från ELSMART", self._timed("read_elsmart", self.step_read_elsmart)),
+            Step("Validera data", self._timed("validate", self.step_validate)),
+            Step("Uppdatera BFUS (övergripande uppgifter)", self._timed("update_bfus", self.step_update_bfus)),
+            Step("Skapa avtal i BFUS", self._timed("create_agreement", self.step_create_agreement)),
+            Step("Sätt LIME-status = Klart", self._timed("complete", self.step_complete)),
         ]
-        self.ctx: Dict[str, str] = {}
+        self.ctx = CaseContext()
         self.validated_ok = False
 
+    def _timed(self, key: str, action: Callable[[], None]) -> Callable[[], None]:
+        """Mäter steget med perf_counter_ns om self.metrics är satt (och profilerar vid behov)."""
+        def run():
+            if key == STEP_KEYS[0]:
+                self._case_no = next(self._case_seq)
+            metrics = self.metrics
+            if metrics is None:
+                return self._invoke(key, action)
+            t0 = time.perf_counter_ns()
+            if key == STEP_KEYS[0]:
+                self._case_t0 = t0
+            try:
+                self._invoke(key, action)
+            except Exception:
+                metrics.record_error()
+                raise
+            t1 = time.perf_counter_ns()
+            metrics.record_step(key, t1 - t0)
+            if key == STEP_KEYS[-1]:
+                metrics.record_case(t1 - (self._case_t0 or t0))
+        return run
+
     def steps(self) -> List[Step]:
         return self._steps
 
@@ -732,35 +955,65 @@ class BPAEngine:
         self.log(f"LIME: case={case['case_id']} tjanstenr={case['tjanstenr']} kundnr={case['kundnr']}")
 
     def step_read_elsmart(self):
-        payload = self.elsmart.api_get_payload()
+        # Samma post oavsett om elsmart är ElsmartSource, fönstret eller HTTP-klienten
+        rec = ElsmartPayload.from_page(self.elsmart.api_get_payload())
         self.ctx.update({
-            "ref_nr": payload.get("Ref. nr.", self.ctx.get("ref_nr","")),
-            "anlaggnings_id": payload.get("Anläggnings-id", ""),
-            "saking": payload.get("Säkring", "16A"),
+            "ref_nr": rec.ref_nr or self.ctx.get("ref_nr", ""),
+            "anlaggnings_id": rec.anlaggnings_id,
+            "matarnr": rec.matarnr,
+            "saking": rec.saking or "16A",
+            "kommun": rec.kommun,
+            "kundtyp": rec.kundtyp,
         })
         self.lime.api_set_check_item(1, True)  # Kontrollera anläggnings-id
         self.log(f"ELSMART: anläggnings-id={self.ctx['anlaggnings_id']} säkring={self.ctx['saking']}")
 
     def step_validate(self):
-        # En enkel demo-regel: anläggnings-id måste vara 16 siffror
-        anl = self.ctx.get("anlaggnings_id","")
-        ok = bool(re.fullmatch(r"\d{16}", anl))
+        # Anläggnings-id (16 siffror + Luhn), ref. nr, mätarnr och säkringsdomän
+        reasons = validate_one(self.ctx)
+        ok = not reasons
         self.validated_ok = ok
         if ok:
             self.log("VALIDERING: OK")
         else:
-            self.log("VALIDERING: FEL – saknar/ogiltigt anläggnings-id")
-            self.lime.api_set_status("Parkerad", "Ogiltigt anläggnings-id")
+            self.log(f"VALIDERING: FEL – {', '.join(reasons).lower()}")
+            self.lime.api_set_status("Parkerad", reasons[0])
+
+    def _invoke(self, key: str, action: Callable[[], None]):
+        profiler = self.profiler
+        if profiler is None or not profiler.wants(key, self._case_no):
+            return action()
+        profiler.run(key, action, lambda: self.ctx.get("case_id") or f"case-{self._case_no}")
+
+    def _overview_payload(self) -> Dict[str, str]:
+        return {
+            "tjanstenr": self.ctx["tjanstenr"],
+            "anlaggnings_id": self.ctx["anlaggnings_id"],
+            "saking": self.ctx["saking"],
+        }
+
+    def _agreement_payload(self) -> Dict[str, str]:
+        # BPA hämtar val (företag, produkt, debitering, prisparametrar) ur beslutstabellen
+        decision = self.rules.lookup(
+            kommun=self.ctx.get("kommun", ""),
+            saking=self.ctx.get("saking", ""),
+            kundtyp=self.ctx.get("kundtyp", ""),
+        )
+        return {
+            **decision,
+            "kundnr": self.ctx["kundnr"],
+            "startdatum": _dt.date.today().isoformat(),
+            "kundref": self.ctx["tjanstenr"],
+        }
 
     def step_update_bfus(self):
         if not self.validated_ok:
             self.log("BFUS: hoppar över uppdatering (validering ej OK)")
             return
-        self.bfus.api_update_overview(
-            tjanstenr=self.ctx["tjanstenr"],
-            anlaggnings_id=self.ctx["anlaggnings_id"],
-            saking=self.ctx["saking"],
-        )
+        self.bfus.api_update_overview(**self._overview_payload())
+        self._bfus_updated()
+
+    def _bfus_updated(self):
         self.lime.api_set_check_item(3, True)  # Skapa/uppdatera BFUS
         self.log("BFUS: service uppdaterad")
 
@@ -768,23 +1021,10 @@ class BPAEngine:
         if not self.validated_ok:
             self.log("BFUS: hoppar över avtal (validering ej OK)")
             return
+        agreement_id = self.bfus.api_create_agreement(self._agreement_payload())
+        self._agreement_created(agreement_id)
 
-        # BPA sätter regler/val i en payload (i verkligheten skulle det komma från regler/tabeller)
-        startdatum = _dt.date.today().isoformat()
-        agreement_payload = {
-            "company": "Exempelbolag A",
-            "goal": "Nätavtal",
-            "kundnr": self.ctx["kundnr"],
-            "startdatum": startdatum,
-            "forbruk": "Hushåll",
-            "produkt": "Produkt 1",
-            "deb_satt": "Månadsvis",
-            "deb_formel": "Formel A",
-            "pp1": "PP1-A",
-            "pp2": "PP2-A",
-            "kundref": self.ctx["tjanstenr"],
-        }
-        agreement_id = self.bfus.api_create_agreement(agreement_payload)
+    def _agreement_created(self, agreement_id: str):
         self.lime.api_set_check_item(4, True)  # Skapa nätavtal
         self.log(f"BFUS: avtal skapat id={agreement_id}")
 
@@ -796,14 +1036,177 @@ class BPAEngine:
         self.lime.api_set_status("Klart", "")
         self.log("LIME: status satt till Klart")
 
+    # ---- Batch: flera ärenden, BFUS-stegen som bulk-anrop
+    def run_batch(self, cases: Iterable[Dict[str, str]], batch_size: int = BFUS_BATCH,
+                  bind: Optional[Callable[[Dict[str, str]], Tuple[object, object]]] = None) -> Iterator[CaseRun]:
+        """
+        Kör ärenden i mikrobatchar. Läs/validera körs per ärende; de ärenden i en
+        batch som når BFUS-stegen skickas sedan i ett api_update_overview_many-
+        och ett api_create_agreements-anrop (en rundresa per batch i stället för
+        två per ärende). bind(case) -> (lime, elsmart) för just det ärendet;
+        default är en HeadlessLime per ärende och ärendets Elsmart-sida.
+        """
+        bind = bind or self._bind_headless
+        saved = (self.lime, self.elsmart, self.ctx, self.validated_ok)
+        try:
+            it = iter(cases)
+            while True:
+                chunk = list(islice(it, batch_size))
+                if not chunk:
+                    break
+                yield from self._run_chunk([self.make_run(case, bind) for case in chunk])
+        finally:
+            self.lime, self.elsmart, self.ctx, self.validated_ok = saved
+
+    def make_run(self, case: Dict[str, str],
+                 bind: Optional[Callable[[Dict[str, str]], Tuple[object, object]]] = None) -> CaseRun:
+        """CaseRun för ärendet med handtag från bind(case); fel i bind hamnar i run.error."""
+        run = CaseRun(case.get("case_id", ""), None, None)
+        try:
+            run.lime, run.elsmart = (bind or self._bind_headless)(case)
+        except Exception as e:
+            run.error = str(e)
+            self.log(f"FEL: {run.case_id}: {e}")
+        return run
+
+    # ---- Strömmande: ett steg i taget som generator (se bpa_pipeline.py)
+    def fork(self) -> "BPAEngine":
+        """
+        Ny motor med samma BFUS, regler, mätvärden och profilerare men eget
+        ärendetillstånd – en per tråd när stegen körs samtidigt.
+        """
+        other = BPAEngine(self.lime, self.elsmart, self.bfus, self.log, rules=self.rules,
+                          metrics=self.metrics, profiler=self.profiler)
+        other._case_seq = self._case_seq
+        return other
+
+    def stream(self, key: str, runs: Iterable[CaseRun]) -> Generator[CaseRun, None, None]:
+        """
+        Steget `key` (STEP_KEYS) som generator: kör det för varje ärende i runs
+        och lämnar ärendet vidare. Ärenden med run.error passeras orörda.
+        """
+        action = self._timed(key, getattr(self, f"step_{key}"))
+        for run in runs:
+            self._each([run], action)
+            yield run
+
+    def _bind_headless(self, case: Dict[str, str]) -> Tuple[HeadlessLime, object]:
+        elsmart = ElsmartSource(Path(case["elsmart"])) if case.get("elsmart") else self.elsmart
+        return HeadlessLime(case), elsmart
+
+    def _enter(self, run: CaseRun):
+        self.lime, self.elsmart, self.ctx, self.validated_ok = run.lime, run.elsmart, run.ctx, run.validated_ok
+        self._case_t0 = run.t0_ns
+        self._case_no = run.case_no
+
+    def _each(self, runs: List[CaseRun], action: Callable[[], None]):
+        for run in runs:
+            if run.error:
+                continue
+            self._enter(run)
+            try:
+                action()
+            except Exception as e:
+                run.error = str(e)
+                self.log(f"FEL: {run.case_id}: {e}")
+            run.validated_ok = self.validated_ok
+            run.t0_ns = self._case_t0
+            run.case_no = self._case_no
+
+    def _bulk(self, key: str, runs: List[CaseRun], call: Callable[[List[Dict]], List[Dict]],
+              payload: Callable[[], Dict[str, str]], done: Callable[[Dict], None]):
+        t0 = time.perf_counter_ns()
+        ready: List[CaseRun] = []
+        items = []
+        for run in runs:
+            if not run.validated_ok or run.error:
+                continue
+            self._enter(run)
+            try:
+                items.append(payload())  # t.ex. RuleError från regeluppslaget – bara det ärendet faller
+            except Exception as e:
+                run.error = str(e)
+                self.log(f"FEL: {run.case_id}: {e}")
+                continue
+            ready.append(run)
+        if not ready:
+            return
+        results: List[Dict] = []
+
+        def do_call():
+            results[:] = call(items)
+
+        try:
+            profiler = self.profiler
+            if profiler is not None and any(profiler.wants(key, r.case_no) for r in ready):
+                # Bulk-anropet profileras som helhet, under första ärendets id
+                profiler.run(key, do_call, lambda: f"batch-{ready[0].case_id}")
+            else:
+                do_call()
+        except Exception as e:
+            results = [{"ok": False, "error": str(e)}] * len(ready)
+        if len(results) != len(ready):
+            # Resultaten går inte att para ihop med ärendena – inget ärende får räknas som klart
+            error = f"bulk-anropet gav {len(results)} resultat för {len(ready)} poster"
+            results = [{"ok": False, "error": error}] * len(ready)
+        # Bulk-anropets tid fördelas lika på ärendena i batchen
+        share = (time.perf_counter_ns() - t0) // len(ready)
+        for run, res in zip(ready, results):
+            self._enter(run)
+            try:
+                if res.get("ok"):
+                    t1 = time.perf_counter_ns()
+                    done(res)
+                    if self.metrics is not None:
+                        self.metrics.record_step(key, share + time.perf_counter_ns() - t1)
+                    continue
+                run.error = res.get("error", "okänt fel")
+                run.validated_ok = False
+                self.log(f"BFUS: {run.case_id} misslyckades – {run.error}")
+                self.lime.api_set_status("Parkerad", f"BFUS: {run.error}")
+            except Exception as e:
+                run.error = run.error or str(e)
+                self.log(f"FEL: {run.case_id}: {e}")
+
+    def _run_chunk(self, runs: List[CaseRun]) -> List[CaseRun]:
+        for key, step in (("read_lime", self.step_read_lime), ("read_elsmart", self.step_read_elsmart),
+                          ("validate", self.step_validate)):
+            self._each(runs, self._timed(key, step))
+        self._bulk("update_bfus", runs, self.bfus.api_update_overview_many, self._overview_payload,
+                   lambda res: self._bfus_updated())
+        self._bulk("create_agreement", runs, self.bfus.api_create_agreements, self._agreement_payload,
+                   lambda res: self._agreement_created(res["agreement_id"]))
+        self._each(runs, self._timed("complete", self.step_complete))
+        return runs
+
 
 class BPAController(tk.Toplevel):
-    def __init__(self, master: tk.Tk, engine: BPAEngine):
+    """
+    Kontrollpanel. Motorn körs i en arbetstråd så att fönstren inte fryser
+    under långsamma steg: Tk-fönstren nås via MainThreadProxy och loggrader,
+    progress m.m. postas till self.bridge, som tömmer dem i en after()-poll
+    per bildruta (tk_bridge.py).
+    """
+
+    METRICS_MS = 500  # uppdateringsintervall för latenstabellen
+    LOG_ROWS = 2000   # äldre loggrader tas bort
+    STEP_DELAY_S = 0.25  # paus före varje steg (visuellt)
+    STEP_GAP_S = 0.45    # paus mellan stegen vid "Kör hela processen"
+
+    def __init__(self, master: tk.Tk, engine: BPAEngine, metrics_out: Optional[Path] = None):
         super().__init__(master)
         self.engine = engine
+        if engine.metrics is None:
+            engine.metrics = EngineMetrics()
+        self.bridge = UiBridge(self)
+        for name in ("lime", "elsmart", "bfus"):
+            system = getattr(engine, name)
+            if isinstance(system, tk.Misc):
+                setattr(engine, name, MainThreadProxy(system, self.bridge))
+        self.metrics_out = metrics_out
         self.title("BPA Controller – Process Monitor")
-        self.geometry("760x520")
-        self.minsize(720, 480)
+        self.geometry("760x680")
+        self.minsize(720, 600)
 
         top = tk.Frame(self, bg="#0f172a", height=48)
         top.pack(fill="x")
@@ -821,6 +1224,8 @@ class BPAController(tk.Toplevel):
         ttk.Button(ctrl, text="Kör hela processen", command=self.run_all).pack(side="left")
         ttk.Button(ctrl, text="Kör nästa steg", command=self.run_next).pack(side="left", padx=(8,0))
         ttk.Button(ctrl, text="Återställ", command=self.reset_all).pack(side="left", padx=(8,0))
+        ttk.Button(ctrl, text="Kör ärendefil…", command=self.run_file).pack(side="left", padx=(8,0))
+        ttk.Button(ctrl, text="Exportera mätvärden…", command=self.export_metrics).pack(side="right")
 
         self.pb = ttk.Progressbar(body, mode="determinate", maximum=len(self.engine.steps()))
         self.pb.pack(fill="x", pady=(12, 6))
@@ -837,15 +1242,84 @@ class BPAController(tk.Toplevel):
         self.tree.column("msg", width=600, anchor="w")
         self.tree.pack(fill="both", expand=True)
 
+        # latens per steg (p50/p95/p99) + genomströmning
+        stats = ttk.LabelFrame(body, text="Mätvärden", padding=(8, 6))
+        stats.pack(fill="x", pady=(10, 0))
+        self.var_rate = tk.StringVar(value="Ärenden: 0 • 0.0 ärenden/s")
+        ttk.Label(stats, textvariable=self.var_rate).pack(anchor="w", pady=(0, 4))
+        self.stats = VirtualTable(stats, ("Steg", "Antal", "p50", "p95", "p99"), height=len(STEP_KEYS) + 1,
+                                  default_width=90, widths={"Steg": 180},
+                                  rows=[(k, "0", "–", "–", "–") for k in (*STEP_KEYS, "ärende")])
+        self.stats.pack(fill="x")
+        self._metrics_seen = -1
+
         self._cursor = 0
         self._running = False
+        self._worker: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._pending_reset = False
+
+        self.bridge.on("log", self._on_log, "batch")
+        self.bridge.on("step", self._on_step, "latest")
+        self.bridge.on("progress", self._on_progress, "latest")
+        self.bridge.on("cases", self._on_cases, "latest")
+        self.bridge.on("error", self._on_error)
+        self.bridge.on("finished", self._on_finished)
+        self.bridge.on("idle", self._on_idle)
+        self.bridge.start()
+        self._refresh_metrics()
 
     def log(self, msg: str):
-        ts = _dt.datetime.now().strftime("%H:%M:%S")
-        self.tree.insert("", "end", values=(ts, msg))
+        """Trådsäker: raden postas och ritas i nästa poll (flera rader per poll i en omgång)."""
+        self.bridge.post("log", _dt.datetime.now().strftime("%H:%M:%S"), msg)
+
+    def _on_log(self, items: List[Tuple[str, str]]):
+        for ts, msg in items[-self.LOG_ROWS:]:
+            self.tree.insert("", "end", values=(ts, msg))
+        children = self.tree.get_children()
+        if len(children) > self.LOG_ROWS:
+            self.tree.delete(*children[:len(children) - self.LOG_ROWS])
         self.tree.yview_moveto(1)
 
+    def _refresh_metrics(self):
+        if not self.winfo_exists():
+            return
+        try:
+            m = self.engine.metrics
+            seen = m.recorded()
+            if seen != self._metrics_seen:  # ritar bara om när något mätts sedan sist
+                self._metrics_seen = seen
+                snap = m.snapshot()
+                summaries = [(k, snap["steps"].get(k)) for k in STEP_KEYS] + [("ärende", snap["case"])]
+                for i, (key, s) in enumerate(summaries):
+                    if not s or not s["count"]:
+                        continue
+                    row = (key, str(s["count"]), fmt_seconds(s["p50"]), fmt_seconds(s["p95"]), fmt_seconds(s["p99"]))
+                    for col, value in zip(self.stats.columns[1:], row[1:]):
+                        self.stats.set_cell(i, col, value)
+                self.var_rate.set(f"Ärenden: {snap['cases']} • {snap['cases_per_sec']:.1f} ärenden/s")
+        finally:
+            # Ett fel i en uppdatering får inte frysa panelen resten av sessionen
+            self.after(self.METRICS_MS, self._refresh_metrics)
+
+    def export_metrics(self, path: Optional[Path] = None):
+        if path is None:
+            name = filedialog.asksaveasfilename(
+                parent=self, title="Exportera mätvärden", defaultextension=".prom",
+                filetypes=[("Prometheus", "*.prom"), ("JSON", "*.json")],
+            )
+            if not name:
+                return
+            path = Path(name)
+        self.engine.metrics.export(path)
+        self.log(f"METRICS: exporterat till {path}")
+
     def reset_all(self):
+        if self._busy():
+            # Arbetstråden stoppas mellan två steg; återställningen görs när den släppt (_on_idle)
+            self._stop.set()
+            self._pending_reset = True
+            return
         self._running = False
         self._cursor = 0
         self.pb["value"] = 0
@@ -860,54 +1334,142 @@ class BPAController(tk.Toplevel):
         self.engine.reset()
         self.log("RESET: allt återställt")
 
-    def _run_step(self, step_index: int):
+    # ---- Arbetstråd: motorn körs här, UI:t uppdateras via self.bridge
+    def _busy(self) -> bool:
+        return self._worker is not None and self._worker.is_alive()
+
+    def _start_worker(self, target: Callable, *args) -> bool:
+        if self._busy():
+            return False
+        self._stop.clear()
+
+        def run():
+            try:
+                target(*args)
+            except Exception as e:
+                self.log(f"FEL: {e}")
+            finally:
+                self.bridge.post("idle")
+
+        self._worker = threading.Thread(target=run, name="bpa-engine", daemon=True)
+        self._worker.start()
+        return True
+
+    def _run_steps(self, all_steps: bool):
         steps = self.engine.steps()
-        if step_index >= len(steps):
-            self._running = False
-            self.var_step.set("Klar ✅")
-            return
+        while self._cursor < len(steps) and not self._stop.is_set():
+            idx = self._cursor
+            step = steps[idx]
+            self.bridge.post("step", f"Steg {idx+1}/{len(steps)}: {step.name}")
+            self.log(f"START: {step.name}")
+            # Gör det visuellt: liten paus så publiken hinner se
+            if self._stop.wait(self.STEP_DELAY_S):
+                return
+            try:
+                step.action()
+            except Exception as e:
+                self.log(f"FEL: {e}")
+                self.bridge.post("error", step.name, str(e))
+                return
+            self._cursor = idx + 1
+            self.bridge.post("progress", idx + 1)
+            self.log(f"OK: {step.name}")
+            if not all_steps or self._stop.wait(self.STEP_GAP_S):
+                break
+        if self._cursor >= len(steps):
+            self.bridge.post("finished")
+
+    def _run_cases(self, path: Path):
+        """Ärendefil (case_generator) headless i arbetstråden; progress postas per ärende, ritas per poll."""
+        engine = BPAEngine(HeadlessLime(), ElsmartSource(), HeadlessBFUS(), log=lambda s: None,
+                           rules=self.engine.rules, metrics=self.engine.metrics, profiler=self.engine.profiler)
+        counts = {"ok": 0, "parked": 0, "failed": 0}
+        self.log(f"ÄRENDEFIL: {path}")
+        for run in engine.run_batch(load_cases(path)):
+            counts["failed" if run.error else "ok" if run.validated_ok else "parked"] += 1
+            self.bridge.post("cases", sum(counts.values()), counts["ok"], counts["parked"], counts["failed"])
+            if self._stop.is_set():
+                break
+        self.log(f"ÄRENDEFIL: {sum(counts.values())} ärenden (klara {counts['ok']}, "
+                 f"parkerade {counts['parked']}, fel {counts['failed']})")
+        self.bridge.post("finished")
 
-        step = steps[step_index]
-        self.var_step.set(f"Steg {step_index+1}/{len(steps)}: {step.name}")
-        self.log(f"START: {step.name}")
+    # ---- Händelser från arbetstråden (körs i huvudtråden)
+    def _on_step(self, text: str):
+        self.var_step.set(text)
 
-        # Gör det visuellt: liten paus så publiken hinner se
-        self.after(250, lambda: self._execute(step, step_index))
+    def _on_progress(self, done: int):
+        self.pb["value"] = done
 
-    def _execute(self, step: Step, idx: int):
-        try:
-            step.action()
-        except Exception as e:
-            self._running = False
-            self.log(f"FEL: {e}")
-            messagebox.showerror("BPA", f"Steg misslyckades: {step.name}\n\n{e}")
-            return
+    def _on_cases(self, n: int, ok: int, parked: int, failed: int):
+        self.var_step.set(f"Ärendefil: {n} ärenden • klara {ok} • parkerade {parked} • fel {failed}")
 
-        self.pb["value"] = idx + 1
-        self.log(f"OK: {step.name}")
+    def _on_error(self, name: str, msg: str):
+        self._running = False
+        messagebox.showerror("BPA", f"Steg misslyckades: {name}\n\n{msg}")
 
-        self._cursor = idx + 1
-        if self._running:
-            self.after(450, self.run_next)
+    def _on_finished(self):
+        if self._cursor >= len(self.engine.steps()):
+            self.var_step.set("Klar ✅")
+        self._running = False
+        self._run_finished()
+
+    def _on_idle(self):
+        self._running = False
+        if self._pending_reset:
+            self._pending_reset = False
+            self.reset_all()
+
+    def _run_finished(self):
+        if self.metrics_out:
+            self.export_metrics(self.metrics_out)
 
     def run_next(self):
         if self._cursor >= len(self.engine.steps()):
             self.var_step.set("Klar ✅")
             self._running = False
+            self._run_finished()
             return
-        self._run_step(self._cursor)
+        self._start_worker(self._run_steps, False)
 
     def run_all(self):
-        if self._running:
+        if self._running or self._busy():
+            return
+        self._running = True
+        if self._cursor >= len(self.engine.steps()):
+            self.run_next()
             return
+        self._start_worker(self._run_steps, True)
+
+    def run_file(self, path: Optional[Path] = None):
+        if self._busy():
+            return
+        if path is None:
+            name = filedialog.askopenfilename(parent=self, title="Kör ärendefil",
+                                              filetypes=[("Ärenden", "*.jsonl"), ("Alla filer", "*.*")])
+            if not name:
+                return
+            path = Path(name)
         self._running = True
-        self.run_next()
+        self._start_worker(self._run_cases, path)
 
 
 # -----------------------------
 # App bootstrap
 # -----------------------------
 def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--metrics-out", type=Path, default=None,
+                    help="exportera mätvärden efter varje körning (.json = JSON, annars Prometheus-text)")
+    ap.add_argument("--profile-steps", type=parse_steps, default=frozenset(),
+                    help="profilera dessa steg, t.ex. read_elsmart,validate")
+    ap.add_argument("--profile-every", type=int, default=0, help="profilera alla steg i vart N:te ärende")
+    ap.add_argument("--profile-out", type=Path, default=Path("profiles"))
+    args = ap.parse_args()
+    profiler = None
+    if args.profile_steps or args.profile_every:
+        profiler = StepProfiler(args.profile_out, steps=args.profile_steps, every_nth=args.profile_every)
+
     root = tk.Tk()
     root.withdraw()  # vi visar bara toplevel-fönster
 
@@ -925,8 +1487,9 @@ def main():
 
     def make_controller():
         nonlocal controller
-        engine = BPAEngine(lime, elsmart, bfus, log=lambda s: controller.log(s) if controller else None)
-        controller = BPAController(root, engine)
+        engine = BPAEngine(lime, elsmart, bfus, log=lambda s: controller.log(s) if controller else None,
+                           profiler=profiler)
+        controller = BPAController(root, engine, metrics_out=args.metrics_out)
         controller.geometry("+720+580")
         # koppla engine.log säkert efter controller skapats
         engine.log = controller.log
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Mätvärden för BPAEngine: latenshistogram per steg + genomströmning.
+
+- Tider mäts med time.perf_counter_ns() och läggs i HDR-liknande histogram:
+  log-linjära hinkar (SUB_BITS bitars mantissa per tvåpotens) ger ~1 % relativ
+  precision från 1 ns till timmar i några tusen heltal, oavsett antal värden.
+- EngineMetrics håller ett histogram per steg + ett för hela ärendet, antal
+  klara ärenden och ärenden/s.
+- Export i Prometheus textformat (summary med kvantiler) eller JSON.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+SUB_BITS = 7                  # 128 hinkar per tvåpotens (~0,8 % relativt fel)
+SUB = 1 << SUB_BITS
+HALF = SUB >> 1
+MAX_SHIFT = 40                # värden upp till ~2^47 ns (~39 h)
+N_BUCKETS = SUB + MAX_SHIFT * HALF
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _bucket(v: int) -> int:
+    if v < SUB:
+        return v if v > 0 else 0
+    shift = v.bit_length() - SUB_BITS
+    if shift > MAX_SHIFT:
+        return N_BUCKETS - 1
+    return SUB + (shift - 1) * HALF + ((v >> shift) - HALF)
+
+
+def _bucket_value(idx: int) -> int:
+    """Mittvärde för hinken (det som rapporteras för en kvantil)."""
+    if idx < SUB:
+        return idx
+    shift = (idx - SUB) // HALF + 1
+    mantissa = (idx - SUB) % HALF + HALF
+    low = mantissa << shift
+    return low + ((1 << shift) >> 1)
+
+
+class Histogram:
+    """Log-linjärt histogram över heltal (ns). Konstant minne, O(1) record."""
+
+    __slots__ = ("counts", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.counts = array("Q", bytes(8 * N_BUCKETS))
+        self.count = 0
+        self.total = 0
+        self.min = 0
+        self.max = 0
+
+    def record(self, value_ns: int):
+        self.counts[_bucket(value_ns)] += 1
+        if self.count == 0 or value_ns < self.min:
+            self.min = value_ns
+        if value_ns > self.max:
+            self.max = value_ns
+        self.count += 1
+        self.total += value_ns
+
+    def merge(self, other: "Histogram"):
+        if not other.count:
+            return
+        for i, c in enumerate(other.counts):
+            if c:
+                self.counts[i] += c
+        self.min = other.min if self.count == 0 else min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.count += other.count
+        self.total += other.total
+
+    def quantile(self, q: float) -> int:
+        """Värdet (ns) under vilket andelen q av mätningarna ligger."""
+        if not self.count:
+            return 0
+        rank = max(1, int(q * self.count + 0.5))
+        seen = 0
+        for i, c in enumerate(self.counts):
+            if c:
+                seen += c
+                if seen >= rank:
+                    return min(max(_bucket_value(i), self.min), self.max)
+        return self.max
+
+    def quantiles(self, qs: Iterable[float] = QUANTILES) -> Dict[float, int]:
+        """Flera kvantiler i ett svep över hinkarna."""
+        qs = sorted(qs)
+        out: Dict[float, int] = {}
+        if not self.count:
+            return {q: 0 for q in qs}
+        ranks = [(q, max(1, int(q * self.count + 0.5))) for q in qs]
+        seen = 0
+        it = iter(ranks)
+        q, rank = next(it)
+        for i, c in enumerate(self.counts):
+            if not c:
+                continue
+            seen += c
+            while seen >= rank:
+                out[q] = min(max(_bucket_value(i), self.min), self.max)
+                try:
+                    q, rank = next(it)
+                except StopIteration:
+                    return out
+        for q, _ in ranks:
+            out.setdefault(q, self.max)
+        return out
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+class EngineMetrics:
+    """
+    Histogram per steg + per ärende. Trådsäker (ett lås runt record), men
+    flera motorer i olika trådar bör helst ha egna instanser och merge():as.
+    """
+
+    def __init__(self):
+        self.steps: Dict[str, Histogram] = {}
+        self.case = Histogram()
+        self.cases = 0
+        self.errors = 0
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def record_step(self, step: str, ns: int):
+        with self._lock:
+            if self.started is None:
+                self.started = time.perf_counter() - ns / 1e9
+            hist = self.steps.get(step)
+            if hist is None:
+                hist = self.steps[step] = Histogram()
+            hist.record(ns)
+
+    def record_case(self, ns: int):
+        with self._lock:
+            self.cases += 1
+            self.case.record(ns)
+            self.finished = time.perf_counter()
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def merge(self, other: "EngineMetrics"):
+        with self._lock:
+            for name, hist in other.steps.items():
+                self.steps.setdefault(name, Histogram()).merge(hist)
+            self.case.merge(other.case)
+            self.cases += other.cases
+            self.errors += other.errors
+            if other.started is not None:
+                self.started = other.started if self.started is None else min(self.started, other.started)
+            if other.finished is not None:
+                self.finished = other.finished if self.finished is None else max(self.finished, other.finished)
+
+    def recorded(self) -> int:
+        """Antal mätningar hittills (alla steg) – billig koll om något nytt mätts."""
+        with self._lock:  # workers lägger till steg i self.steps under tiden
+            return sum(h.count for h in self.steps.values())
+
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+        end = self.finished if self.finished is not None else time.perf_counter()
+        return max(end - self.started, 0.0)
+
+    def cases_per_sec(self) -> float:
+        elapsed = self.elapsed()
+        return self.cases / elapsed if elapsed > 0 else 0.0
+
+    def snapshot(self) -> Dict:
+        """Sammanställning (ns → sekunder) för UI och export."""
+        def summary(h: Histogram) -> Dict:
+            qs = h.quantiles()
+            return {
+                "count": h.count,
+                "sum": h.total / 1e9,
+                "mean": h.mean / 1e9,
+                "min": h.min / 1e9,
+                "max": h.max / 1e9,
+                "p50": qs[0.5] / 1e9,
+                "p95": qs[0.95] / 1e9,
+                "p99": qs[0.99] / 1e9,
+            }
+
+        with self._lock:
+            return {
+                "cases": self.cases,
+                "errors": self.errors,
+                "elapsed_seconds": self.elapsed(),
+                "cases_per_sec": self.cases_per_sec(),
+                "case": summary(self.case),
+                "steps": {name: summary(h) for name, h in self.steps.items()},
+            }
+
+    # ---- Export
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2, ensure_ascii=False)
+
+    def to_prometheus(self, prefix: str = "bpa") -> str:
+        snap = self.snapshot()
+        lines = [
+            f"# HELP {prefix}_step_duration_seconds Tid per BPA-steg och ärende.",
+            f"# TYPE {prefix}_step_duration_seconds summary",
+        ]
+        for name, s in snap["steps"].items():
+            label = name.replace("\\", "\\\\").replace('"', '\\"')
+            for q in QUANTILES:
+                lines.append(f'{prefix}_step_duration_seconds{{step="{label}",quantile="{q}"}} '
+                             f'{s[f"p{int(q * 100)}"]:.9f}')
+            lines.append(f'{prefix}_step_duration_seconds_sum{{step="{label}"}} {s["sum"]:.9f}')
+            lines.append(f'{prefix}_step_duration_seconds_count{{step="{label}"}} {s["count"]}')
+        c = snap["case"]
+        lines += [
+            f"# HELP {prefix}_case_duration_seconds Tid per ärende (första till sista steget).",
+            f"# TYPE {prefix}_case_duration_seconds summary",
+        ]
+        for q in QUANTILES:
+            lines.append(f'{prefix}_case_duration_seconds{{quantile="{q}"}} {c[f"p{int(q * 100)}"]:.9f}')
+        lines += [
+            f"{prefix}_case_duration_seconds_sum {c['sum']:.9f}",
+            f"{prefix}_case_duration_seconds_count {c['count']}",
+            f"# HELP {prefix}_cases_total Klara ärenden.",
+            f"# TYPE {prefix}_cases_total counter",
+            f"{prefix}_cases_total {snap['cases']}",
+            f"# HELP {prefix}_errors_total Steg som kastat fel.",
+            f"# TYPE {prefix}_errors_total counter",
+            f"{prefix}_errors_total {snap['errors']}",
+            f"# HELP {prefix}_cases_per_second Genomströmning över körningen.",
+            f"# TYPE {prefix}_cases_per_second gauge",
+            f"{prefix}_cases_per_second {snap['cases_per_sec']:.3f}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: Path):
+        """Skriver .json som JSON, allt annat (t.ex. .prom/.txt) som Prometheus-text."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        text = self.to_json() if path.suffix.lower() == ".json" else self.to_prometheus()
+        path.write_text(text, encoding="utf-8")
+
+
+def fmt_seconds(seconds: float) -> str:
+    """Kort tidsformat för UI (sekunder in)."""
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.0f} µs"
+    if seconds < 1:
+        return f"{seconds * 1e3:.1f} ms"
+    return f"{seconds:.2f} s"
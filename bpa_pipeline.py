@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+BPA-processen som strömmande pipeline.
+
+Varje steg (läs LIME → Elsmart → validera → BFUS → avtal → klart) är en
+generator, BPAEngine.stream(key, runs), som tar ärenden (CaseRun) och lämnar
+dem vidare. Mellan stegen sitter begränsade köer, buffered(), och varje steg
+körs i en egen tråd. Stegen överlappar alltså i tid (ärende n valideras medan
+n+1 läses från Elsmart), och som mest stages × queue_size ärenden finns i
+minnet samtidigt – en indatafil på 1M ärenden läses strömmande i konstant
+minne. (BFUS-lagret växer förstås med antalet skapade avtal.)
+
+Kör (headless, HeadlessLime/ElsmartSource/HeadlessBFUS):
+  python bpa_pipeline.py --cases gen/100k/cases.jsonl --queue-size 64
+
+Mot HTTP-tjänsterna: python stand_in_services.py run --pipeline ...
+
+StagedExecutor är samma sak med en trådpool per steg: långsamma steg (t.ex.
+create_agreement mot BFUS) får fler trådar, snabba (validate) en. Varje steg
+har en egen begränsad inkö; är den full väntar föregående steg (mottryck i
+stället för obegränsad buffring). queue_stats() visar ködjupet per steg –
+steget med full inkö är flaskhalsen. Ordningen mellan ärenden bevaras inte
+när ett steg har flera trådar.
+
+  python bpa_pipeline.py --cases gen/100k/cases.jsonl --stage-workers create_agreement=4,update_bfus=2 \
+      --report-every 1
+
+Obs: stegen körs i trådar, så pipelinen är för headless-/HTTP-systemen –
+inte för Tk-fönstren, som bara får röras från huvudtråden.
+"""
+
+from __future__ import annotations
+
+import argparse
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+from bpa_demo_v2 import STEP_KEYS, BPAEngine, CaseRun, ElsmartSource, HeadlessBFUS, HeadlessLime
+from bpa_metrics import EngineMetrics
+from case_generator import load_cases
+
+T = TypeVar("T")
+
+QUEUE_SIZE = 64     # ärenden per kö mellan två steg
+POLL_S = 0.1        # hur ofta en blockerad producent kollar om konsumenten gett upp
+
+Bind = Callable[[Dict[str, str]], Tuple[object, object]]
+
+
+class _Raised:
+    """Undantag från producenttråden, skickas i kön och kastas hos konsumenten."""
+
+    __slots__ = ("exc",)
+
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+_END = object()
+
+
+def buffered(source: Iterable[T], maxsize: int = QUEUE_SIZE, name: str = "stage") -> Iterator[T]:
+    """
+    Itererar source i en egen tråd och lämnar värdena via en kö med plats för
+    maxsize. Full kö → producenten väntar (mottryck). Slutar konsumenten läsa
+    (break/close) stoppas producenten och source stängs. Tråden startar först
+    när det första värdet efterfrågas.
+    """
+    q: "queue.Queue" = queue.Queue(maxsize)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=POLL_S)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        it = iter(source)
+        end = _END
+        try:
+            for item in it:
+                if not put(item):
+                    return
+        except Exception as e:
+            end = _Raised(e)
+        finally:
+            close = getattr(it, "close", None)
+            if close is not None:
+                close()
+        put(end)
+
+    threading.Thread(target=produce, name=f"bpa-{name}", daemon=True).start()
+    try:
+        while True:
+            item = q.get()
+            if item is _END:
+                return
+            if type(item) is _Raised:
+                raise item.exc
+            yield item
+    finally:
+        stop.set()
+
+
+def pipeline(engine: BPAEngine, cases: Iterable[Dict[str, str]], bind: Optional[Bind] = None,
+             queue_size: int = QUEUE_SIZE) -> Iterator[CaseRun]:
+    """
+    Kör ärendena genom alla steg, ett steg per tråd. Lämnar varje CaseRun när
+    den passerat sista steget (i indataordning). bind(case) -> (lime, elsmart)
+    som i run_batch; default är en HeadlessLime per ärende.
+    """
+    runs: Iterable[CaseRun] = buffered((engine.make_run(case, bind) for case in cases), queue_size, "bind")
+    for key in STEP_KEYS:
+        runs = buffered(engine.fork().stream(key, runs), queue_size, key)
+    return runs
+
+
+# -----------------------------
+# Trådpool per steg
+# -----------------------------
+STAGE_KEYS = ("bind",) + STEP_KEYS  # bind = ladda ärendet (make_run), sedan stegen
+
+
+@dataclass
+class StageStats:
+    key: str
+    workers: int
+    queue_size: int
+    depth: int = 0       # ärenden i inkön just nu
+    max_depth: int = 0   # högsta observerade ködjup
+    done: int = 0        # ärenden som passerat steget
+
+
+class StagedExecutor:
+    """
+    Kör ärenden genom STAGE_KEYS med workers[key] trådar per steg (default 1)
+    och en inkö med plats för queue_sizes[key] (default queue_size) per steg.
+    Varje tråd har en egen fork() av motorn och kör engine.stream() över
+    inkön. Ett StagedExecutor-objekt kör en ström åt gången.
+    """
+
+    def __init__(self, engine: BPAEngine, bind: Optional[Bind] = None, workers: Optional[Dict[str, int]] = None,
+                 queue_size: int = QUEUE_SIZE, queue_sizes: Optional[Dict[str, int]] = None):
+        workers = workers or {}
+        queue_sizes = queue_sizes or {}
+        unknown = (set(workers) | set(queue_sizes)) - set(STAGE_KEYS)
+        if unknown:
+            raise ValueError(f"Okända steg: {', '.join(sorted(unknown))} (giltiga: {', '.join(STAGE_KEYS)})")
+        self.engine = engine
+        self.bind = bind
+        self.stats = [StageStats(key, max(1, workers.get(key, 1)), max(1, queue_sizes.get(key, queue_size)))
+                      for key in STAGE_KEYS]
+        self._queues: List["queue.Queue"] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._error: Optional[BaseException] = None
+
+    # ---- Köer
+    def _put(self, q: "queue.Queue", item) -> bool:
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=POLL_S)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _get(self, q: "queue.Queue"):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=POLL_S)
+            except queue.Empty:
+                pass
+        return _END
+
+    def _drain(self, i: int) -> Iterator:
+        """Steg i:s inkö som iterator; _END läggs tillbaka så att stegets övriga trådar också slutar."""
+        q = self._queues[i]
+        while True:
+            item = self._get(q)
+            if item is _END:
+                self._put(q, _END)
+                return
+            yield item
+
+    # ---- Trådar
+    def _worker(self, i: int, remaining: List[int]):
+        st = self.stats[i]
+        out = self._queues[i + 1]
+        try:
+            if st.key == "bind":
+                engine = self.engine
+                results: Iterable = (engine.make_run(case, self.bind) for case in self._drain(i))
+            else:
+                results = self.engine.fork().stream(st.key, self._drain(i))
+            for run in results:
+                with self._lock:
+                    st.done += 1
+                if not self._put(out, run):
+                    return
+        except Exception as e:  # stegfel hamnar i run.error; detta är fel i själva maskineriet
+            self._error = self._error or e
+            self._stop.set()
+        finally:
+            with self._lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                self._put(out, _END)
+
+    def _feed(self, cases: Iterable[Dict[str, str]]):
+        try:
+            for case in cases:
+                if not self._put(self._queues[0], case):
+                    return
+        except Exception as e:
+            self._error = self._error or e
+            self._stop.set()
+            return
+        self._put(self._queues[0], _END)
+
+    def run(self, cases: Iterable[Dict[str, str]]) -> Iterator[CaseRun]:
+        """Lämnar varje CaseRun efter sista steget. Avbryts iterationen stoppas alla trådar."""
+        self._stop.clear()
+        self._error = None
+        for st in self.stats:
+            st.depth = st.max_depth = st.done = 0
+        self._queues = [queue.Queue(st.queue_size) for st in self.stats]
+        self._queues.append(queue.Queue(QUEUE_SIZE))  # utkö
+        threads = [threading.Thread(target=self._feed, args=(cases,), name="bpa-feed", daemon=True)]
+        for i, st in enumerate(self.stats):
+            remaining = [st.workers]
+            threads += [threading.Thread(target=self._worker, args=(i, remaining), name=f"bpa-{st.key}-{n}",
+                                         daemon=True) for n in range(st.workers)]
+        for t in threads:
+            t.start()
+        try:
+            while True:
+                item = self._get(self._queues[-1])
+                if item is _END:
+                    break
+                self.queue_stats()
+                yield item
+            if self._error is not None:
+                raise self._error
+        finally:
+            self._stop.set()
+
+    def queue_stats(self) -> List[StageStats]:
+        """Aktuellt ködjup per steg (uppdaterar även max_depth)."""
+        for st, q in zip(self.stats, self._queues):
+            st.depth = q.qsize()
+            if st.depth > st.max_depth:
+                st.max_depth = st.depth
+        return self.stats
+
+    def report(self) -> str:
+        return "  ".join(f"{st.key}[{st.workers}] {st.depth}/{st.queue_size}" for st in self.queue_stats())
+
+
+def parse_stage_ints(text: str) -> Dict[str, int]:
+    """'create_agreement=4,update_bfus=2' → {"create_agreement": 4, "update_bfus": 2}"""
+    out: Dict[str, int] = {}
+    for part in text.split(","):
+        if part.strip():
+            key, _, value = part.partition("=")
+            out[key.strip()] = int(value)
+    return out
+
+
+def tally(runs: Iterable[CaseRun], executor: Optional[StagedExecutor] = None,
+          report_every: float = 0.0) -> Dict[str, float]:
+    """
+    Räknar klara/parkerade/felade ärenden och ärenden/s när runs töms.
+    Med executor och report_every skrivs ködjupet per steg ut med det intervallet.
+    """
+    counts = {"ok": 0, "parked": 0, "failed": 0}
+    t0 = next_report = time.perf_counter()
+    for run in runs:
+        counts["failed" if run.error else "ok" if run.validated_ok else "parked"] += 1
+        if executor is not None and report_every > 0 and time.perf_counter() >= next_report:
+            print(executor.report(), flush=True)
+            next_report += report_every
+    elapsed = time.perf_counter() - t0
+    total = sum(counts.values())
+    return {**counts, "cases": total, "seconds": elapsed, "cases_per_sec": total / elapsed if elapsed else 0.0}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="BPA-processen som strömmande pipeline (headless)")
+    ap.add_argument("--cases", type=Path, required=True, help="cases.jsonl från case_generator.py")
+    ap.add_argument("--queue-size", type=int, default=QUEUE_SIZE)
+    ap.add_argument("--stage-workers", type=parse_stage_ints, default={},
+                    help="trådar per steg, t.ex. create_agreement=4,update_bfus=2 (StagedExecutor)")
+    ap.add_argument("--stage-queues", type=parse_stage_ints, default={}, help="inkö per steg, t.ex. validate=16")
+    ap.add_argument("--report-every", type=float, default=0.0, help="skriv ködjup per steg var N:e sekund")
+    ap.add_argument("--metrics-out", type=Path, default=None, help="latens per steg (.json eller Prometheus-text)")
+    args = ap.parse_args()
+
+    metrics = EngineMetrics() if args.metrics_out else None
+    engine = BPAEngine(HeadlessLime(), ElsmartSource(), HeadlessBFUS(), log=lambda s: None, metrics=metrics)
+    cases = load_cases(args.cases)
+    if args.stage_workers or args.stage_queues or args.report_every:
+        executor = StagedExecutor(engine, workers=args.stage_workers, queue_size=args.queue_size,
+                                  queue_sizes=args.stage_queues)
+        stats = tally(executor.run(cases), executor, args.report_every)
+        print("Max ködjup: " + "  ".join(f"{st.key} {st.max_depth}/{st.queue_size}" for st in executor.stats))
+    else:
+        stats = tally(pipeline(engine, cases, queue_size=args.queue_size))
+    print(f"{stats['cases']} ärenden på {stats['seconds']:.2f} s = {stats['cases_per_sec']:.0f} ärenden/s "
+          f"(ok {stats['ok']}, parkerade {stats['parked']}, fel {stats['failed']})")
+    if metrics is not None:
+        metrics.export(args.metrics_out)
+        print(f"Mätvärden: {args.metrics_out}")
+
+
+if __name__ == "__main__":
+    main()
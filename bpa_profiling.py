@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Profilering av enskilda BPA-steg, på begäran och med sampling.
+
+StepProfiler väljer ut steg att profilera – per stegnamn (STEP_KEYS i
+bpa_demo_v2) och/eller vart N:te ärende – och kör just de anropen under
+cProfile och tracemalloc. Övriga anrop kostar en jämförelse, så läget kan
+lämnas på i drift med t.ex. every_nth=1000.
+
+Per profilerat steg skrivs:
+  <out>/<case_id>/<steg>.pstats      cProfile-data (python -m pstats / snakeviz)
+  <out>/<case_id>/<steg>.alloc.txt   största allokeringarna under steget
+  <out>/profiles.jsonl               en rad per profilerat steg (tid, minne)
+
+Obs: profilerade steg körs ett i taget i hela processen (_PROFILE_LOCK).
+Från Python 3.12 kan bara en cProfile-profilerare vara aktiv åt gången
+(en till ger ValueError), och tracemalloc är processglobalt så samtidiga
+steg skulle få varandras allokeringar. Med run_cases/run_batch och flera
+workers väntar alltså ett profilerat steg in de andra; oprofilerade steg
+i andra trådar löper på, och deras allokeringar under steget kommer med i
+diffen. Rena minnessiffror kräver --workers 1. tracemalloc stoppas efter
+steget bara om profileraren själv startade det.
+"""
+
+from __future__ import annotations
+
+import cProfile
+import io
+import json
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+PROFILE_DIR = Path("profiles")
+
+# Ett profilerat steg åt gången i processen (cProfile + tracemalloc, se ovan)
+_PROFILE_LOCK = threading.Lock()
+
+
+class StepProfiler:
+    def __init__(self, out_dir: Path = PROFILE_DIR, steps: Iterable[str] = (), every_nth: int = 0,
+                 top: int = 25, memory: bool = True, frames: int = 5):
+        """
+        steps:     profilera alltid dessa steg (t.ex. {"read_elsmart"})
+        every_nth: profilera alla steg i vart N:te ärende (0 = av)
+        top:       antal rader i allokerings-/tidsrapporterna
+        memory:    ta tracemalloc-ögonblicksbilder före/efter steget
+        """
+        self.out_dir = Path(out_dir)
+        self.steps = frozenset(steps)
+        self.every_nth = every_nth
+        self.top = top
+        self.memory = memory
+        self.frames = frames
+        self.profiled = 0
+        self._lock = threading.Lock()
+
+    def wants(self, step: str, case_no: int) -> bool:
+        if step in self.steps:
+            return True
+        return self.every_nth > 0 and case_no % self.every_nth == 0
+
+    def run(self, step: str, action: Callable[[], None], case_id: Callable[[], str]):
+        """
+        Kör action under cProfile (+ tracemalloc) och skriver rapporterna.
+        Väntar på _PROFILE_LOCK om ett annat profilerat steg pågår.
+        """
+        with _PROFILE_LOCK:
+            before = None
+            owned = False
+            if self.memory:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start(self.frames)
+                    owned = True
+                before = tracemalloc.take_snapshot()
+
+            prof = cProfile.Profile()
+            t0 = time.perf_counter_ns()
+            try:
+                prof.runcall(action)
+            finally:
+                elapsed = time.perf_counter_ns() - t0
+                after = None
+                peak = 0
+                if before is not None:
+                    if tracemalloc.is_tracing():  # någon utanför profileraren kan ha stoppat det
+                        after = tracemalloc.take_snapshot()
+                        peak = tracemalloc.get_traced_memory()[1]
+                    if owned:
+                        tracemalloc.stop()
+                # case_id läses efteråt – för första steget finns det först när ärendet lästs
+                self._write(step, _safe(case_id()), prof, elapsed, before, after, peak)
+
+    def _write(self, step: str, case_id: str, prof: cProfile.Profile, elapsed_ns: int,
+               before: Optional[tracemalloc.Snapshot], after: Optional[tracemalloc.Snapshot], peak: int):
+        case_dir = self.out_dir / case_id
+        case_dir.mkdir(parents=True, exist_ok=True)
+        prof.dump_stats(str(case_dir / f"{step}.pstats"))
+
+        allocated = 0
+        lines = [f"Steg: {step}  Ärende: {case_id}  Tid: {elapsed_ns / 1e6:.3f} ms", ""]
+        if before is not None and after is not None:
+            filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+            diff = after.filter_traces(filters).compare_to(before.filter_traces(filters), "lineno")
+            allocated = sum(d.size_diff for d in diff if d.size_diff > 0)
+            lines.append(f"Allokerat netto: {allocated / 1024:.1f} KiB  Topp (traced): {peak / 1024:.1f} KiB")
+            lines.append("")
+            lines.append(f"Största allokeringarna (topp {self.top}):")
+            lines += [f"  {d}" for d in diff[:self.top]]
+            lines.append("")
+
+        buf = io.StringIO()
+        pstats.Stats(prof, stream=buf).sort_stats("cumulative").print_stats(self.top)
+        lines.append(buf.getvalue())
+        (case_dir / f"{step}.alloc.txt").write_text("\n".join(lines), encoding="utf-8")
+
+        record = {"case_id": case_id, "step": step, "ms": elapsed_ns / 1e6,
+                  "allocated_bytes": allocated, "peak_bytes": peak}
+        with self._lock:
+            self.profiled += 1
+            with (self.out_dir / "profiles.jsonl").open("a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def _safe(name: str) -> str:
+    """Ärende-id som katalognamn."""
+    return re.sub(r"[^\w.-]+", "_", name) or "okänt"
+
+
+def parse_steps(text: str) -> frozenset:
+    """'read_elsmart,validate' → {"read_elsmart", "validate"}"""
+    return frozenset(s.strip() for s in text.split(",") if s.strip())
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Kompakta poster för ärendedata (i stället för en dict per ärende).
+
+Dataklasser med __slots__ (ingen __dict__ per instans) och internade
+strängvärden för fält med få unika värden (kommun, säkring, produkt, status
+...), så att 1M ärenden delar samma str-objekt. Själva posten är ~1/4 av
+motsvarande dict; med de unika strängvärdena inräknade ungefär hälften.
+
+Alla poster har from_dict()/to_dict() mot det befintliga dict-API:t
+(api_get_case, api_get_payload, JSON över HTTP). Okända nycklar ignoreras,
+utom i Agreement där de sparas i `extra` (regelfilen kan ha fler kolumner).
+"""
+
+from __future__ import annotations
+
+import sys
+from dataclasses import dataclass
+from typing import Any, ClassVar, Dict, Iterator, Mapping, Optional, Tuple
+
+
+# dt-text på Elsmart-sidan → fält i ElsmartPayload
+PAGE_FIELDS = {
+    "Ref. nr.": "ref_nr",
+    "Datum mottaget": "datum",
+    "Kommun": "kommun",
+    "Mätarnr.": "matarnr",
+    "Anläggnings-id": "anlaggnings_id",
+    "Teknisk nr.": "teknisk_nr",
+    "Typ av kundanläggning": "kundtyp",
+    "Säkring": "saking",
+}
+
+
+def _intern(value: Any) -> Any:
+    return sys.intern(value) if type(value) is str else value
+
+
+class _Record:
+    """Gemensam from_dict/to_dict för postklasserna nedan (fälten = __slots__)."""
+
+    __slots__ = ()
+    INTERNED: ClassVar[Tuple[str, ...]] = ()
+
+    @classmethod
+    def _kwargs(cls, data: Mapping[str, Any]) -> Dict[str, Any]:
+        kw = {}
+        for name in cls.__slots__:
+            if name in data:
+                value = data[name]
+                kw[name] = _intern(value) if name in cls.INTERNED else value
+        return kw
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]):
+        return cls(**cls._kwargs(data))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+@dataclass(slots=True)
+class Case(_Record):
+    """LIME-ärende. Checklistan är en bitmask (bit i = punkt i klar)."""
+
+    INTERNED: ClassVar[Tuple[str, ...]] = ("status", "reason")
+
+    case_id: str = ""
+    ref_nr: str = ""
+    tjanstenr: str = ""
+    kundnr: str = ""
+    status: str = "Nytt"
+    reason: str = ""
+    checklist: int = 0
+    elsmart: str = ""  # sökväg till ärendets Elsmart-sida (case_generator)
+
+    def set_check(self, index: int, done: bool = True):
+        if done:
+            self.checklist |= 1 << index
+        else:
+            self.checklist &= ~(1 << index)
+
+    def checklist_done(self, items: int) -> bool:
+        return self.checklist == (1 << items) - 1
+
+    def to_dict(self, items: int = 0) -> Dict[str, Any]:
+        """items = antal punkter i checklistan (för checklist_done i dict-API:t)."""
+        d = _Record.to_dict(self)
+        del d["checklist"]
+        d["checklist_done"] = bool(items) and self.checklist_done(items)
+        return d
+
+
+@dataclass(slots=True)
+class ElsmartPayload(_Record):
+    """De Elsmart-fält BPA använder (nycklar enligt PAGE_FIELDS)."""
+
+    INTERNED: ClassVar[Tuple[str, ...]] = ("kommun", "kundtyp", "saking")
+
+    ref_nr: str = ""
+    datum: str = ""
+    kommun: str = ""
+    matarnr: str = ""
+    anlaggnings_id: str = ""
+    teknisk_nr: str = ""
+    kundtyp: str = ""
+    saking: str = ""
+
+    @classmethod
+    def from_page(cls, page: Mapping[str, str]) -> "ElsmartPayload":
+        """Från api_get_payload()-dicten (dt-text som nycklar)."""
+        return cls.from_dict({field: page[dt] for dt, field in PAGE_FIELDS.items() if dt in page})
+
+    def to_page(self) -> Dict[str, str]:
+        return {dt: getattr(self, field) for dt, field in PAGE_FIELDS.items()}
+
+
+@dataclass(slots=True)
+class ServiceUpdate(_Record):
+    """BFUS övergripande uppgifter för en tjänst."""
+
+    INTERNED: ClassVar[Tuple[str, ...]] = ("saking",)
+
+    tjanstenr: str = ""
+    anlaggnings_id: str = ""
+    saking: str = ""
+
+
+@dataclass(slots=True)
+class Agreement(_Record):
+    """BFUS nätavtal. Värdena från beslutstabellen internas (få unika)."""
+
+    INTERNED: ClassVar[Tuple[str, ...]] = (
+        "startdatum", "company", "goal", "forbruk", "produkt", "deb_satt", "deb_formel", "pp1", "pp2",
+    )
+
+    agreement_id: str = ""
+    kundnr: str = ""
+    kundref: str = ""
+    startdatum: str = ""
+    company: str = ""
+    goal: str = ""
+    forbruk: str = ""
+    produkt: str = ""
+    deb_satt: str = ""
+    deb_formel: str = ""
+    pp1: str = ""
+    pp2: str = ""
+    extra: Optional[Dict[str, Any]] = None  # övriga nycklar (sällan använt)
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "Agreement":
+        rec = cls(**cls._kwargs(data))
+        extra = {k: v for k, v in data.items() if k not in cls.__slots__}
+        if extra:
+            rec.extra = extra
+        return rec
+
+    def to_dict(self) -> Dict[str, Any]:
+        d = _Record.to_dict(self)
+        extra = d.pop("extra")
+        if extra:
+            d.update(extra)
+        return d
+
+
+@dataclass(slots=True)
+class CaseContext(_Record):
+    """
+    BPAEngine:s kontext för ett ärende. Har get/[]/update/in så att stegen
+    och validate_one() kan använda den som den dict den ersätter.
+    """
+
+    INTERNED: ClassVar[Tuple[str, ...]] = ("kommun", "kundtyp", "saking")
+
+    case_id: str = ""
+    ref_nr: str = ""
+    tjanstenr: str = ""
+    kundnr: str = ""
+    anlaggnings_id: str = ""
+    matarnr: str = ""
+    saking: str = ""
+    kommun: str = ""
+    kundtyp: str = ""
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key) if key in self.__slots__ else default
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.__slots__ and getattr(self, key) != ""
+
+    def __iter__(self) -> Iterator[str]:
+        return (k for k in self.__slots__ if getattr(self, k) != "")
+
+    def update(self, data: Mapping[str, Any]):
+        for key, value in data.items():
+            setattr(self, key, _intern(value) if key in self.INTERNED else value)
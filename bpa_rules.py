@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Beslutstabeller för BPA-motorn (t.ex. vilket företag/produkt/prisparametrar
+ett avtal ska få givet kommun, säkring och kundtyp).
+
+Format (CSV med rubrikrad, eller JSON-lista med objekt):
+  kommun,saking,kundtyp,company,goal,forbruk,produkt,deb_satt,deb_formel,pp1,pp2
+  *,*,*,Exempelbolag A,Nätavtal,Hushåll,Produkt 1,Månadsvis,Formel A,PP1-A,PP2-A
+  *,50A,*,Exempelbolag B,Nätavtal,Industri,Produkt 3,Kvartalsvis,Formel C,PP1-C,PP2-C
+
+- Nyckelkolumner anges vid skapandet (keys=...), övriga kolumner är utdata.
+- "*" eller tomt = matchar allt.
+- Mest specifik regel vinner (flest angivna nycklar); vid lika vinner första raden.
+
+Tabellen kompileras till ett dict-index per "wildcard-mask", så en uppslagning
+är högst 2^k dict-uppslag (k = antal nycklar), oberoende av antalet regler.
+Filen laddas om automatiskt när den ändras (kontroll högst var check_interval s).
+"""
+
+from __future__ import annotations
+
+import csv
+import json
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+WILDCARD = "*"
+
+Key = Tuple[Optional[str], ...]
+Mask = Tuple[bool, ...]
+Rule = Tuple[int, Dict[str, str]]  # (radnummer, utdata)
+Compiled = Tuple[Dict[Key, Rule], List[List[Mask]]]
+
+
+class RuleError(LookupError):
+    pass
+
+
+def _norm(value: str) -> str:
+    return " ".join(str(value).split()).upper()
+
+
+class DecisionTable:
+    def __init__(self, path: Path, keys: Sequence[str], check_interval: float = 1.0):
+        self.path = Path(path)
+        self.keys = tuple(keys)
+        self.check_interval = check_interval
+        self.last_error: Optional[Exception] = None
+
+        # (index, masker grupperade per specificitet) byts ut i ett svep vid omladdning
+        self._compiled: Compiled = ({}, [])
+        self._stamp: Optional[Tuple[int, int]] = None
+        self._next_check = 0.0
+
+        self.reload(force=True)
+
+    # ---- laddning
+    def _read_rows(self) -> List[Dict[str, str]]:
+        if self.path.suffix.lower() == ".json":
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            rows = data.get("rules", []) if isinstance(data, dict) else data
+            return [{k: "" if v is None else str(v) for k, v in r.items()} for r in rows]
+        with self.path.open(newline="", encoding="utf-8") as f:
+            return list(csv.DictReader(f))
+
+    def compile(self, rows: List[Dict[str, str]]) -> Compiled:
+        index: Dict[Key, Rule] = {}
+        masks = set()
+        for n, row in enumerate(rows, start=2):
+            missing = [k for k in self.keys if k not in row]
+            if missing:
+                raise RuleError(f"{self.path.name} rad {n}: saknar kolumn(er) {', '.join(missing)}")
+            key = tuple(
+                None if (v := (row[k] or "").strip()) in ("", WILDCARD) else _norm(v)
+                for k in self.keys
+            )
+            # första raden med samma nyckel vinner
+            if key not in index:
+                index[key] = (n, {c: (v or "").strip() for c, v in row.items()
+                                  if c is not None and c not in self.keys})
+            masks.add(tuple(k is not None for k in key))
+        levels: Dict[int, List[Mask]] = {}
+        for m in masks:
+            levels.setdefault(sum(m), []).append(m)
+        return index, [levels[n] for n in sorted(levels, reverse=True)]
+
+    def reload(self, force: bool = False) -> bool:
+        """Kompilerar om tabellen om filen ändrats. Vid fel behålls föregående tabell."""
+        try:
+            st = self.path.stat()
+            stamp = (st.st_mtime_ns, st.st_size)
+            if not force and stamp == self._stamp:
+                return False
+            self._compiled = self.compile(self._read_rows())
+            self._stamp = stamp
+            self.last_error = None
+            return True
+        except Exception as e:
+            self.last_error = e
+            if force and not self._compiled[0]:
+                raise
+            return False
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.check_interval
+            self.reload()
+
+    # ---- uppslag
+    def __len__(self) -> int:
+        return len(self._compiled[0])
+
+    def lookup(self, **inputs: str) -> Dict[str, str]:
+        """Returnerar utdatakolumnerna för den mest specifika matchande regeln."""
+        self._maybe_reload()
+        index, levels = self._compiled
+        values = tuple(_norm(inputs.get(k, "")) for k in self.keys)
+        for masks in levels:
+            best: Optional[Rule] = None
+            for mask in masks:
+                hit = index.get(tuple(v if m else None for v, m in zip(values, mask)))
+                if hit is not None and (best is None or hit[0] < best[0]):
+                    best = hit
+            if best is not None:
+                return dict(best[1])
+        shown = ", ".join(f"{k}={inputs.get(k, '')!r}" for k in self.keys)
+        raise RuleError(f"Ingen regel i {self.path.name} matchar {shown}")
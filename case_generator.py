@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Syntetiska ärenden för lasttest av hela kedjan LIME → Elsmart → BFUS.
+
+Genererar N LIME-ärenden (cases.jsonl), en Elsmart-sida per ärende (byggd på
+index.html) och en BFUS-tjänstekatalog (bfus_catalog.csv). Allt skrivs
+strömmande, ett ärende i taget, så minnet är konstant även vid 1M ärenden.
+Samma seed ger exakt samma filer.
+
+Kör:
+  python case_generator.py --count 10000 --out gen/10k
+  python case_generator.py --count 1000000 --seed 7 --invalid-rate 0.05 --missing-rate 0.01 \\
+      --page-sizes 0:0.7,20:0.25,200:0.05 --out gen/1m
+
+Utdata:
+  <out>/cases.jsonl         ett LIME-ärende per rad (+ "elsmart": relativ sökväg till sidan)
+  <out>/elsmart/NNN/*.html  Elsmart-sidor, 1000 per katalog
+  <out>/bfus_catalog.csv    en tjänst per ärende (för bfus_clone_v3.py --catalog)
+  <out>/manifest.json       parametrar och räknare
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import html
+import json
+import random
+import re
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from bfus_store import COLUMNS
+from bpa_records import PAGE_FIELDS  # fält på Elsmart-sidan som genereras per ärende
+from elsmart_validation import ANL_LEN, MATARNR_LEN, luhn_check_digit
+
+
+ROOT = Path(__file__).resolve().parent
+ELSMART_TEMPLATE = ROOT / "index.html"
+FILES_PER_DIR = 1000
+
+# Fält som kan saknas på sidan (--missing-rate)
+OPTIONAL_FIELDS = ("Anläggnings-id", "Mätarnr.", "Kommun", "Typ av kundanläggning")
+
+KOMMUNER = ("ESKILSTUNA", "0000 EXEMPELSTAD", "EXEMPELSTAD", "STRÄNGNÄS", "TORSHÄLLA")
+KUNDTYPER = ("Fastighetstyp", "Fastighetstyp", "Fastighetstyp", "Industri", "Hushåll")
+SAKINGAR = ("16A", "16A", "16A", "20A", "25A", "35A", "50A")
+AFFARSENHETER = ("Region A", "Region B", "Region C")
+
+_RE_ROW = re.compile(r'<div class="kv__row"><dt>(.*?)</dt><dd>.*?</dd></div>')
+
+
+@dataclass
+class GeneratedCase:
+    case: Dict[str, str]                 # LIME-ärendet
+    values: Dict[str, str]               # värden på Elsmart-sidan
+    missing: Tuple[str, ...] = ()        # dt-rader som utelämnas
+    extra_rows: int = 0                  # extra kv-rader (sidstorlek)
+    invalid_id: bool = False
+
+
+@dataclass
+class GeneratorConfig:
+    count: int = 1000
+    seed: int = 1
+    invalid_rate: float = 0.0     # andel ärenden med ogiltigt anläggnings-id
+    missing_rate: float = 0.0     # andel ärenden där ett fält saknas på Elsmart-sidan
+    # Extra kv-rader på sidan (sidstorlek) → vikt
+    page_sizes: Dict[int, float] = field(default_factory=lambda: {0: 1.0})
+    first_case: int = 1
+
+
+def parse_page_sizes(text: str) -> Dict[int, float]:
+    """'0:0.7,20:0.25,200:0.05' → {0: 0.7, 20: 0.25, 200: 0.05}"""
+    out: Dict[int, float] = {}
+    for part in text.split(","):
+        rows, _, weight = part.partition(":")
+        out[int(rows)] = float(weight or 1)
+    return out
+
+
+# -----------------------------
+# Elsmart-sida
+# -----------------------------
+class PageTemplate:
+    """
+    index.html förstyckad i bitar: literal text och fältrader.
+    Varje sida byggs med en join i stället för regex per sida.
+    """
+
+    def __init__(self, path: Path = ELSMART_TEMPLATE):
+        text = path.read_text(encoding="utf-8")
+        # Säkring finns inte i index.html – läggs in efter Anläggnings-id
+        text = text.replace(
+            "<div class=\"kv__row\"><dt>Anläggnings-id</dt><dd>",
+            "<div class=\"kv__row\"><dt>Säkring</dt><dd>16A</dd></div>\n"
+            "              <div class=\"kv__row\"><dt>Anläggnings-id</dt><dd>",
+            1,
+        )
+        self.parts: List[Tuple[Optional[str], str]] = []  # (fältnamn|None, literal)
+        pos = 0
+        for m in _RE_ROW.finditer(text):
+            dt = m.group(1)
+            if dt not in PAGE_FIELDS:
+                continue
+            self.parts.append((None, text[pos:m.start()]))
+            self.parts.append((dt, ""))
+            pos = m.end()
+        tail = text[pos:]
+        # Extra rader (sidstorlek) hamnar sist i kortgriden
+        head, sep, rest = tail.rpartition("</section>")
+        if sep:
+            self.parts.append((None, head))
+            self._suffix = sep + rest
+        else:
+            self.parts.append((None, tail))
+            self._suffix = ""
+
+    def render(self, values: Dict[str, str], missing: Tuple[str, ...] = (), extra_rows: int = 0) -> str:
+        out: List[str] = []
+        for dt, literal in self.parts:
+            if dt is None:
+                out.append(literal)
+            elif dt not in missing:
+                dd = html.escape(values[PAGE_FIELDS[dt]])
+                out.append(f'<div class="kv__row"><dt>{dt}</dt><dd>{dd}</dd></div>')
+        if extra_rows:
+            out.append('<article class="card"><header class="card__header">'
+                       '<h2 class="card__title">Noteringar</h2></header>'
+                       '<div class="card__body"><dl class="kv">\n')
+            for i in range(extra_rows):
+                out.append(f'<div class="kv__row"><dt>Notering {i + 1}</dt><dd>Anteckning {i + 1}</dd></div>\n')
+            out.append("</dl></div></article>\n")
+        out.append(self._suffix)
+        return "".join(out)
+
+
+# -----------------------------
+# Generator
+# -----------------------------
+def _digits(rnd: random.Random, n: int) -> str:
+    return f"{rnd.randrange(10 ** n):0{n}d}"
+
+
+def _anlaggnings_id(rnd: random.Random, invalid: bool) -> str:
+    body = _digits(rnd, ANL_LEN - 1)
+    check = luhn_check_digit(body)
+    if not invalid:
+        return body + check
+    kind = rnd.randrange(3)
+    if kind == 0:  # fel kontrollsiffra
+        return body + str((int(check) + 1 + rnd.randrange(9)) % 10)
+    if kind == 1:  # fel längd
+        return body
+    return body[:8] + "X" + body[9:] + check  # icke-siffra
+
+
+def iter_cases(cfg: GeneratorConfig) -> Iterator[GeneratedCase]:
+    """Ett ärende i taget. Ett Random-objekt per körning → deterministiskt för given seed."""
+    rnd = random.Random(cfg.seed)
+    sizes = list(cfg.page_sizes)
+    weights = list(cfg.page_sizes.values())
+    for n in range(cfg.first_case, cfg.first_case + cfg.count):
+        invalid = rnd.random() < cfg.invalid_rate
+        missing: Tuple[str, ...] = ()
+        if rnd.random() < cfg.missing_rate:
+            missing = (rnd.choice(OPTIONAL_FIELDS),)
+        ref_nr = f"E-{rnd.randrange(10000):04d}-{rnd.randrange(100):02d}"
+        values = {
+            "ref_nr": ref_nr,
+            "datum": f"2025-{rnd.randrange(1, 13):02d}-{rnd.randrange(1, 29):02d}",
+            "kommun": rnd.choice(KOMMUNER),
+            "matarnr": _digits(rnd, MATARNR_LEN),
+            "anlaggnings_id": _anlaggnings_id(rnd, invalid),
+            "teknisk_nr": f"TN-{rnd.randrange(10000):04d}",
+            "kundtyp": rnd.choice(KUNDTYPER),
+            "saking": rnd.choice(SAKINGAR),
+        }
+        case = {
+            "case_id": f"L-{n:07d}",
+            "ref_nr": ref_nr,
+            "tjanstenr": str(400000 + n),
+            "kundnr": f"K-{n:06d}",
+            "status": "Nytt",
+            "reason": "",
+            "checklist_done": False,
+        }
+        extra = rnd.choices(sizes, weights)[0] if len(sizes) > 1 else sizes[0]
+        yield GeneratedCase(case, values, missing, extra, invalid)
+
+
+def generate(cfg: GeneratorConfig, out_dir: Path, template: Optional[PageTemplate] = None) -> Dict:
+    """Skriver cases.jsonl, Elsmart-sidor och bfus_catalog.csv. Returnerar manifestet."""
+    template = template or PageTemplate()
+    out_dir.mkdir(parents=True, exist_ok=True)
+    counts = {"cases": 0, "invalid_id": 0, "missing_field": 0, "page_bytes": 0}
+    current_dir: Optional[Path] = None
+
+    with (out_dir / "cases.jsonl").open("w", encoding="utf-8") as cases_f, \
+            (out_dir / "bfus_catalog.csv").open("w", newline="", encoding="utf-8") as cat_f:
+        catalog = csv.writer(cat_f)
+        catalog.writerow(COLUMNS)
+
+        for i, g in enumerate(iter_cases(cfg)):
+            case, values = g.case, g.values
+            if i % FILES_PER_DIR == 0:
+                current_dir = out_dir / "elsmart" / f"{i // FILES_PER_DIR:03d}"
+                current_dir.mkdir(parents=True, exist_ok=True)
+            page = current_dir / f"{case['case_id']}.html"
+            body = template.render(values, g.missing, g.extra_rows).encode("utf-8")
+            page.write_bytes(body)  # page_bytes nedan = exakt det som skrivs (å/ä/ö är 2 byte)
+
+            case["elsmart"] = page.relative_to(out_dir).as_posix()
+            cases_f.write(json.dumps(case, ensure_ascii=False) + "\n")
+            catalog.writerow((
+                "Ny anläggning", case["tjanstenr"], f"Anläggning {case['case_id']}",
+                values["anlaggnings_id"], AFFARSENHETER[i % len(AFFARSENHETER)], "Aktiv", values["datum"],
+            ))
+
+            counts["cases"] += 1
+            counts["page_bytes"] += len(body)
+            counts["invalid_id"] += g.invalid_id
+            counts["missing_field"] += bool(g.missing)
+
+    cfg_json = asdict(cfg)
+    cfg_json["page_sizes"] = {str(k): v for k, v in cfg.page_sizes.items()}
+    manifest = {"config": cfg_json, "counts": counts}
+    (out_dir / "manifest.json").write_text(json.dumps(manifest, indent=2, ensure_ascii=False), encoding="utf-8")
+    return manifest
+
+
+def load_cases(path: Path) -> Iterator[Dict[str, str]]:
+    """Läser cases.jsonl strömmande; "elsmart" görs om till absolut sökväg."""
+    path = Path(path)
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                case = json.loads(line)
+                if "elsmart" in case:
+                    case["elsmart"] = str(path.parent / case["elsmart"])
+                yield case
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Genererar syntetiska LIME/Elsmart/BFUS-ärenden")
+    ap.add_argument("--count", type=int, default=1000)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--invalid-rate", type=float, default=0.0)
+    ap.add_argument("--missing-rate", type=float, default=0.0)
+    ap.add_argument("--page-sizes", type=parse_page_sizes, default={0: 1.0},
+                    help="extra kv-rader:vikt, t.ex. 0:0.7,20:0.25,200:0.05")
+    ap.add_argument("--out", type=Path, required=True)
+    args = ap.parse_args()
+
+    cfg = GeneratorConfig(count=args.count, seed=args.seed, invalid_rate=args.invalid_rate,
+                          missing_rate=args.missing_rate, page_sizes=args.page_sizes)
+    manifest = generate(cfg, args.out)
+    c = manifest["counts"]
+    print(f"{c['cases']} ärenden → {args.out} "
+          f"(ogiltiga id: {c['invalid_id']}, saknade fält: {c['missing_field']}, "
+          f"sidor: {c['page_bytes'] / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
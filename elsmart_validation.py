@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Validering av Elsmart-payloads – per ärende och i batch.
+
+Regler:
+- Anläggnings-id: 16 siffror, sista siffran är Luhn-kontrollsiffra
+- Ref. nr.:       E-NNNN-NN
+- Mätarnr.:       14 siffror
+- Säkring:        en av SAKING_DOMAIN
+
+validate_one() används av BPA-motorn per ärende (ren Python, förkompilerade regex).
+validate_batch() validerar en hel kolumn ärenden på en gång med NumPy: värdena
+packas i fasta byte-arrayer (n x bredd) och alla regler körs som array-operationer,
+så 1M anläggnings-id tar millisekunder i stället för sekunder. Resultatet är en
+felmask per ärende, så parkerade ärenden kan sorteras bort innan något BFUS-anrop.
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Mapping, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # batch-validering kräver numpy, validate_one gör det inte
+    np = None
+
+
+SAKING_DOMAIN = ("16A", "20A", "25A", "35A", "50A")
+
+# Felbitar i felmasken
+ERR_ANL_FORMAT = 1
+ERR_ANL_CHECK = 2
+ERR_REF_FORMAT = 4
+ERR_MATARNR_FORMAT = 8
+ERR_SAKING = 16
+
+REASONS: Dict[int, str] = {
+    ERR_ANL_FORMAT: "Ogiltigt anläggnings-id",
+    ERR_ANL_CHECK: "Fel kontrollsiffra i anläggnings-id",
+    ERR_REF_FORMAT: "Ogiltigt ref. nr.",
+    ERR_MATARNR_FORMAT: "Ogiltigt mätarnr.",
+    ERR_SAKING: "Okänd säkring",
+}
+
+ANL_LEN = 16
+MATARNR_LEN = 14
+# Fast mönster per position: "9" = siffra, annat tecken = exakt det tecknet
+REF_PATTERN = "E-9999-99"
+
+_RE_ANL = re.compile(r"\d{%d}" % ANL_LEN)
+_RE_MATARNR = re.compile(r"\d{%d}" % MATARNR_LEN)
+_RE_REF = re.compile(r"E-\d{4}-\d{2}")
+
+
+def _luhn_sum(digits: str) -> int:
+    total = 0
+    for i, ch in enumerate(reversed(digits)):
+        d = ord(ch) - 48
+        if i % 2:
+            d = d * 2 - 9 if d > 4 else d * 2
+        total += d
+    return total
+
+
+def luhn_ok(digits: str) -> bool:
+    return _luhn_sum(digits) % 10 == 0
+
+
+def luhn_check_digit(body: str) -> str:
+    """Kontrollsiffran som ska läggas till body för att Luhn ska stämma."""
+    return str((10 - _luhn_sum(body + "0") % 10) % 10)
+
+
+def errors_one(payload: Mapping[str, str]) -> int:
+    """Felmask för ett ärende (0 = OK)."""
+    err = 0
+    anl = payload.get("anlaggnings_id", "")
+    if not _RE_ANL.fullmatch(anl):
+        err |= ERR_ANL_FORMAT
+    elif not luhn_ok(anl):
+        err |= ERR_ANL_CHECK
+    if not _RE_REF.fullmatch(payload.get("ref_nr", "")):
+        err |= ERR_REF_FORMAT
+    if not _RE_MATARNR.fullmatch(payload.get("matarnr", "")):
+        err |= ERR_MATARNR_FORMAT
+    if payload.get("saking", "") not in SAKING_DOMAIN:
+        err |= ERR_SAKING
+    return err
+
+
+def reasons_for(mask: int) -> List[str]:
+    return [text for bit, text in REASONS.items() if mask & bit]
+
+
+def validate_one(payload: Mapping[str, str]) -> List[str]:
+    """Returnerar lista med felorsaker (tom lista = OK)."""
+    return reasons_for(errors_one(payload))
+
+
+# -----------------------------
+# Batch (NumPy)
+# -----------------------------
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("Batch-validering kräver numpy (pip install numpy)")
+
+
+_LUHN_DOUBLE = np.array([0, 2, 4, 6, 8, 1, 3, 5, 7, 9], dtype=np.uint8) if np is not None else None
+
+
+def _fixed_width(values: Sequence[str], width: int) -> Tuple["np.ndarray", "np.ndarray"]:
+    """
+    Packar strängar i en (n, width) uint8-array + längdarray.
+    Längre strängar kapas (längden avslöjar dem), icke-ASCII blir '?'.
+
+    Vanliga fallet – alla exakt width tecken – är en join + en encode +
+    frombuffer, utan ett str-objekt per rad i NumPy (np.array(values, "S16")
+    är flera gånger långsammare i äldre NumPy). Blandade längder (felaktiga
+    värden) packas av np.array, som fyller ut med NUL.
+    """
+    n = len(values)
+    lens = np.fromiter(map(len, values), dtype=np.int64, count=n)
+    if (lens == width).all():
+        buf = "".join(values).encode("ascii", "replace")  # ett '?' per tecken: bredden håller
+        return np.frombuffer(buf, dtype=np.uint8).reshape(n, width), lens
+    try:
+        packed = np.array(values, dtype=f"S{width}")
+    except UnicodeEncodeError:
+        packed = np.array([v.encode("ascii", "replace") for v in values], dtype=f"S{width}")
+    return packed.view(np.uint8).reshape(n, width), lens
+
+
+def _all_digits(arr: "np.ndarray") -> "np.ndarray":
+    # uint8-underflow gör att allt under '0' också hamnar > 9
+    return ((arr - np.uint8(48)) <= 9).all(axis=1)
+
+
+def digits_ok(arr: "np.ndarray", lens: "np.ndarray") -> "np.ndarray":
+    """Rader som är exakt arr.shape[1] siffror."""
+    return (lens == arr.shape[1]) & _all_digits(arr)
+
+
+def luhn_ok_array(arr: "np.ndarray") -> "np.ndarray":
+    """Luhn per rad för en (n, width) array med ASCII-siffror."""
+    d = arr - np.uint8(48)
+    # varannan siffra räknat från höger dubblas (och tvärsumman tas) via uppslagstabell
+    # (icke-siffror kläms till 9 – de rader är redan underkända på format)
+    doubled = _LUHN_DOUBLE[np.minimum(d[:, -2::-2], 9)]
+    total = d[:, ::-2].sum(axis=1, dtype=np.uint16) + doubled.sum(axis=1, dtype=np.uint16)
+    return total % 10 == 0
+
+
+def pattern_ok(arr: "np.ndarray", lens: "np.ndarray", pattern: str) -> "np.ndarray":
+    """Rader som matchar ett fast mönster ("9" = siffra, övrigt = literal)."""
+    if arr.shape[1] != len(pattern):
+        raise ValueError("Arrayens bredd måste vara mönstrets längd")
+    digit_pos = np.array([c == "9" for c in pattern])
+    literal = np.frombuffer(pattern.encode("ascii"), dtype=np.uint8)
+    ok = lens == len(pattern)
+    if digit_pos.any():
+        ok &= _all_digits(arr[:, digit_pos])
+    if (~digit_pos).any():
+        ok &= (arr[:, ~digit_pos] == literal[~digit_pos]).all(axis=1)
+    return ok
+
+
+def anl_ids_from_bytes(buf: bytes) -> "np.ndarray":
+    """
+    Anläggnings-id som redan ligger som fasta 16-byteposter (t.ex. en kolumn ur
+    fil/socket) – ingen kopiering, ingen str-konvertering. Ger en felmask per id.
+    """
+    _require_numpy()
+    arr = np.frombuffer(buf, dtype=np.uint8).reshape(-1, ANL_LEN)
+    errors = np.zeros(len(arr), dtype=np.uint8)
+    fmt = _all_digits(arr)
+    errors[~fmt] |= ERR_ANL_FORMAT
+    errors[fmt & ~luhn_ok_array(arr)] |= ERR_ANL_CHECK
+    return errors
+
+
+@dataclass
+class BatchResult:
+    errors: "np.ndarray"  # uint8 felmask per ärende
+
+    @property
+    def ok(self) -> "np.ndarray":
+        return self.errors == 0
+
+    def ok_indices(self) -> "np.ndarray":
+        return np.flatnonzero(self.errors == 0)
+
+    def parked_indices(self) -> "np.ndarray":
+        return np.flatnonzero(self.errors)
+
+    def reasons(self, i: int) -> List[str]:
+        return reasons_for(int(self.errors[i]))
+
+    def counts(self) -> Dict[str, int]:
+        """Antal ärenden per felorsak."""
+        return {text: int(np.count_nonzero(self.errors & bit)) for bit, text in REASONS.items()}
+
+
+def validate_columns(anlaggnings_id: Sequence[str], ref_nr: Sequence[str],
+                     matarnr: Sequence[str], saking: Sequence[str]) -> BatchResult:
+    """Validerar kolumnvis (en sekvens per fält, lika långa)."""
+    _require_numpy()
+    n = len(anlaggnings_id)
+    if not (len(ref_nr) == len(matarnr) == len(saking) == n):
+        raise ValueError("Alla kolumner måste vara lika långa")
+    errors = np.zeros(n, dtype=np.uint8)
+
+    anl, anl_lens = _fixed_width(anlaggnings_id, ANL_LEN)
+    anl_fmt = digits_ok(anl, anl_lens)
+    errors[~anl_fmt] |= ERR_ANL_FORMAT
+    errors[anl_fmt & ~luhn_ok_array(anl)] |= ERR_ANL_CHECK
+
+    ref, ref_lens = _fixed_width(ref_nr, len(REF_PATTERN))
+    errors[~pattern_ok(ref, ref_lens, REF_PATTERN)] |= ERR_REF_FORMAT
+
+    mat, mat_lens = _fixed_width(matarnr, MATARNR_LEN)
+    errors[~digits_ok(mat, mat_lens)] |= ERR_MATARNR_FORMAT
+
+    # litet domänset: set-uppslag per värde slår np.isin (som sorterar strängarrayer)
+    domain = frozenset(SAKING_DOMAIN)
+    errors[~np.fromiter((v in domain for v in saking), dtype=bool, count=n)] |= ERR_SAKING
+
+    return BatchResult(errors)
+
+
+def validate_batch(payloads: Sequence[Mapping[str, str]]) -> BatchResult:
+    """Validerar en lista payloads (samma nycklar som validate_one)."""
+    def col(key: str) -> List[str]:
+        return [p.get(key, "") for p in payloads]
+    return validate_columns(col("anlaggnings_id"), col("ref_nr"), col("matarnr"), col("saking"))
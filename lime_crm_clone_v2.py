@@ -1,6 +1,8 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 
+import tk_automation
+
 # ----------------------
 # Actions (simulated)
 # ----------------------
@@ -236,4 +238,7 @@ status.pack_propagate(False)
 ttk.Label(status, text="Status: Påbörjat").pack(side="left", padx=12)
 ttk.Label(status, text="Deadline: 2025-02-01").pack(side="right", padx=12)
 
+# Valfri automationssocket för robotens snabbväg (TK_AUTOMATION_DIR → lime.sock)
+tk_automation.maybe_start(root, "lime")
+
 root.mainloop()
\ No newline at end of file
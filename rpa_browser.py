@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+Chrome för RPA-robotens Elsmart-läsning (Selenium).
+
+Roboten läser bara DOM-text (div.kv__row) men startade Chrome med ett synligt
+fönster som laddade CSS, typsnitt och bilder och väntade på hela load-eventet.
+
+Profiler (chrome_options):
+  - "fast": headless (nya läget), bilder av via prefs, typsnitt blockerade
+    via CDP (Network.setBlockedURLs), pageLoadStrategy=eager (driver.get
+    returnerar vid DOMContentLoaded; read_elsmart väntar ändå på raderna),
+    inga tillägg, ingen bakgrundstrafik (uppdateringar, synk, förhämtning)
+    och en beständig user-data-dir så att cache och profil återanvänds.
+  - "default": de gamla inställningarna (synligt fönster, allt laddas).
+
+En user-data-dir kan bara användas av en Chrome i taget, så katalogen är per
+X-display och plats (slot) – parallella sessioner och drivers krockar inte.
+
+DriverPool håller upp till N Chrome (en slot var) för parallella läsningar.
+"""
+
+from __future__ import annotations
+
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+try:
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options as ChromeOptions
+except ImportError:  # bara Elsmart-läsningen behöver selenium
+    webdriver = None
+    ChromeOptions = None
+
+from rpa_vision import RPAError
+
+PROFILES = ("fast", "default")
+DATA_DIR = Path(__file__).resolve().parent / "chrome_profile"
+
+# Typsnitt laddas av sidans CSS; Chrome har ingen pref för att stänga av dem
+BLOCKED_URLS = ["*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot"]
+
+FAST_ARGS = (
+    "--headless=new",
+    "--window-size=1400,900",
+    "--disable-gpu",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--no-first-run",
+    "--no-default-browser-check",
+    "--mute-audio",
+    "--blink-settings=imagesEnabled=false",
+)
+
+FAST_PREFS = {
+    "profile.managed_default_content_settings.images": 2,
+    "profile.default_content_setting_values.notifications": 2,
+    "net.network_prediction_options": 2,  # ingen förhämtning/DNS-prefetch
+}
+
+
+def profile_dir(slot: str = "", base: Path = DATA_DIR) -> Path:
+    """user-data-dir för en Chrome: per X-display och slot (t.ex. "1" i en driverpool)."""
+    display = os.environ.get("DISPLAY", "").replace(":", "").replace("/", "_") or "local"
+    return base / (f"{display}-{slot}" if slot else display)
+
+
+def chrome_options(profile: str = "fast", user_data_dir: Optional[Path] = None) -> "ChromeOptions":
+    if ChromeOptions is None:
+        raise RPAError("selenium saknas (pip install selenium)")
+    if profile not in PROFILES:
+        raise ValueError(f"Okänd Chrome-profil: {profile} (välj {', '.join(PROFILES)})")
+    opts = ChromeOptions()
+    if profile == "default":
+        opts.add_argument("--disable-gpu")
+        opts.add_argument("--window-size=1400,900")
+        return opts
+    for arg in FAST_ARGS:
+        opts.add_argument(arg)
+    opts.add_experimental_option("prefs", FAST_PREFS)
+    opts.page_load_strategy = "eager"
+    if user_data_dir is not None:
+        user_data_dir.mkdir(parents=True, exist_ok=True)
+        opts.add_argument(f"--user-data-dir={user_data_dir}")
+    return opts
+
+
+def new_driver(profile: str = "fast", slot: str = "", user_data_dir: Optional[Path] = None) -> "webdriver.Chrome":
+    """
+    Startar Chrome med profilen. "fast" får en beständig user-data-dir
+    (profile_dir(slot)) om ingen anges.
+    """
+    if webdriver is None:
+        raise RPAError("selenium saknas (pip install selenium)")
+    if profile == "fast" and user_data_dir is None:
+        user_data_dir = profile_dir(slot)
+    driver = webdriver.Chrome(options=chrome_options(profile, user_data_dir))
+    if profile == "fast":
+        try:
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URLS})
+        except Exception:
+            pass  # äldre chromedriver utan CDP: typsnitten laddas, resten gäller ändå
+    return driver
+
+
+class DriverPool:
+    """
+    Upp till size Chrome för parallella Elsmart-läsningar. lease() lånar en
+    ledig driver, startar en ny om taket inte nåtts och väntar annars. En
+    driver som kastar under lånet stängs (den kan ha kraschat); nästa lån
+    startar en ny i samma slot. RPAError (t.ex. en sida utan uppgifter)
+    lämnar drivern i poolen.
+    """
+
+    def __init__(self, size: int, profile: str = "fast"):
+        if size < 1:
+            raise ValueError("DriverPool behöver minst en driver")
+        self.size = size
+        self.profile = profile
+        self._idle: "queue.LifoQueue" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._free_slots: List[str] = [str(i) for i in range(size, 0, -1)]
+        self._slots: Dict[int, str] = {}       # id(driver) → slot
+        self._drivers: Dict[int, object] = {}  # id(driver) → driver
+        self._closed = False
+
+    def _acquire(self):
+        while True:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            with self._lock:
+                if self._closed:
+                    raise RPAError("DriverPool är stängd")
+                slot = self._free_slots.pop() if self._free_slots else None
+            if slot is not None:
+                break
+            try:
+                # Kort timeout: en slot kan bli ledig (kasserad driver) utan att något läggs i kön
+                return self._idle.get(timeout=0.5)
+            except queue.Empty:
+                continue
+        try:
+            driver = new_driver(self.profile, slot=slot)
+        except Exception:
+            with self._lock:
+                self._free_slots.append(slot)
+            raise
+        with self._lock:
+            self._slots[id(driver)] = slot
+            self._drivers[id(driver)] = driver
+        return driver
+
+    def _discard(self, driver):
+        with self._lock:
+            slot = self._slots.pop(id(driver), None)
+            self._drivers.pop(id(driver), None)
+            if slot is not None:
+                self._free_slots.append(slot)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    @contextmanager
+    def lease(self) -> Iterator["webdriver.Chrome"]:
+        driver = self._acquire()
+        try:
+            yield driver
+        except RPAError:
+            self._idle.put(driver)  # sidan var fel, inte Chrome
+            raise
+        except BaseException:
+            self._discard(driver)
+            raise
+        self._idle.put(driver)
+
+    @property
+    def started(self) -> int:
+        with self._lock:
+            return len(self._drivers)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            drivers = list(self._drivers.values())
+            self._drivers.clear()
+            self._slots.clear()
+        for driver in drivers:
+            try:
+                driver.quit()
+            except Exception:
+                pass
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Skärmfångst för RPA-roboten.
+
+Tidigare tog varje uppslag pyautogui.screenshot() (PIL, hela skärmen), gjorde
+np.array av den och sedan cv2.cvtColor – tre fullstora kopior per matchning,
+även när layoutcachen bara behövde verifiera en liten ruta.
+
+Backends (samma gränssnitt, grab(region) → BGR-bild i uint8):
+  - MssCapture: mss (X11 via XShm där det finns, annars XGetImage; GDI/
+    CoreGraphics på Windows/macOS). Fångar bara den begärda rutan; BGRA →
+    BGR konverteras direkt in i en återanvänd buffert.
+  - PilCapture: PIL.ImageGrab (det pyautogui använder). Fallback när mss saknas.
+
+Bilden som grab() returnerar är en återanvänd buffert: den gäller tills nästa
+grab() med samma storlek. Kopiera (.copy()) om den ska sparas.
+"""
+
+from __future__ import annotations
+
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+Region = Tuple[int, int, int, int]  # x, y, w, h
+
+BACKENDS = ("auto", "mss", "pil")
+
+
+class CaptureError(RuntimeError):
+    pass
+
+
+def clamp(region: Optional[Region], size: Tuple[int, int]) -> Region:
+    """Region (eller hela skärmen) beskuren till skärmen. Ursprunget flyttas bara vid negativa x/y."""
+    sw, sh = size
+    if region is None:
+        return 0, 0, sw, sh
+    x, y, w, h = (int(v) for v in region)
+    x0, y0 = min(max(0, x), sw), min(max(0, y), sh)
+    x1, y1 = min(sw, x + w), min(sh, y + h)
+    if x1 <= x0 or y1 <= y0:
+        raise CaptureError(f"Regionen {region} ligger utanför skärmen {sw}x{sh}")
+    return x0, y0, x1 - x0, y1 - y0
+
+
+class _Buffers:
+    """En återanvänd uint8-buffert per form (h, w, 3); oftast några få storlekar."""
+
+    def __init__(self, limit: int = 16):
+        self.limit = limit
+        self._bufs: Dict[Tuple[int, int], np.ndarray] = {}
+
+    def get(self, h: int, w: int) -> np.ndarray:
+        buf = self._bufs.get((h, w))
+        if buf is None:
+            if len(self._bufs) >= self.limit:
+                self._bufs.clear()
+            buf = self._bufs[(h, w)] = np.empty((h, w, 3), dtype=np.uint8)
+        return buf
+
+
+class CaptureBackend(ABC):
+    """Basklass för skärmfångst; en backend som saknar size/grab går inte att skapa."""
+
+    name = "base"
+
+    def __init__(self):
+        self._local = threading.local()  # buffertar per tråd
+
+    @property
+    def _buffers(self) -> _Buffers:
+        bufs = getattr(self._local, "buffers", None)
+        if bufs is None:
+            bufs = self._local.buffers = _Buffers()
+        return bufs
+
+    @abstractmethod
+    def size(self) -> Tuple[int, int]:
+        ...
+
+    @abstractmethod
+    def grab(self, region: Optional[Region] = None) -> np.ndarray:
+        """BGR-bild av region (x, y, w, h) eller hela skärmen."""
+
+    def close(self):
+        pass
+
+
+class MssCapture(CaptureBackend):
+    name = "mss"
+
+    def __init__(self):
+        super().__init__()
+        import mss  # noqa: F401 – ImportError → open_capture väljer PIL
+        self._mss = mss
+
+    def _sct(self):
+        # mss-instanser är inte trådsäkra (X11-anslutning per instans)
+        sct = getattr(self._local, "sct", None)
+        if sct is None:
+            sct = self._local.sct = self._mss.mss()
+        return sct
+
+    def _monitor(self) -> Dict[str, int]:
+        return self._sct().monitors[1]  # primär skärm, som pyautogui
+
+    def size(self) -> Tuple[int, int]:
+        mon = self._monitor()
+        return mon["width"], mon["height"]
+
+    def grab(self, region: Optional[Region] = None) -> np.ndarray:
+        mon = self._monitor()
+        x, y, w, h = clamp(region, (mon["width"], mon["height"]))
+        shot = self._sct().grab({"left": mon["left"] + x, "top": mon["top"] + y, "width": w, "height": h})
+        bgra = np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+        out = self._buffers.get(shot.height, shot.width)
+        cv2.cvtColor(bgra, cv2.COLOR_BGRA2BGR, dst=out)
+        return out
+
+    def close(self):
+        sct = getattr(self._local, "sct", None)
+        if sct is not None:
+            sct.close()
+            self._local.sct = None
+
+
+class PilCapture(CaptureBackend):
+    name = "pil"
+
+    def __init__(self):
+        super().__init__()
+        from PIL import ImageGrab
+        self._grab = ImageGrab.grab
+        self._size: Optional[Tuple[int, int]] = None
+
+    def size(self) -> Tuple[int, int]:
+        if self._size is None:
+            self._size = self._grab().size
+        return self._size
+
+    def grab(self, region: Optional[Region] = None) -> np.ndarray:
+        bbox = None
+        if region is not None:
+            x, y, w, h = clamp(region, self.size())
+            bbox = (x, y, x + w, y + h)
+        img = self._grab(bbox=bbox)
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        rgb = np.asarray(img)
+        out = self._buffers.get(rgb.shape[0], rgb.shape[1])
+        cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR, dst=out)
+        return out
+
+
+def open_capture(backend: str = "auto") -> CaptureBackend:
+    """"auto" = mss om det finns installerat, annars PIL."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Okänd capture-backend: {backend} (välj {', '.join(BACKENDS)})")
+    if backend in ("auto", "mss"):
+        try:
+            return MssCapture()
+        except ImportError:
+            if backend == "mss":
+                raise CaptureError("mss saknas (pip install mss)") from None
+    return PilCapture()
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Mus/tangentbord för RPA-roboten.
+
+Roboten gör alla klick, tangenttryck och pauser via en InputBackend i stället
+för att anropa pyautogui/time.sleep direkt. Live är det PyAutoGuiInput; vid
+inspelning och uppspelning (rpa_replay.py) byts den ut, så att flödena kan
+köras mot sparade skärmbilder utan skrivbord.
+"""
+
+from __future__ import annotations
+
+import time
+from abc import ABC, abstractmethod
+
+try:
+    import pyautogui
+except Exception:  # saknas, eller ingen DISPLAY (t.ex. uppspelning på en headless maskin)
+    pyautogui = None
+else:
+    pyautogui.FAILSAFE = True
+    pyautogui.PAUSE = 0.04
+
+
+class InputBackend(ABC):
+    """Basklass för mus/tangentbord; sleep() är den enda med standardbeteende."""
+
+    name = "base"
+
+    @abstractmethod
+    def click(self, x: int, y: int, duration: float = 0.25):
+        ...
+
+    @abstractmethod
+    def hotkey(self, *keys: str):
+        ...
+
+    @abstractmethod
+    def press(self, key: str):
+        ...
+
+    @abstractmethod
+    def write(self, text: str):
+        ...
+
+    def sleep(self, seconds: float):
+        time.sleep(seconds)
+
+
+class PyAutoGuiInput(InputBackend):
+    name = "pyautogui"
+
+    @staticmethod
+    def _gui():
+        if pyautogui is None:
+            raise RuntimeError("pyautogui saknas eller ingen skärm (DISPLAY) – kan inte styra mus/tangentbord")
+        return pyautogui
+
+    def click(self, x: int, y: int, duration: float = 0.25):
+        gui = self._gui()
+        gui.moveTo(x, y, duration=duration)
+        gui.click()
+
+    def hotkey(self, *keys: str):
+        self._gui().hotkey(*keys)
+
+    def press(self, key: str):
+        self._gui().press(key)
+
+    def write(self, text: str):
+        self._gui().write(text)
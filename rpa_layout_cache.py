@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+Layoutcache för RPA-roboten: lösta koordinater återanvänds mellan ärenden.
+
+BFUS-fönstret och avtalswizarden flyttar sig inte mellan ärenden, men roboten
+letade upp varje etikett/knapp med template matching över hela skärmen varje
+gång. LayoutCache sparar rektangeln från första lyckade matchningen, nyckad
+på fönstrets signatur (template + position) och skärmstorlek. Senare ärenden
+gör bara en verifierande matchning i en liten ruta runt den sparade punkten;
+misslyckas den görs en full matchning och cachen uppdateras. Flyttas fönstret
+blir det en ny nyckel (och en full matchning första gången).
+
+Cachen sparas som JSON (default layout_cache.json bredvid roboten) och
+överlever mellan körningar. Ingen PyAutoGUI här – bara rpa_vision.
+
+locate() tar antingen en färdig skärmbild eller en grab(region)-funktion
+(rpa_capture); med grab fångas vid träff bara rutan runt sparad position.
+"""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from rpa_vision import Match, match_template
+
+CACHE_VERSION = 1
+MARGIN = 6  # px runt sparad rektangel vid verifiering
+
+Rect = Tuple[int, int, int, int]
+Grab = Callable[..., np.ndarray]  # grab(region=None) → BGR-bild
+
+
+class LayoutCache:
+    def __init__(self, path: Optional[Path] = None, margin: int = MARGIN):
+        self.path = Path(path) if path else None
+        self.margin = margin
+        # kontext ("signatur@x,y#BxH") → template-filnamn → [x, y, w, h]
+        self.entries: Dict[str, Dict[str, List[int]]] = {}
+        self.context = ""
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0  # verifiering misslyckades → full matchning
+        self._dirty = False
+        if self.path is not None and self.path.exists():
+            self.load()
+
+    # ---- Nycklar
+    @staticmethod
+    def screen_key(size: Tuple[int, int]) -> str:
+        """Kontext för signaturerna själva (bara skärmstorlek)."""
+        return f"screen#{size[0]}x{size[1]}"
+
+    @staticmethod
+    def window_key(signature: str, pos: Tuple[int, int], size: Tuple[int, int]) -> str:
+        return f"{signature}@{pos[0]},{pos[1]}#{size[0]}x{size[1]}"
+
+    def enter(self, signature: str, m: Match, size: Tuple[int, int]):
+        """Nu är fönstret med denna signatur aktivt; följande lookups nycklas på det."""
+        self.context = self.window_key(signature, m.rect[:2], size)
+
+    # ---- Uppslag
+    def locate(self, source: Union[np.ndarray, Grab], template_file: Path, threshold: float = 0.80,
+               context: Optional[str] = None) -> Match:
+        """
+        Som match_template(hay, template_file), men verifierar först i en liten
+        ruta runt cachad position för aktuell kontext. source är skärmbilden
+        eller en grab(region)-funktion. Kastar RPAError om inget hittas.
+        """
+        ctx = self.context if context is None else context
+        name = template_file.name
+        rect = self.entries.get(ctx, {}).get(name)
+        if rect is not None:
+            try:
+                if callable(source):
+                    region = self._around(rect)
+                    m = match_template(source(region), template_file, threshold=threshold, origin=region[:2])
+                else:
+                    m = match_template(source, template_file, threshold=threshold, region=self._around(rect, source))
+                self.hits += 1
+                if list(m.rect) != rect:  # samma ställe ±margin; spara exakt läge
+                    self._store(ctx, name, m.rect)
+                return m
+            except Exception:
+                self.stale += 1
+        m = match_template(source() if callable(source) else source, template_file, threshold=threshold)
+        self.misses += 1
+        self._store(ctx, name, m.rect)
+        return m
+
+    def _around(self, rect: List[int], hay: Optional[np.ndarray] = None) -> Rect:
+        """Rutan runt rect; utan hay beskär grab() mot skärmkanten."""
+        x, y, w, h = rect
+        mg = self.margin
+        x0, y0 = max(0, x - mg), max(0, y - mg)
+        x1, y1 = x + w + mg, y + h + mg
+        if hay is not None:
+            x1, y1 = min(hay.shape[1], x1), min(hay.shape[0], y1)
+        return x0, y0, x1 - x0, y1 - y0
+
+    def _store(self, ctx: str, name: str, rect: Rect):
+        self.entries.setdefault(ctx, {})[name] = [int(v) for v in rect]
+        self._dirty = True
+
+    # ---- Disk
+    def load(self):
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if data.get("version") == CACHE_VERSION:
+            self.entries = data.get("contexts", {})
+
+    def save(self):
+        if self.path is None or not self._dirty:
+            return
+        data = {"version": CACHE_VERSION, "contexts": self.entries}
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(json.dumps(data, indent=1, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(self.path)
+        self._dirty = False
+
+    def clear(self):
+        self.entries.clear()
+        self._dirty = True
+
+    def summary(self) -> str:
+        return f"Layoutcache: {self.hits} träffar, {self.misses} fulla matchningar, {self.stale} inaktuella"
@@ -0,0 +1,341 @@
+# -*- coding: utf-8 -*-
+"""
+Inspelning och uppspelning av RPA-robotens skärmbilder och handlingar.
+
+Utan skrivbord gick det inte att köra locate_template/click_template eller
+LIME/BFUS-flödena, så ändringar i matchningen kunde bara mätas för hand.
+
+Inspelning (rpa_robot_with_start_button_v2.py --record DIR --run/--batch):
+  - varje skärmfångst sparas som hel skärmbild (PNG) när skärmen ändrats
+  - varje klick/tangenttryck/text loggas, liksom varje flödessteg med argument
+  - automationssocketen stängs av, så att allt går bildvägen; värden som
+    läses tillbaka via den (comboboxkontrollen, read_back) loggas
+  DIR/session.jsonl + DIR/frames/*.png
+
+Uppspelning (python rpa_replay.py DIR):
+  - flödesstegen körs om mot de inspelade bilderna: grab() ger den sista
+    bilden före nästa förväntade handling (beskuren till begärd ruta)
+  - varje handling jämförs med inspelningen (klick inom --tolerance px);
+    avvikelse → ReplayMismatch
+  - read_back får de inspelade värdena i samma ordning
+  - pauser hoppas över och changed/settled-väntor är sanna direkt, så tiden
+    är matchningens (+ beskärning)
+Bilderna är hela skärmen, så uppspelningen klarar andra rutor än vid
+inspelningen (t.ex. annan layoutcache eller marginal).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from rpa_capture import CaptureBackend, Region, clamp
+from rpa_input import InputBackend
+from rpa_vision import RPAError
+
+FORMAT_VERSION = 1
+SESSION_FILE = "session.jsonl"
+FRAMES_DIR = "frames"
+TOLERANCE = 6  # px; roboten lägger på ±3 px jitter per klick
+
+
+class ReplayMismatch(RPAError):
+    pass
+
+
+# ============================================================
+# Inspelning
+# ============================================================
+
+class Recorder:
+    """Omsluter robotens capture/input; capture och input ersätter robotens."""
+
+    def __init__(self, path: Path, capture: CaptureBackend, inp: InputBackend):
+        self.path = Path(path)
+        (self.path / FRAMES_DIR).mkdir(parents=True, exist_ok=True)
+        self._log = (self.path / SESSION_FILE).open("w", encoding="utf-8")
+        self._t0 = time.perf_counter()
+        self._last: Optional[np.ndarray] = None
+        self.frames = 0
+        self.capture = _RecordingCapture(self, capture)
+        self.input = _RecordingInput(self, inp)
+        self.event("meta", version=FORMAT_VERSION, size=list(capture.size()), backend=capture.name)
+
+    def event(self, kind: str, **data):
+        rec = {"kind": kind, "t": round(time.perf_counter() - self._t0, 4), **data}
+        self._log.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+    def call(self, fn: str, args: Tuple):
+        self.event("call", fn=fn, args=list(args))
+        self._log.flush()
+
+    def frame(self, full: np.ndarray):
+        # Oförändrad skärm → ingen ny bild (väntloopar fångar samma bild många gånger)
+        if self._last is not None and self._last.shape == full.shape and np.array_equal(self._last, full):
+            return
+        self._last = full.copy()
+        name = f"{self.frames:05d}.png"
+        cv2.imwrite(str(self.path / FRAMES_DIR / name), full)
+        self.frames += 1
+        self.event("frame", file=name)
+
+    def close(self):
+        self.event("end")
+        self._log.close()
+
+
+class _RecordingCapture(CaptureBackend):
+    name = "record"
+
+    def __init__(self, recorder: Recorder, inner: CaptureBackend):
+        super().__init__()
+        self._rec = recorder
+        self._inner = inner
+
+    def size(self) -> Tuple[int, int]:
+        return self._inner.size()
+
+    def grab(self, region: Optional[Region] = None) -> np.ndarray:
+        full = self._inner.grab(None)  # alltid hela skärmen, så att uppspelningen kan be om vilken ruta som helst
+        self._rec.frame(full)
+        if region is None:
+            return full
+        x, y, w, h = clamp(region, self.size())
+        return full[y:y+h, x:x+w]
+
+    def close(self):
+        self._inner.close()
+
+
+class _RecordingInput(InputBackend):
+    name = "record"
+
+    def __init__(self, recorder: Recorder, inner: InputBackend):
+        self._rec = recorder
+        self._inner = inner
+
+    def click(self, x: int, y: int, duration: float = 0.25):
+        self._rec.event("click", x=int(x), y=int(y))
+        self._inner.click(x, y, duration=duration)
+
+    def hotkey(self, *keys: str):
+        self._rec.event("hotkey", keys=list(keys))
+        self._inner.hotkey(*keys)
+
+    def press(self, key: str):
+        self._rec.event("press", key=key)
+        self._inner.press(key)
+
+    def write(self, text: str):
+        self._rec.event("write", text=text)
+        self._inner.write(text)
+
+    def sleep(self, seconds: float):
+        self._inner.sleep(seconds)
+
+
+# ============================================================
+# Uppspelning
+# ============================================================
+
+ACTIONS = ("click", "hotkey", "press", "write")
+
+
+class Replay:
+    def __init__(self, path: Path, tolerance: int = TOLERANCE):
+        self.path = Path(path)
+        self.tolerance = tolerance
+        events = [json.loads(line) for line in (self.path / SESSION_FILE).open(encoding="utf-8") if line.strip()]
+        meta = events[0] if events and events[0]["kind"] == "meta" else {}
+        if meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"{self.path}: okänt inspelningsformat {meta.get('version')!r}")
+        self.size: Tuple[int, int] = tuple(meta["size"])
+        self.calls: List[Dict[str, Any]] = [e for e in events if e["kind"] == "call"]
+        self.readbacks: List[Dict[str, Any]] = [e for e in events if e["kind"] == "readback"]
+        self._read = 0
+        # Handlingarna i ordning och skärmen (senaste bilden) före var och en
+        self.actions: List[Dict[str, Any]] = []
+        self._screens: List[Optional[str]] = []
+        current: Optional[str] = None
+        for e in events:
+            if e["kind"] == "frame":
+                current = e["file"]
+            elif e["kind"] in ACTIONS:
+                self.actions.append(e)
+                self._screens.append(current)
+        self._screens.append(current)  # efter sista handlingen
+        self.done = 0           # förbrukade handlingar
+        self.grabs = 0
+        self.skipped_sleep = 0.0
+        self._frames: Dict[str, np.ndarray] = {}
+        self.capture = _ReplayCapture(self)
+        self.input = _ReplayInput(self)
+
+    def screen(self) -> np.ndarray:
+        name = self._screens[self.done]
+        if name is None:
+            raise ReplayMismatch(f"Ingen skärmbild före handling {self.done}")
+        frame = self._frames.get(name)
+        if frame is None:
+            frame = cv2.imread(str(self.path / FRAMES_DIR / name), cv2.IMREAD_COLOR)
+            if frame is None:
+                raise ReplayMismatch(f"Kunde inte läsa {name}")
+            self._frames[name] = frame
+        return frame
+
+    @property
+    def frame_count(self) -> int:
+        return len({name for name in self._screens if name is not None})
+
+    def preload(self):
+        """Läser alla bilder i förväg, så att diskläsning inte hamnar i mätningen."""
+        for i in range(len(self._screens)):
+            if self._screens[i] is not None:
+                self.done = i
+                self.screen()
+        self.done = 0
+
+    def expect(self, kind: str, **data):
+        if self.done >= len(self.actions):
+            raise ReplayMismatch(f"Oväntad {kind} {data} efter inspelningens slut")
+        want = self.actions[self.done]
+        ok = want["kind"] == kind
+        if ok and kind == "click":
+            ok = abs(want["x"] - data["x"]) <= self.tolerance and abs(want["y"] - data["y"]) <= self.tolerance
+        elif ok:
+            ok = all(want.get(k) == v for k, v in data.items())
+        if not ok:
+            got = {"kind": kind, **data}
+            shown = {k: v for k, v in want.items() if k != "t"}
+            raise ReplayMismatch(f"Handling {self.done}: väntade {shown}, fick {got}")
+        self.done += 1
+
+    def readback(self, app: str, name: str) -> Optional[str]:
+        """Nästa inspelade read_back-svar (robotens READBACK under uppspelning)."""
+        if self._read >= len(self.readbacks):
+            raise ReplayMismatch(f"Oväntad read_back {app}/{name} efter inspelningens slut")
+        want = self.readbacks[self._read]
+        if (want["app"], want["name"]) != (app, name):
+            raise ReplayMismatch(f"read_back {self._read}: väntade {want['app']}/{want['name']}, fick {app}/{name}")
+        self._read += 1
+        return want["value"]
+
+    def finish(self):
+        if self.done != len(self.actions):
+            rest = {k: v for k, v in self.actions[self.done].items() if k != "t"}
+            raise ReplayMismatch(f"{len(self.actions) - self.done} handlingar kördes aldrig (nästa: {rest})")
+
+    def rewind(self):
+        self.done = 0
+        self._read = 0
+        self.grabs = 0
+        self.skipped_sleep = 0.0
+
+
+class _ReplayCapture(CaptureBackend):
+    name = "replay"
+
+    def __init__(self, replay: Replay):
+        super().__init__()
+        self._replay = replay
+
+    def size(self) -> Tuple[int, int]:
+        return self._replay.size
+
+    def grab(self, region: Optional[Region] = None) -> np.ndarray:
+        self._replay.grabs += 1
+        full = self._replay.screen()
+        if region is None:
+            return full
+        x, y, w, h = clamp(region, self.size())
+        return full[y:y+h, x:x+w]
+
+
+class _ReplayInput(InputBackend):
+    name = "replay"
+
+    def __init__(self, replay: Replay):
+        self._replay = replay
+
+    def click(self, x: int, y: int, duration: float = 0.25):
+        self._replay.expect("click", x=int(x), y=int(y))
+
+    def hotkey(self, *keys: str):
+        self._replay.expect("hotkey", keys=list(keys))
+
+    def press(self, key: str):
+        self._replay.expect("press", key=key)
+
+    def write(self, text: str):
+        self._replay.expect("write", text=text)
+
+    def sleep(self, seconds: float):
+        self._replay.skipped_sleep += seconds
+
+
+def run_replay(replay: Replay, layout=None, seed: int = 0) -> Dict[str, float]:
+    """
+    Kör inspelningens flödessteg mot bilderna. Returnerar sekunder per steg
+    (samma namn summeras); kastar ReplayMismatch vid avvikelse.
+    """
+    import rpa_robot_with_start_button_v2 as robot
+
+    saved = (robot.CAPTURE, robot.INPUT, robot.LAYOUT, robot.USE_AUTOMATION, robot.RECORDER, robot.READBACK)
+    robot.CAPTURE, robot.INPUT, robot.LAYOUT = replay.capture, replay.input, layout
+    robot.USE_AUTOMATION, robot.RECORDER, robot.READBACK = False, None, replay.readback
+    probes, robot.WAIT.screen_probes = robot.WAIT.screen_probes, False
+    random.seed(seed)
+    replay.rewind()
+    timings: Dict[str, float] = {}
+    try:
+        for call in replay.calls:
+            t0 = time.perf_counter()
+            getattr(robot, call["fn"])(*call["args"])
+            timings[call["fn"]] = timings.get(call["fn"], 0.0) + time.perf_counter() - t0
+        replay.finish()
+    finally:
+        (robot.CAPTURE, robot.INPUT, robot.LAYOUT, robot.USE_AUTOMATION, robot.RECORDER,
+         robot.READBACK) = saved
+        robot.WAIT.screen_probes = probes
+    return timings
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Kör en inspelad robotsession mot sparade skärmbilder")
+    ap.add_argument("recording", type=Path, help="katalog från rpa_robot_with_start_button_v2.py --record")
+    ap.add_argument("--repeat", type=int, default=3, help="antal uppspelningar (första värmer upp cachar)")
+    ap.add_argument("--tolerance", type=int, default=TOLERANCE, help="max avvikelse i px per klick")
+    ap.add_argument("--layout-cache", action="store_true",
+                    help="med layoutcache (i minnet, tom vid start; gäller alla varv)")
+    args = ap.parse_args()
+
+    from rpa_layout_cache import LayoutCache
+
+    replay = Replay(args.recording, tolerance=args.tolerance)
+    replay.preload()
+    print(f"{args.recording}: {len(replay.calls)} flödessteg, {len(replay.actions)} handlingar, "
+          f"{replay.frame_count} skärmbilder {replay.size[0]}x{replay.size[1]}")
+    layout = LayoutCache(None) if args.layout_cache else None
+    for i in range(args.repeat):
+        t0 = time.perf_counter()
+        try:
+            timings = run_replay(replay, layout)
+        except ReplayMismatch as e:
+            raise SystemExit(f"Avvikelse: {e}")
+        total = time.perf_counter() - t0
+        parts = "  ".join(f"{k} {v * 1000:.0f} ms" for k, v in timings.items())
+        print(f"Varv {i + 1}: {total * 1000:.0f} ms, {replay.grabs} grabs ({parts}); "
+              f"hoppade över {replay.skipped_sleep:.1f} s pauser")
+    if layout is not None:
+        print(layout.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -13,40 +13,122 @@ Kör:
        python -m http.server 8000
   2) Kör roboten:
        python rpa_robot_v2.py --run
+
+Snabbväg: apparna som roboten själv startar får en automationssocket
+(tk_automation.py). Fält läses/skrivs och knappar trycks via den; saknas den
+(t.ex. fönster som redan var öppna) används template matching som förut.
+
+Batch (många ärenden, apparna startas en gång och återanvänds):
+  1) python case_generator.py --count 50 --out gen/50
+     python -m http.server 8000 --directory gen/50
+  2) python rpa_robot_v2.py --batch gen/50/cases.jsonl
 """
 
 from __future__ import annotations
 
 import argparse
+import json
+import os
 import random
 import subprocess
 import sys
+import tempfile
 import time
-from dataclasses import dataclass
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from pathlib import Path
-from typing import Dict, Optional, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
-import cv2
 import numpy as np
-import pyautogui
 
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options as ChromeOptions
+try:
+    from selenium import webdriver
+    from selenium.webdriver.common.by import By
+except ImportError:  # bara Elsmart-läsningen behöver selenium (rpa_replay.py klarar sig utan)
+    webdriver = None
 import threading
 import tkinter as tk
 from tkinter import ttk
 
+import rpa_browser
+from bfus_clone_v3 import AVTAL_CHOICES, SAKINGAR
+from rpa_capture import BACKENDS as CAPTURE_BACKENDS, CaptureBackend, clamp, open_capture
+from rpa_input import InputBackend, PyAutoGuiInput
+from rpa_layout_cache import LayoutCache
+from rpa_vision import Match, RPAError, match_template
+from rpa_wait import CONFIG as WAIT, STATS as WAIT_STATS, WaitTimeout, changed, settled, wait_until as _wait_until
+from tk_automation import ENV_DIR, AutomationClient, AutomationError
+
 
 # -------------------------
 # Paths
 # -------------------------
 ROOT = Path(__file__).resolve().parent
 TEMPLATES_DIR = ROOT / "templates"
+VALUES_DIR = TEMPLATES_DIR / "values"  # valfria bilder av comboboxvärden, se set_combobox
 
 BFUS_SCRIPT = ROOT / "bfus_clone_v3.py"
 LIME_SCRIPT = ROOT / "lime_crm_clone_v2.py"
 ELSMART_URL = "http://localhost:8000/index.html"  # eller http://localhost:8000/
+ELSMART_BASE = "http://localhost:8000/"  # --batch: ärendets "elsmart"-sökväg läggs till här
+APP_READY_TIMEOUT = 20.0  # s, tills appens signatur syns
+LAYOUT_FILE = ROOT / "layout_cache.json"
+
+# Comboboxvärden i "Skapa avtal" (samma som andra raden, det gamla Down-valet);
+# payload med samma nycklar (t.ex. från regler) går före
+AVTAL_DEFAULTS = {
+    "company": "Exempelbolag B",
+    "goal": "Tillfälligt avtal",
+    "forbruk": "Fastighet",
+    "deb_satt": "Kvartalsvis",
+    "deb_formel": "Formel B",
+    "pp1": "PP1-B",
+    "pp2": "PP2-B",
+}
+
+# Comboboxar för set_combobox: etikett-template, namn i BFUS-socketen och
+# värdelistan (samma som klonen, valet görs via index i den)
+COMBOS = {
+    "saking": ("bfus_lbl_saking", "Säkring", SAKINGAR),
+    "company": ("avtal_lbl_company", "Skapa avtal/Avtalsägande företag", AVTAL_CHOICES["company"]),
+    "goal": ("avtal_lbl_goal", "Skapa avtal/Avtalsmål", AVTAL_CHOICES["goal"]),
+    "forbruk": ("avtal_lbl_forbruk", "Skapa avtal/Förbrukartyp", AVTAL_CHOICES["forbruk"]),
+    "deb_satt": ("avtal_lbl_deb_satt", "Skapa avtal/Debiteringssätt", AVTAL_CHOICES["deb_satt"]),
+    "deb_formel": ("avtal_lbl_deb_formel", "Skapa avtal/Debiteringsformel", AVTAL_CHOICES["deb_formel"]),
+    "pp1": ("avtal_lbl_pp1", "Skapa avtal/Prisparameter 1", AVTAL_CHOICES["pp1"]),
+    "pp2": ("avtal_lbl_pp2", "Skapa avtal/Prisparameter 2", AVTAL_CHOICES["pp2"]),
+}
+
+# Lösta koordinater per fönster (rpa_layout_cache.py); None = alltid full matchning
+LAYOUT: Optional[LayoutCache] = None
+
+# Skärmfångst (rpa_capture.py): "auto" = mss om installerat, annars PIL
+CAPTURE_BACKEND = "auto"
+CAPTURE: Optional[CaptureBackend] = None
+
+# Chrome för Elsmart (rpa_browser.py): "fast" = headless, utan bilder/typsnitt, eager-laddning
+CHROME_PROFILE = "fast"
+ELSMART_CONCURRENCY = 4  # --batch: max samtidiga Elsmart-läsningar (en Chrome var)
+
+# Mus/tangentbord/pauser (rpa_input.py); byts ut vid --record och av rpa_replay.py
+INPUT: InputBackend = PyAutoGuiInput()
+
+# Inspelning för rpa_replay.py (--record); None = ingen
+RECORDER = None
+
+# Senaste klickpunkten: fältet med fokus, för väntor efter tangenttryck
+LAST_CLICK: Optional[Tuple[int, int]] = None
+
+# Automationssocketar i klonerna (tk_automation.py); False = flödena går bildvägen
+# (socketen används ändå för att kontrollera comboboxval, se read_back)
+USE_AUTOMATION = True
+_automation: Dict[str, AutomationClient] = {}
+
+# Knappar som sparar (via socketen): efter dem faller _fast inte tillbaka på bilder
+SAVE_BUTTONS = ("Spara", "Skapa avtal/Spara avtal")
+
+# Uppspelade read_back-svar (rpa_replay.py): READBACK(app, name) → värde; None = fråga appen
+READBACK = None
 
 
 # -------------------------
@@ -111,65 +193,53 @@ T = {
 
 
 # -------------------------
-# PyAutoGUI inställningar
+# OpenCV helpers
 # -------------------------
-pyautogui.FAILSAFE = True
-pyautogui.PAUSE = 0.04
 
+def _capture() -> CaptureBackend:
+    global CAPTURE
+    if CAPTURE is None:
+        CAPTURE = open_capture(CAPTURE_BACKEND)
+    return CAPTURE
 
-@dataclass
-class Match:
-    center: Tuple[int, int]
-    score: float
-    rect: Tuple[int, int, int, int]  # x,y,w,h
 
-
-class RPAError(RuntimeError):
-    pass
-
-
-# -------------------------
-# OpenCV helpers
-# -------------------------
-
-def _screenshot_bgr() -> np.ndarray:
-    img = pyautogui.screenshot()
-    return cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
+def _screenshot_bgr(region: Optional[Tuple[int, int, int, int]] = None) -> np.ndarray:
+    """BGR-bild av region (x, y, w, h) eller hela skärmen; bufferten återanvänds vid nästa grab."""
+    return _capture().grab(region)
 
 
 def locate_template(template_file: Path, threshold: float = 0.80,
-                    region: Optional[Tuple[int, int, int, int]] = None) -> Match:
+                    region: Optional[Tuple[int, int, int, int]] = None, context: Optional[str] = None) -> Match:
+    """
+    Hittar template_file på skärmen. Med LAYOUT verifieras först cachad position
+    (för aktivt fönster, eller context) i en liten ruta – full matchning bara vid miss.
+    Med region fångas bara den rutan.
+    """
     if not template_file.exists():
         raise RPAError(f"Template saknas: {template_file} (lägg PNG i templates/)")
-
-    hay = _screenshot_bgr()
-    rx = ry = 0
     if region is not None:
-        rx, ry, rw, rh = region
-        hay = hay[ry:ry+rh, rx:rx+rw]
-
-    needle = cv2.imread(str(template_file), cv2.IMREAD_COLOR)
-    if needle is None:
-        raise RPAError(f"Kunde inte läsa template: {template_file}")
-
-    res = cv2.matchTemplate(hay, needle, cv2.TM_CCOEFF_NORMED)
-    _, max_val, _, max_loc = cv2.minMaxLoc(res)
-
-    if max_val < threshold:
-        raise RPAError(f"Hittade inte {template_file.name} (score={max_val:.3f} < {threshold})")
-
-    th, tw = needle.shape[:2]
-    x = max_loc[0] + rx
-    y = max_loc[1] + ry
-    cx = x + tw // 2
-    cy = y + th // 2
-    return Match(center=(cx, cy), score=float(max_val), rect=(x, y, tw, th))
+        region = clamp(region, _capture().size())
+        return match_template(_screenshot_bgr(region), template_file, threshold=threshold, origin=region[:2])
+    if LAYOUT is not None:
+        return LAYOUT.locate(_screenshot_bgr, template_file, threshold=threshold, context=context)
+    return match_template(_screenshot_bgr(), template_file, threshold=threshold)
+
+
+def locate_signature(signature_template: str, threshold: float = 0.75) -> Match:
+    """Letar fönstersignaturen och gör fönstret till aktiv layoutkontext."""
+    size = _capture().size()
+    context = LayoutCache.screen_key(size) if LAYOUT is not None else None
+    m = locate_template(TEMPLATES_DIR / signature_template, threshold=threshold, context=context)
+    if LAYOUT is not None:
+        LAYOUT.enter(signature_template, m, size)
+    return m
 
 def _human_move_and_click(x: int, y: int, duration: float = 0.25, jitter: int = 3):
+    global LAST_CLICK
     x += random.randint(-jitter, jitter)
     y += random.randint(-jitter, jitter)
-    pyautogui.moveTo(x, y, duration=duration)
-    pyautogui.click()
+    INPUT.click(x, y, duration=duration)
+    LAST_CLICK = (x, y)
 
     
 """def _human_move_and_click(x: int, y: int, duration: float = 0.0, jitter: int = 0):
@@ -177,53 +247,177 @@ def _human_move_and_click(x: int, y: int, duration: float = 0.25, jitter: int =
     pyautogui.click()"""
 
 
+# -------------------------
+# Väntor (rpa_wait.py) i stället för fasta pauser
+# -------------------------
+
+def wait_until(check, name: str, timeout: Optional[float] = None, poll: Optional[float] = None,
+               legacy: float = 0.0, required: bool = False):
+    """rpa_wait.wait_until med robotens pauser (INPUT.sleep, hoppas över vid uppspelning)."""
+    return _wait_until(check, name, timeout=timeout, poll=poll, legacy=legacy, sleep=INPUT.sleep, required=required)
+
+
+def _focus_region(w: int = 420, h: int = 60) -> Optional[Tuple[int, int, int, int]]:
+    """Rutan runt senaste klicket (fältet som har fokus); None = hela skärmen."""
+    if LAST_CLICK is None:
+        return None
+    x, y = LAST_CLICK
+    return x - w // 2, y - h // 2, w, h
+
+
+def _dropdown_region(x: int, y: int) -> Tuple[int, int, int, int]:
+    """Under en combobox (klickpunkt x, y), där listan fälls ut."""
+    return x - 220, y - 20, 440, 280
+
+
+def snapshot(region: Optional[Tuple[int, int, int, int]] = None) -> np.ndarray:
+    """Kopia av rutan (grab-bufferten återanvänds) – jämförs med efter en handling."""
+    return _screenshot_bgr(region).copy()
+
+
+def _grab_clamped(region: Optional[Tuple[int, int, int, int]] = None) -> np.ndarray:
+    return _screenshot_bgr(None if region is None else clamp(region, _capture().size()))
+
+
+def key_and_settle(*keys: str, name: str = "key", legacy: float = 0.05):
+    """Kortkommando/tangent i fokuserat fält; väntar tills fältet ritats klart."""
+    if len(keys) == 1:
+        INPUT.press(keys[0])
+    else:
+        INPUT.hotkey(*keys)
+    wait_until(settled(_grab_clamped, _focus_region()), name, timeout=WAIT.settle_max, legacy=legacy)
+
+
+def key_and_wait_change(*keys: str, region: Optional[Tuple[int, int, int, int]], name: str,
+                        legacy: float, timeout: Optional[float] = None) -> bool:
+    """Tangent(er) och vänta tills rutan ändras (t.ex. dropdown öppnas, fönster byts)."""
+    if region is not None:
+        region = clamp(region, _capture().size())
+    before = snapshot(region)
+    if len(keys) == 1:
+        INPUT.press(keys[0])
+    else:
+        INPUT.hotkey(*keys)
+    ok = wait_until(changed(_screenshot_bgr, before, region), name,
+                    timeout=WAIT.change_max if timeout is None else timeout, legacy=legacy)
+    return bool(ok)
+
+
+def signature_visible(signature_template: str, threshold: float = 0.75) -> bool:
+    try:
+        locate_signature(signature_template, threshold=threshold)
+        return True
+    except Exception:
+        return False
+
+
 def wait_for_signature(signature_template: str,
-                       timeout: float = 5.0,
-                       poll: float = 0.2,
+                       timeout: Optional[float] = None,
+                       poll: float = 0.05,
                        threshold: float = 0.75):
     """
     Väntar tills en signatur dyker upp på skärmen.
     Används för popups (kalender, dialoger, wizards).
     """
-    tpl = TEMPLATES_DIR / signature_template
-    end_time = time.time() + timeout
+    if not wait_until(lambda: signature_visible(signature_template, threshold), "signature",
+                      timeout=timeout, poll=poll):
+        raise RPAError(f"Popup/signatur dök inte upp i tid: {signature_template}")
 
-    while time.time() < end_time:
-        try:
-            locate_template(tpl, threshold=threshold)
-            return
-        except Exception:
-            time.sleep(poll)
 
-    raise RPAError(f"Popup/signatur dök inte upp i tid: {signature_template}")
+def find_template(name: str, threshold: float = 0.80, timeout: Optional[float] = None,
+                  region: Optional[Tuple[int, int, int, int]] = None) -> Match:
+    """Som locate_template, men väntar (WAIT.max_wait) tills mallen syns."""
+    tpl = TEMPLATES_DIR / name
+    last_err: List[Exception] = []
+
+    def find() -> Optional[Match]:
+        try:
+            return locate_template(tpl, threshold=threshold, region=region)
+        except Exception as e:
+            last_err[:] = [e]
+            return None
 
+    m = wait_until(find, "click_template", timeout=timeout, poll=0.05)
+    if m is None:
+        raise RPAError(f"Hittade inte {name}. Senaste fel: {last_err[0] if last_err else 'timeout'}")
+    return m
 
 
 def click_template(name: str, threshold: float = 0.80, offset: Tuple[int, int] = (0, 0),
-                   retries: int = 25, sleep: float = 0.25,
+                   timeout: Optional[float] = None,
                    region: Optional[Tuple[int, int, int, int]] = None) -> Match:
-    tpl = TEMPLATES_DIR / name
-    last_err: Optional[Exception] = None
-    for _ in range(retries):
-        try:
-            m = locate_template(tpl, threshold=threshold, region=region)
-            x, y = m.center[0] + offset[0], m.center[1] + offset[1]
-            _human_move_and_click(x, y)
-            return m
-        except Exception as e:
-            last_err = e
-            time.sleep(sleep)
-    raise RPAError(f"Kunde inte klicka {name}. Senaste fel: {last_err}")
+    m = find_template(name, threshold=threshold, timeout=timeout, region=region)
+    # Bara sökningen görs om; ett fel i själva klicket ska inte ge ett nytt klick
+    _human_move_and_click(m.center[0] + offset[0], m.center[1] + offset[1])
+    return m
+
+
+def value_template(value: str) -> Path:
+    """Valfri bild av ett comboboxvärde (templates/values/<värde>.png) för kontroll efter val."""
+    return VALUES_DIR / f"{value.replace('/', '_')}.png"
+
+
+def set_combobox(field: str, value: str, offset: Tuple[int, int] = (260, 0), threshold: float = 0.75):
+    """
+    Väljer value i comboboxen field (se COMBOS): klick fäller ut listan,
+    Ctrl+Home går till första raden, Down × index (värdets plats i klonens
+    lista) och Enter väljer. Inget skrivs, så å/ä/ö spelar ingen roll (pyautogui
+    kan inte skriva dem). Förr: Alt+Down, Down, Enter – alltid "nästa rad".
+
+    Valet kontrolleras alltid: med templates/values/<värde>.png i en liten ruta
+    runt fältet, annars läses värdet tillbaka via BFUS-socketen. Går inget av
+    dem → RPAError.
+    """
+    label_key, name, choices = COMBOS[field]
+    if value not in choices:
+        raise RPAError(f"{field}: {value!r} finns inte bland {choices}")
+    m = find_template(T[label_key], threshold=threshold)
+    x, y = m.center[0] + offset[0], m.center[1] + offset[1]
+    region = clamp(_dropdown_region(x, y), _capture().size())
+    before = snapshot(region)
+    _human_move_and_click(x, y)
+    wait_until(changed(_screenshot_bgr, before, region), "combobox_open", timeout=WAIT.change_max, legacy=0.15)
+    INPUT.hotkey("ctrl", "home")
+    for _ in range(choices.index(value)):
+        INPUT.press("down")
+    INPUT.press("enter")
+    _verify_combobox(field, name, value)
+
+
+def _verify_combobox(field: str, name: str, value: str):
+    tpl = value_template(value)
+    if tpl.exists():
+        region = _focus_region(360, 60)
+        if not wait_until(lambda: _value_shown(tpl, region), "combobox_value", timeout=WAIT.change_max):
+            raise RPAError(f"{field}: fältet visar inte {value!r} efter valet")
+        return
+    shown = [read_back("bfus", name)]
+    if shown[0] is None:
+        raise RPAError(f"{field}: kan inte kontrollera valet – varken {tpl.name} i {VALUES_DIR.name}/ "
+                       f"eller BFUS-socketen finns")
+    if shown[0] != value:
+        # Tk hinner inte alltid behandla Enter innan socketen svarar
+        def check() -> bool:
+            shown[0] = read_back("bfus", name)
+            return shown[0] == value
+        if not wait_until(check, "combobox_value", timeout=WAIT.change_max):
+            raise RPAError(f"{field}: fältet visar {shown[0]!r}, inte {value!r}")
+
+
+def _value_shown(tpl: Path, region: Optional[Tuple[int, int, int, int]]) -> bool:
+    try:
+        locate_template(tpl, threshold=0.85, region=region)
+        return True
+    except Exception:
+        return False
 
 def type_text(text: str, clear_first: bool = True, per_char: float = 0.02):
     if clear_first:
-        pyautogui.hotkey("ctrl", "a")
-        time.sleep(0.05)
-        pyautogui.press("backspace")
-        time.sleep(0.05)
+        key_and_settle("ctrl", "a", name="select_all")
+        key_and_settle("backspace", name="clear_field")
     for ch in text:
-        pyautogui.write(ch)
-        time.sleep(per_char + random.random() * 0.01)
+        INPUT.write(ch)
+        INPUT.sleep(per_char + random.random() * 0.01)  # avsiktligt mänskligt skrivtempo
 
         
 """def type_text(text: str, clear_first: bool = True):
@@ -235,43 +429,153 @@ def type_text(text: str, clear_first: bool = True, per_char: float = 0.02):
 
 
 def copy_current_field() -> str:
-    pyautogui.hotkey("ctrl", "a")
-    time.sleep(0.05)
-    pyautogui.hotkey("ctrl", "c")
-    time.sleep(0.05)
+    key_and_settle("ctrl", "a", name="select_all")
+    key_and_settle("ctrl", "c", name="copy")
     # pyperclip är valfritt; vi använder clipboard via pyautogui/OS → paste senare.
     return ""
 
 
 def alt_tab_until_signature(signature_template: str, max_tries: int = 8, threshold: float = 0.75):
-    """Växlar fönster tills signaturen syns."""
-    tpl = TEMPLATES_DIR / signature_template
+    """Växlar fönster tills signaturen syns (väntar på att skärmen ändras efter varje Alt+Tab)."""
     for i in range(max_tries):
-        try:
-            locate_template(tpl, threshold=threshold)
+        if signature_visible(signature_template, threshold):
             return
-        except Exception:
-            pyautogui.hotkey("alt", "tab")
-            time.sleep(0.8)
+        if key_and_wait_change("alt", "tab", region=None, name="alt_tab", legacy=0.8):
+            # Första ändrade pixeln är inte ett färdigritat fönster: vänta tills skärmen lugnat sig
+            wait_until(settled(_grab_clamped, None), "alt_tab_settle", timeout=WAIT.settle_max)
     raise RPAError(f"Kunde inte hitta {signature_template} via Alt+Tab efter {max_tries} försök.")
 
 
+# -------------------------
+# Automationssocket (snabbväg)
+# -------------------------
+
+def automation_dir() -> Path:
+    """Per X-display, så att parallella sessioner (rpa_sessions.py) inte krockar."""
+    display = os.environ.get("DISPLAY", "").replace(":", "").replace("/", "_") or "local"
+    return Path(tempfile.gettempdir()) / f"rpa-tk-{os.getuid() if hasattr(os, 'getuid') else 0}-{display}"
+
+
+def _client(app: str) -> Optional[AutomationClient]:
+    client = _automation.get(app)
+    if client is None:
+        client = AutomationClient.connect(automation_dir() / f"{app}.sock")
+        if client is not None:
+            _automation[app] = client
+    return client
+
+
+def automation(app: str) -> Optional[AutomationClient]:
+    """Ansluten klient mot appens socket ("lime"/"bfus"), eller None → bildvägen."""
+    if not USE_AUTOMATION:
+        return None
+    return _client(app)
+
+
+def read_back(app: str, name: str) -> Optional[str]:
+    """
+    Fältets värde via appens socket, även när flödet går bildvägen (kontroll
+    efter set_combobox). None = socketen saknas. Inspelas (--record) och
+    spelas upp via READBACK i rpa_replay.py.
+    """
+    if READBACK is not None:
+        return READBACK(app, name)
+    client = _client(app)
+    value = None
+    if client is not None:
+        try:
+            value = client.get(name)
+        except (AutomationError, OSError, ValueError):
+            _automation.pop(app, None)
+            client.close()
+    if RECORDER is not None:
+        RECORDER.event("readback", app=app, name=name, value=value)
+    return value
+
+
+def _fast(app: str, fn, *args):
+    """
+    Kör fn(klient, *args) via appens socket. Returnerar fn:s resultat, eller
+    None om socketen saknas eller anropet misslyckas – då kör anroparen bildvägen.
+
+    Ett fel mitt i fn kan lämna fönster öppna (t.ex. "Skapa avtal", så att
+    nästa blir "Skapa avtal#2"): fönster som öppnats under anropet stängs före
+    bildvägen. Har en sparaknapp (SAVE_BUTTONS) redan tryckts blir det RPAError
+    i stället – bildvägen skulle spara en gång till.
+    """
+    client = automation(app)
+    if client is None:
+        return None
+    before: Optional[List[str]] = None
+    try:
+        before = client.windows()
+        client.invoked.clear()
+        return fn(client, *args)
+    except (AutomationError, OSError, ValueError) as e:
+        saved = [name for name in client.invoked if name in SAVE_BUTTONS]
+        _automation.pop(app, None)
+        client.close()
+        if before is not None:
+            _close_new_windows(app, before)
+        if saved:
+            raise RPAError(f"Automation ({app}) misslyckades efter {saved[-1]!r}: {e}") from e
+        print(f"Automation ({app}) misslyckades: {e} – faller tillbaka på bilder", file=sys.stderr)
+        return None
+
+
+def _close_new_windows(app: str, before: List[str]):
+    """Stänger fönster som inte fanns i before, senast öppnade först (ny anslutning)."""
+    client = _client(app)
+    if client is None:
+        return
+    try:
+        after = client.windows()
+        extra = Counter(after) - Counter(before)
+        for title in reversed(after):
+            if extra[title] > 0:
+                client.close_window(title)
+                extra[title] -= 1
+    except (AutomationError, OSError, ValueError) as e:
+        print(f"Automation ({app}): kunde inte stänga öppnade fönster: {e}", file=sys.stderr)
+        _automation.pop(app, None)
+        client.close()
+
+
 # -------------------------
 # Selenium: läs Elsmart
 # -------------------------
 
-def read_elsmart() -> Dict[str, str]:
-    opts = ChromeOptions()
-    opts.add_argument("--disable-gpu")
-    opts.add_argument("--window-size=1400,900")
+def new_driver() -> webdriver.Chrome:
+    return rpa_browser.new_driver(CHROME_PROFILE)
 
-    driver = webdriver.Chrome(options=opts)
-    driver.get(ELSMART_URL)
-    time.sleep(0.8)
+
+def read_elsmart(url: str = ELSMART_URL, driver: Optional[webdriver.Chrome] = None) -> Dict[str, str]:
+    """
+    Läser Elsmart-sidan. Med driver återanvänds webbläsaren (batch), annars
+    startas och stängs en. Inga kv__row-rader (fel sida, 404) → RPAError, inte
+    en tom payload med standardvärden.
+    """
+    own = driver is None
+    if own:
+        driver = new_driver()
+    try:
+        return _read_elsmart_page(url, driver)
+    finally:
+        if own:
+            driver.quit()
+
+
+def _read_elsmart_page(url: str, driver: webdriver.Chrome) -> Dict[str, str]:
+    driver.get(url)
+    try:
+        rows = wait_until(lambda: driver.find_elements(By.CSS_SELECTOR, "div.kv__row"), "elsmart_dom",
+                          poll=0.05, legacy=0.8, required=True)
+    except WaitTimeout:
+        raise RPAError(f"Elsmart: inga uppgifter (div.kv__row) på {url}") from None
 
     # Robust: läs alla kv__row till dict
     kv = {}
-    for row in driver.find_elements(By.CSS_SELECTOR, "div.kv__row"):
+    for row in rows:
         try:
             dt = row.find_element(By.TAG_NAME, "dt").text.strip()
             dd = row.find_element(By.TAG_NAME, "dd").text.strip()
@@ -290,13 +594,60 @@ def read_elsmart() -> Dict[str, str]:
         "matarnr": get("Mätarnr."),
         "anlaggnings_id": get("Anläggnings-id"),
         "teknisk_nr": get("Teknisk nr."),
-        "saking": "16A",
+        "saking": get("Säkring", "16A"),
     }
-
-    driver.quit()
     return payload
 
 
+def read_elsmart_many(urls: Iterable[str], max_concurrency: int = ELSMART_CONCURRENCY,
+                      pool: Optional[rpa_browser.DriverPool] = None
+                      ) -> Iterator[Tuple[int, str, Union[Dict[str, str], Exception]]]:
+    """
+    Läser Elsmart-sidor parallellt, högst max_concurrency åt gången (en Chrome
+    per tråd ur pool), och ger (index, url, payload) i den ordning de blir klara.
+    En misslyckad läsning ger undantaget i stället för payload.
+
+    urls läses lat: bara max_concurrency sidor är på väg, och nästa startas
+    innan en klar payload lämnas ut – så läsningarna fortsätter medan
+    anroparen kör GUI-flödet för föregående ärende.
+    """
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency måste vara minst 1")
+    own = pool is None
+    if own:
+        pool = rpa_browser.DriverPool(max_concurrency, CHROME_PROFILE)
+
+    def read(url: str) -> Dict[str, str]:
+        with pool.lease() as driver:
+            return read_elsmart(url, driver)
+
+    pending = iter(enumerate(urls))
+    running: Dict[Future, Tuple[int, str]] = {}
+    try:
+        with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="elsmart") as ex:
+            def fill():
+                while len(running) < max_concurrency:
+                    nxt = next(pending, None)
+                    if nxt is None:
+                        return
+                    running[ex.submit(read, nxt[1])] = nxt
+
+            fill()
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    i, url = running.pop(fut)
+                    fill()
+                    try:
+                        result: Union[Dict[str, str], Exception] = fut.result()
+                    except Exception as e:
+                        result = e
+                    yield i, url, result
+    finally:
+        if own:
+            pool.close()
+
+
 # -------------------------
 # Starta appar
 # -------------------------
@@ -304,16 +655,76 @@ def read_elsmart() -> Dict[str, str]:
 def start_app(script_path: Path) -> subprocess.Popen:
     if not script_path.exists():
         raise RPAError(f"Hittar inte: {script_path}")
-    return subprocess.Popen([sys.executable, str(script_path)],
+    env = dict(os.environ)
+    # Alltid: även bildvägen läser tillbaka comboboxval via socketen
+    sock_dir = automation_dir()
+    sock_dir.mkdir(mode=0o700, exist_ok=True)
+    env[ENV_DIR] = str(sock_dir)
+    return subprocess.Popen([sys.executable, str(script_path)], env=env,
                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
 
 
+def ensure_app(script_path: Path, signature: str, timeout: float = APP_READY_TIMEOUT) -> Optional[subprocess.Popen]:
+    """
+    Startar appen om dess fönster inte redan syns och väntar tills signaturen
+    dyker upp (i stället för en blind sleep). None = fönstret fanns redan.
+    """
+    try:
+        locate_signature(signature)
+        return None
+    except Exception:
+        pass
+    proc = start_app(script_path)
+    ready = wait_until(lambda: proc.poll() is not None or signature_visible(signature), "app_start",
+                       timeout=timeout, poll=0.2, legacy=2.0)
+    if proc.poll() is not None:
+        raise RPAError(f"{script_path.name} avslutades direkt (kod {proc.returncode})")
+    if not ready:
+        raise RPAError(f"{script_path.name} blev inte redo inom {timeout:.0f} s ({signature} syns inte)")
+    return proc
+
+
 # -------------------------
 # Flöden i LIME/BFUS
 # -------------------------
 
+def _flow(fn, *args):
+    """Kör ett flödessteg; vid inspelning loggas anropet så att rpa_replay.py kan köra om det."""
+    if RECORDER is not None:
+        RECORDER.call(fn.__name__, args)
+    return fn(*args)
+
+
+def _lime_enter_case_api(lime: AutomationClient, case: Dict[str, str]) -> bool:
+    lime.set("Tjänstenummer", case["tjanstenr"])
+    lime.set("Kundnummer", case["kundnr"])
+    return True
+
+
+def lime_enter_case(case: Dict[str, str]):
+    """Batch: skriver ärendets tjänstenr/kundnr i LIME-formuläret (ersätter förra ärendets värden)."""
+    if _fast("lime", _lime_enter_case_api, case):
+        return
+    alt_tab_until_signature(T["lime_signature"], max_tries=8, threshold=0.75)
+    click_template(T["lime_lbl_tjanstenummer"], threshold=0.78, offset=(0, 32))
+    type_text(case["tjanstenr"])
+    click_template(T["lime_lbl_kundnummer"], threshold=0.78, offset=(0, 32))
+    type_text(case["kundnr"])
+
+
+def _lime_ids_api(lime: AutomationClient) -> Dict[str, str]:
+    lime.invoke("Pricka av")
+    return {"tjanstenr": lime.get("Tjänstenummer"), "kundnr": lime.get("Kundnummer")}
+
+
 def lime_check_checklist_and_get_ids() -> Dict[str, str]:
-    """Går till Lime, prickar av checklistan och hämtar tjänstenr + kundnr via copy (UI)."""
+    """
+    Går till Lime, prickar av checklistan och hämtar tjänstenr + kundnr. Via
+    socketen returneras värdena; via UI ligger de i urklipp (copy).
+    """
+    ids = _fast("lime", _lime_ids_api)
+    if ids:
+        return ids
     alt_tab_until_signature(T["lime_signature"], max_tries=8, threshold=0.75)
 
     # Pricka av (simulerat)
@@ -321,22 +732,50 @@ def lime_check_checklist_and_get_ids() -> Dict[str, str]:
 
     # Kopiera kundnummer (klicka label → offset till entry)
     click_template(T["lime_lbl_kundnummer"], threshold=0.78, offset=(0, 32))
-    pyautogui.hotkey("ctrl", "a"); time.sleep(0.05)
-    pyautogui.hotkey("ctrl", "c"); time.sleep(0.05)
+    key_and_settle("ctrl", "a", name="select_all")
+    key_and_settle("ctrl", "c", name="copy")
 
     # Vi paste: kundnummer i BFUS senare direkt (Ctrl+V)
     kundnr_clipboard_ready = True
 
     # Kopiera tjänstenummer till clipboard (för kundreferens i BFUS)
     click_template(T["lime_lbl_tjanstenummer"], threshold=0.78, offset=(0, 32))
-    pyautogui.hotkey("ctrl", "a"); time.sleep(0.05)
-    pyautogui.hotkey("ctrl", "c"); time.sleep(0.05)
+    key_and_settle("ctrl", "a", name="select_all")
+    key_and_settle("ctrl", "c", name="copy")
 
     return {"tjanstenr_clipboard": "yes", "kundnr_clipboard": "yes"}
 
 
+def _press_msgbox_ok(client: AutomationClient, template_key: str):
+    """OK i Tk:s meddelanderuta; där den inte nås via socketen (Windows/macOS) med bild."""
+    try:
+        client.press_dialog("ok")
+    except AutomationError:
+        click_template(T[template_key], threshold=0.70)
+
+
+def _bfus_fill_api(bfus: AutomationClient, payload: Dict[str, str], tjanstenr: str) -> bool:
+    bfus.set("Tjänstenummer", tjanstenr)
+    bfus.set("Anläggnings-id", payload.get("anlaggnings_id", ""))
+    bfus.set("Säkring", payload.get("saking", "16A"))
+
+    bfus.invoke("Söktjänst")
+    bfus.wait_window("Sök tjänst")
+    bfus.set("Sök tjänst/Tjänstenummer", tjanstenr)
+    bfus.invoke("Sök tjänst/Sök")
+    bfus.wait(lambda: bfus.get("Sök tjänst/Träffar", limit=0)["count"], "träffar i Sök tjänst")
+    bfus.set("Sök tjänst/Träffar", 0)
+    bfus.invoke("Sök tjänst/OK")
+
+    bfus.invoke("Spara")
+    _press_msgbox_ok(bfus, "msgbox_ok")
+    return True
+
+
 def bfus_fill_overgripande(payload: Dict[str, str], tjanstenr: str):
     """Den del ni redan har: fyll övergripande uppgifter + söktjänst + spara."""
+    if _fast("bfus", _bfus_fill_api, payload, tjanstenr):
+        return
     alt_tab_until_signature(T["bfus_signature"], max_tries=8, threshold=0.75)
 
     click_template(T["bfus_lbl_tjanstenummer"], threshold=0.78, offset=(240, 0))
@@ -345,10 +784,7 @@ def bfus_fill_overgripande(payload: Dict[str, str], tjanstenr: str):
     click_template(T["bfus_lbl_anlaggnings_id"], threshold=0.78, offset=(240, 0))
     type_text(payload.get("anlaggnings_id", ""))
 
-    click_template(T["bfus_lbl_saking"], threshold=0.78, offset=(240, 0))
-    pyautogui.hotkey("alt", "down"); time.sleep(0.15)
-    type_text(payload.get("saking", "16A"), clear_first=False)
-    pyautogui.press("enter")
+    set_combobox("saking", payload.get("saking", "16A"), offset=(240, 0), threshold=0.78)
 
     click_template(T["bfus_btn_soktjanst"], threshold=0.78)
     alt_tab_until_signature(T["bfus_popup_signature"], max_tries=6, threshold=0.75)
@@ -359,7 +795,7 @@ def bfus_fill_overgripande(payload: Dict[str, str], tjanstenr: str):
     click_template(T["bfus_popup_btn_sok"], threshold=0.78)
 
     click_template(T["bfus_popup_tree_header_nyhet"], threshold=0.75, offset=(40, 60))
-    pyautogui.press("down"); time.sleep(0.1)
+    key_and_wait_change("down", region=_focus_region(600, 120), name="tree_select", legacy=0.1)
 
     # OK i popup
     click_template(T["bfus_popup_btn_ok"], threshold=0.75)
@@ -369,7 +805,43 @@ def bfus_fill_overgripande(payload: Dict[str, str], tjanstenr: str):
     click_template(T["msgbox_ok"], threshold=0.70)
 
 
-def bfus_create_avtal_flow(payload: Dict[str, str]):
+def avtal_values(payload: Dict[str, str]) -> Dict[str, str]:
+    """Comboboxvärden för avtalet: AVTAL_DEFAULTS, överskrivna av payload (samma nycklar)."""
+    return {k: payload.get(k) or v for k, v in AVTAL_DEFAULTS.items()}
+
+
+def _bfus_avtal_api(bfus: AutomationClient, ids: Dict[str, str], avtal: Dict[str, str]) -> bool:
+    w = "Skapa avtal/"
+    bfus.invoke("Skapa avtal")
+    bfus.wait_window("Skapa avtal")
+
+    bfus.set(w + "Avtalsägande företag", avtal["company"])
+    bfus.set(w + "Avtalsmål", avtal["goal"])
+    bfus.set(w + "Kundnummer", ids["kundnr"])
+    bfus.invoke(w + "Kalender")
+    bfus.wait_window("Välj startdatum")
+    bfus.set("Välj startdatum/Välj faktiskt startdatum", 0)
+    bfus.invoke("Välj startdatum/OK")
+    bfus.set(w + "Förbrukartyp", avtal["forbruk"])
+    bfus.invoke(w + "Nästa")
+
+    bfus.invoke(w + "Sök produkt")
+    bfus.invoke(w + "Sök")
+    bfus.set(w + "Debiteringssätt", avtal["deb_satt"])
+    bfus.set(w + "Debiteringsformel", avtal["deb_formel"])
+    bfus.invoke(w + "Nästa")
+
+    bfus.set(w + "Prisparameter 1", avtal["pp1"])
+    bfus.set(w + "Prisparameter 2", avtal["pp2"])
+    bfus.invoke(w + "Nästa")
+
+    bfus.set(w + "Kundreferens", ids["tjanstenr"])
+    bfus.invoke(w + "Spara avtal")
+    _press_msgbox_ok(bfus, "msgbox_avtal_ok")
+    return True
+
+
+def bfus_create_avtal_flow(payload: Dict[str, str], ids: Optional[Dict[str, str]] = None):
     """
     Fortsättning enligt nulägesmodellen:
     - Går till BFUS, väljer Skapa avtal
@@ -377,7 +849,13 @@ def bfus_create_avtal_flow(payload: Dict[str, str]):
     - Sök produkt, välj produkt, debiteringssätt/debiteringsformel
     - Prisparametrar
     - Fakturavillkor: klistra in tjänstenr som kundreferens
+
+    ids: kundnr/tjanstenr från lime_check_checklist_and_get_ids() via socketen;
+    saknas de klistras värdena in från urklipp.
     """
+    avtal = avtal_values(payload)
+    if ids and "kundnr" in ids and _fast("bfus", _bfus_avtal_api, ids, avtal):
+        return
     alt_tab_until_signature(T["bfus_signature"], max_tries=8, threshold=0.75)
 
     # Öppna wizard
@@ -385,19 +863,15 @@ def bfus_create_avtal_flow(payload: Dict[str, str]):
     alt_tab_until_signature(T["avtal_signature"], max_tries=6, threshold=0.75)
 
     # Avtalsägande företag (klick label → offset till combobox)
-    click_template(T["avtal_lbl_company"], threshold=0.75, offset=(260, 0))
-    pyautogui.hotkey("alt", "down"); time.sleep(0.15)
-    pyautogui.press("down"); pyautogui.press("enter")
+    set_combobox("company", avtal["company"])
 
     # Avtalsmål
-    click_template(T["avtal_lbl_goal"], threshold=0.75, offset=(260, 0))
-    pyautogui.hotkey("alt", "down"); time.sleep(0.15)
-    pyautogui.press("down"); pyautogui.press("enter")
+    set_combobox("goal", avtal["goal"])
 
     # Kundnummer: klistra från Lime clipboard (vi kopierade kundnr sist – alt: kopiera igen)
     click_template(T["avtal_lbl_kundnr"], threshold=0.75, offset=(260, 0))
-    pyautogui.hotkey("ctrl", "a"); time.sleep(0.05)
-    pyautogui.hotkey("ctrl", "v")  # kundnummer från Lime
+    key_and_settle("ctrl", "a", name="select_all")
+    INPUT.hotkey("ctrl", "v")  # kundnummer från Lime
 
     # Kalender
     click_template(T["avtal_btn_kalender"], threshold=0.75)
@@ -407,9 +881,7 @@ def bfus_create_avtal_flow(payload: Dict[str, str]):
     click_template(T["calendar_btn_ok"], threshold=0.70)
 
     # Förbrukartyp
-    click_template(T["avtal_lbl_forbruk"], threshold=0.75, offset=(260, 0))
-    pyautogui.hotkey("alt", "down"); time.sleep(0.15)
-    pyautogui.press("down"); pyautogui.press("enter")
+    set_combobox("forbruk", avtal["forbruk"])
 
     # Nästa → Produkt
     click_template(T["avtal_btn_next"], threshold=0.75)
@@ -419,34 +891,26 @@ def bfus_create_avtal_flow(payload: Dict[str, str]):
     click_template(T["avtal_btn_sok"], threshold=0.75)
 
     # Debiteringssätt
-    click_template(T["avtal_lbl_deb_satt"], threshold=0.75, offset=(260, 0))
-    pyautogui.hotkey("alt", "down"); time.sleep(0.15)
-    pyautogui.press("down"); pyautogui.press("enter")
+    set_combobox("deb_satt", avtal["deb_satt"])
 
     # Debiteringsformel
-    click_template(T["avtal_lbl_deb_formel"], threshold=0.75, offset=(260, 0))
-    pyautogui.hotkey("alt", "down"); time.sleep(0.15)
-    pyautogui.press("down"); pyautogui.press("enter")
+    set_combobox("deb_formel", avtal["deb_formel"])
 
     # Nästa → Prisparametrar
     click_template(T["avtal_btn_next"], threshold=0.75)
 
     # Prisparameter 1/2
-    click_template(T["avtal_lbl_pp1"], threshold=0.75, offset=(260, 0))
-    pyautogui.hotkey("alt", "down"); time.sleep(0.15)
-    pyautogui.press("down"); pyautogui.press("enter")
+    set_combobox("pp1", avtal["pp1"])
 
-    click_template(T["avtal_lbl_pp2"], threshold=0.75, offset=(260, 0))
-    pyautogui.hotkey("alt", "down"); time.sleep(0.15)
-    pyautogui.press("down"); pyautogui.press("enter")
+    set_combobox("pp2", avtal["pp2"])
 
     # Nästa → Fakturavillkor
     click_template(T["avtal_btn_next"], threshold=0.75)
 
     # Kundreferens: klistra in tjänstenummer (vi kopierade det sist i Lime)
     click_template(T["avtal_lbl_kundref"], threshold=0.75, offset=(260, 0))
-    pyautogui.hotkey("ctrl", "a"); time.sleep(0.05)
-    pyautogui.hotkey("ctrl", "v")
+    key_and_settle("ctrl", "a", name="select_all")
+    INPUT.hotkey("ctrl", "v")
 
     # Spara avtal
     click_template(T["avtal_btn_spara"], threshold=0.75)
@@ -455,6 +919,171 @@ def bfus_create_avtal_flow(payload: Dict[str, str]):
     click_template(T["msgbox_avtal_ok"], threshold=0.70)
 
 
+# -------------------------
+# Batch
+# -------------------------
+
+def read_cases(path: Path, limit: int = 0) -> Iterator[Dict[str, str]]:
+    """cases.jsonl från case_generator.py, strömmande."""
+    with path.open(encoding="utf-8") as f:
+        n = 0
+        for line in f:
+            if not line.strip():
+                continue
+            if limit and n >= limit:
+                return
+            n += 1
+            yield json.loads(line)
+
+
+def elsmart_url(case: Dict[str, str], elsmart_base: str = ELSMART_BASE) -> str:
+    return elsmart_base + case["elsmart"] if case.get("elsmart") else ELSMART_URL
+
+
+def run_case(case: Dict[str, str], driver: Optional[webdriver.Chrome] = None, elsmart_base: str = ELSMART_BASE,
+             payload: Optional[Dict[str, str]] = None) -> Dict[str, float]:
+    """
+    Ett ärende genom hela flödet i redan öppna fönster. Returnerar tid (s) per
+    del. payload = redan läst Elsmart (read_elsmart_many); annars läses sidan
+    med driver.
+    """
+    timings: Dict[str, float] = {}
+
+    def timed(name: str, fn, *args):
+        t0 = time.perf_counter()
+        result = _flow(fn, *args)
+        timings[name] = time.perf_counter() - t0
+        return result
+
+    timed("lime_case", lime_enter_case, case)
+    if payload is None:
+        # Inte via _flow: drivern går inte att spela in (och Elsmart ingår inte i uppspelningen)
+        t0 = time.perf_counter()
+        payload = read_elsmart(elsmart_url(case, elsmart_base), driver)
+        timings["elsmart"] = time.perf_counter() - t0
+    timed("bfus", bfus_fill_overgripande, payload, case["tjanstenr"])
+    ids = timed("lime", lime_check_checklist_and_get_ids)
+    timed("avtal", bfus_create_avtal_flow, payload, ids)
+    return timings
+
+
+def dismiss_leftovers():
+    """Mellan ärenden: stänger en kvarglömd meddelanderuta efter ett misslyckat ärende."""
+    for key in ("msgbox_avtal_ok", "msgbox_ok"):
+        try:
+            m = locate_template(TEMPLATES_DIR / T[key], threshold=0.70, context="")
+        except Exception:
+            continue
+        _human_move_and_click(*m.center)
+
+
+def run_batch(cases_path: Path, layout: Optional[LayoutCache] = None, elsmart_base: str = ELSMART_BASE,
+              limit: int = 0, elsmart_concurrency: int = ELSMART_CONCURRENCY):
+    """
+    Kör alla ärenden i cases_path. LIME och BFUS startas (eller hittas) en
+    gång; mellan ärendena skrivs formulären över. Elsmart läses i förväg av
+    read_elsmart_many (upp till elsmart_concurrency Chrome), och ärendena
+    körs i den ordning deras sidor blir klara. Tid skrivs ut per ärende.
+    """
+    global LAYOUT
+    LAYOUT = layout
+    wait_for_start_button()
+
+    t0 = time.perf_counter()
+    ensure_app(LIME_SCRIPT, T["lime_signature"])
+    ensure_app(BFUS_SCRIPT, T["bfus_signature"])
+    print(f"Appar redo på {time.perf_counter() - t0:.1f} s")
+
+    cases: Dict[int, Dict[str, str]] = {}
+
+    def urls() -> Iterator[str]:
+        for i, case in enumerate(read_cases(cases_path, limit)):
+            cases[i] = case
+            yield elsmart_url(case, elsmart_base)
+
+    totals: List[float] = []
+    failed = 0
+    pool = rpa_browser.DriverPool(elsmart_concurrency, CHROME_PROFILE)
+    try:
+        for i, url, payload in read_elsmart_many(urls(), elsmart_concurrency, pool):
+            case = cases.pop(i)
+            if isinstance(payload, Exception):
+                failed += 1
+                print(f"{case['case_id']}: FEL vid läsning av {url} – {payload}")
+                continue
+            t1 = time.perf_counter()
+            try:
+                timings = run_case(case, payload=payload)
+            except Exception as e:  # som run_worker: ett ärende stoppar inte batchen
+                failed += 1
+                print(f"{case['case_id']}: FEL efter {time.perf_counter() - t1:.1f} s – {e}")
+                dismiss_leftovers()
+                continue
+            total = time.perf_counter() - t1
+            totals.append(total)
+            parts = "  ".join(f"{k} {v:.1f}" for k, v in timings.items())
+            print(f"{case['case_id']}: {total:.1f} s  ({parts})", flush=True)
+            if LAYOUT is not None:
+                LAYOUT.save()
+    finally:
+        pool.close()
+
+    if totals:
+        print(f"✅ {len(totals)} ärenden klara, {failed} fel. Första {totals[0]:.1f} s, "
+              f"snitt övriga {sum(totals[1:]) / max(1, len(totals) - 1):.1f} s, totalt {time.perf_counter() - t0:.1f} s")
+    elif failed:
+        print(f"❌ Inga ärenden klara, {failed} fel.")
+    if LAYOUT is not None:
+        print(LAYOUT.summary())
+    print(WAIT_STATS.report())
+
+
+def run_worker(layout: Optional[LayoutCache] = None, elsmart_base: str = ELSMART_BASE):
+    """
+    Arbetarläge för rpa_sessions.py: en process per X-display (DISPLAY satt av
+    föräldern). Startar LIME/BFUS/Chrome på den displayen, svarar {"ready": ...}
+    och läser sedan ärenden som JSON-rader på stdin med en JSON-rad per ärende
+    som svar på stdout.
+    """
+    global LAYOUT
+    LAYOUT = layout
+    out = sys.stdout
+    sys.stdout = sys.stderr  # övriga utskrifter får inte blandas med protokollet
+
+    def reply(obj: Dict):
+        out.write(json.dumps(obj, ensure_ascii=False) + "\n")
+        out.flush()
+
+    try:
+        ensure_app(LIME_SCRIPT, T["lime_signature"])
+        ensure_app(BFUS_SCRIPT, T["bfus_signature"])
+        driver = new_driver()
+    except Exception as e:
+        reply({"ready": False, "error": str(e)})
+        return
+    reply({"ready": True})
+
+    try:
+        for line in sys.stdin:
+            if not line.strip():
+                continue
+            case = json.loads(line)
+            t0 = time.perf_counter()
+            try:
+                timings = run_case(case, driver, elsmart_base)
+                reply({"case_id": case.get("case_id", ""), "ok": True,
+                       "seconds": time.perf_counter() - t0, "timings": timings})
+            except Exception as e:
+                dismiss_leftovers()
+                reply({"case_id": case.get("case_id", ""), "ok": False,
+                       "seconds": time.perf_counter() - t0, "error": str(e)})
+            if LAYOUT is not None:
+                LAYOUT.save()
+    finally:
+        driver.quit()
+        print(WAIT_STATS.report())  # stderr, se ovan
+
+
 # -------------------------
 # CLI
 # -------------------------
@@ -497,19 +1126,21 @@ def print_templates():
     print("\nTips:")
     print("- Beskär tajt runt text/knapp.")
     print("- Ta bilder i samma upplösning/DPI som demon.")
-    print("- Signaturer: ta bara rubriken (t.ex. 'BFUS', 'Skapa avtal').\n")
+    print("- Signaturer: ta bara rubriken (t.ex. 'BFUS', 'Skapa avtal').")
+    print(f"- Valfritt: bild av ett comboboxvärde som {VALUES_DIR}/<värde>.png kontrollerar valet.\n")
 
 
-def run():
+def run(layout: Optional[LayoutCache] = None):
+    global LAYOUT
     TEMPLATES_DIR.mkdir(parents=True, exist_ok=True)
+    LAYOUT = layout
 
     # ✅ Vänta på att du trycker Start (bra för demo/presentation)
     wait_for_start_button()
 
-    # Starta appar (kan kommenteras bort om du startar manuellt)
-    lime_proc = start_app(LIME_SCRIPT)
-    bfus_proc = start_app(BFUS_SCRIPT)
-    time.sleep(2.0)
+    # Starta appar om de inte redan är öppna; vänta på signaturen i stället för sleep
+    lime_proc = ensure_app(LIME_SCRIPT, T["lime_signature"])
+    bfus_proc = ensure_app(BFUS_SCRIPT, T["bfus_signature"])
 
     # 1) Läs Elsmart
     payload = read_elsmart()
@@ -517,31 +1148,83 @@ def run():
 
     # 2) (Din tidigare del) – här antar vi att du redan har en tjänstenr från Lime
     tjanstenr = "445323"
-    bfus_fill_overgripande(payload, tjanstenr)
+    _flow(bfus_fill_overgripande, payload, tjanstenr)
 
     # 3) Fortsättning enligt nya modellen:
     # Gå till Lime och prick av checklistan + kopiera kundnr + tjänstenr till clipboard
-    lime_check_checklist_and_get_ids()
+    ids = _flow(lime_check_checklist_and_get_ids)
 
     # Gå till BFUS och skapa avtal (wizard)
-    bfus_create_avtal_flow(payload)
+    _flow(bfus_create_avtal_flow, payload, ids)
 
     print("✅ Klar (hela flödet).")
+    if LAYOUT is not None:
+        LAYOUT.save()
+        print(LAYOUT.summary())
+    print(WAIT_STATS.report())
 
 
 def main():
+    global USE_AUTOMATION, CAPTURE_BACKEND, CAPTURE, INPUT, RECORDER, CHROME_PROFILE
     ap = argparse.ArgumentParser()
     ap.add_argument("--print-templates", action="store_true")
     ap.add_argument("--run", action="store_true")
+    ap.add_argument("--layout-cache", type=Path, default=LAYOUT_FILE,
+                    help="sparade klickkoordinater per fönster (JSON)")
+    ap.add_argument("--no-layout-cache", action="store_true", help="full template matching varje gång")
+    ap.add_argument("--clear-layout-cache", action="store_true", help="börja om med tom cache")
+    ap.add_argument("--batch", type=Path, default=None, help="cases.jsonl: kör alla ärenden i samma fönster")
+    ap.add_argument("--elsmart-base", default=ELSMART_BASE, help="URL som ärendenas elsmart-sökvägar utgår från")
+    ap.add_argument("--count", type=int, default=0, help="max antal ärenden (--batch)")
+    ap.add_argument("--elsmart-concurrency", type=int, default=ELSMART_CONCURRENCY,
+                    help="max samtidiga Elsmart-läsningar i förväg (--batch), en Chrome var")
+    ap.add_argument("--worker", action="store_true", help="ärenden via stdin/stdout (startas av rpa_sessions.py)")
+    ap.add_argument("--capture", choices=CAPTURE_BACKENDS, default=CAPTURE_BACKEND,
+                    help="skärmfångst: mss (snabb, bara begärd ruta) eller pil (pyautogui:s väg)")
+    ap.add_argument("--no-automation", action="store_true",
+                    help="använd inte klonernas automationssocket (bara bilder/tangentbord)")
+    ap.add_argument("--record", type=Path, default=None,
+                    help="spela in skärmbilder och handlingar till katalog (för rpa_replay.py)")
+    ap.add_argument("--max-wait", type=float, default=WAIT.max_wait,
+                    help="max sekunder att vänta på en signatur/knapp innan steget ger upp")
+    ap.add_argument("--chrome-profile", choices=rpa_browser.PROFILES, default=CHROME_PROFILE,
+                    help="Chrome för Elsmart: fast (headless, utan bilder/typsnitt) eller default (gamla)")
     args = ap.parse_args()
+    USE_AUTOMATION = not args.no_automation
+    CHROME_PROFILE = args.chrome_profile
+    WAIT.max_wait = args.max_wait
+    CAPTURE_BACKEND = args.capture
 
     if args.print_templates:
         print_templates()
         return
-    if args.run:
-        run()
-        return
-    ap.print_help()
+    layout = None
+    if not args.no_layout_cache:
+        layout = LayoutCache(args.layout_cache)
+        if args.clear_layout_cache:
+            layout.clear()
+    if args.record and (args.run or args.batch):
+        from rpa_replay import Recorder
+        RECORDER = Recorder(args.record, _capture(), INPUT)
+        CAPTURE, INPUT = RECORDER.capture, RECORDER.input
+        USE_AUTOMATION = False  # inspelningen ska gå bildvägen
+    try:
+        if args.worker:
+            run_worker(layout, elsmart_base=args.elsmart_base)
+            return
+        if args.batch:
+            TEMPLATES_DIR.mkdir(parents=True, exist_ok=True)
+            run_batch(args.batch, layout, elsmart_base=args.elsmart_base, limit=args.count,
+                      elsmart_concurrency=args.elsmart_concurrency)
+            return
+        if args.run:
+            run(layout)
+            return
+        ap.print_help()
+    finally:
+        if RECORDER is not None:
+            RECORDER.close()
+            print(f"Inspelning: {RECORDER.frames} skärmbilder i {args.record}")
 
 
 if __name__ == "__main__":
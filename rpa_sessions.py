@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Parallella RPA-sessioner på virtuella X-displayer (Linux).
+
+En robot äger skärmen och musen, så en maskin kör bara ett ärende i taget.
+SessionManager startar i stället N Xvfb-displayer och på varje:
+  - (valfritt) en fönsterhanterare, t.ex. openbox – Alt+Tab i roboten kräver en
+  - en robotprocess i arbetarläge (rpa_robot_with_start_button_v2.py --worker)
+    med DISPLAY satt, som själv startar sitt LIME + BFUS-par och sin Chrome.
+Ärendena fördelas från en gemensam kö: varje session tar nästa ärende när den
+är klar med föregående (snabba sessioner tar fler).
+
+Kör:
+  python -m http.server 8000 --directory gen/100
+  python rpa_sessions.py --cases gen/100/cases.jsonl --sessions 4 --wm openbox
+
+Kräver Xvfb (apt install xvfb) och robotens beroenden (pyautogui, selenium).
+Varje session har en egen layoutcache (layout_cache.<display>.json).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import queue
+import select
+import shutil
+import signal
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent
+ROBOT_SCRIPT = ROOT / "rpa_robot_with_start_button_v2.py"
+
+FIRST_DISPLAY = 99
+SCREEN_SIZE = (1920, 1080)
+READY_TIMEOUT = 90.0    # s, tills en session startat sina appar
+CASE_TIMEOUT = 300.0    # s per ärende innan sessionen ges upp
+
+
+class SessionError(RuntimeError):
+    pass
+
+
+def _x_socket(display: int) -> Path:
+    return Path(f"/tmp/.X11-unix/X{display}")
+
+
+def _kill(proc: Optional[subprocess.Popen], group: bool = False):
+    if proc is None or proc.poll() is not None:
+        return
+    try:
+        if group:
+            os.killpg(proc.pid, signal.SIGTERM)
+        else:
+            proc.terminate()
+        proc.wait(timeout=5)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        try:
+            if group:
+                os.killpg(proc.pid, signal.SIGKILL)
+            else:
+                proc.kill()
+        except ProcessLookupError:
+            pass
+
+
+@dataclass
+class Session:
+    index: int
+    display: int
+    xvfb: Optional[subprocess.Popen] = None
+    wm: Optional[subprocess.Popen] = None
+    worker: Optional[subprocess.Popen] = None
+    done: int = 0
+    failed: int = 0
+    alive: bool = False
+
+    @property
+    def env(self) -> Dict[str, str]:
+        return {**os.environ, "DISPLAY": f":{self.display}"}
+
+
+@dataclass
+class SessionManager:
+    sessions: int = 2
+    first_display: int = FIRST_DISPLAY
+    size: Tuple[int, int] = SCREEN_SIZE
+    wm: Optional[str] = None             # fönsterhanterare per display, t.ex. "openbox"
+    robot_args: List[str] = field(default_factory=list)
+    case_timeout: float = CASE_TIMEOUT
+    running: List[Session] = field(default_factory=list)
+
+    # ---- Start/stopp
+    def start(self):
+        if shutil.which("Xvfb") is None:
+            raise SessionError("Xvfb saknas (apt install xvfb)")
+        display = self.first_display
+        for i in range(self.sessions):
+            while _x_socket(display).exists():  # upptagen display
+                display += 1
+            s = Session(i, display)
+            self.running.append(s)
+            self._start_display(s)
+            display += 1
+        # Robotarna startar sina appar parallellt; vänta in alla
+        for s in self.running:
+            self._start_worker(s)
+        for s in self.running:
+            self._await_ready(s)
+
+    def _start_display(self, s: Session):
+        w, h = self.size
+        s.xvfb = subprocess.Popen(["Xvfb", f":{s.display}", "-screen", "0", f"{w}x{h}x24", "-nolisten", "tcp"],
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        end_time = time.time() + 10
+        while not _x_socket(s.display).exists():
+            if s.xvfb.poll() is not None or time.time() > end_time:
+                raise SessionError(f"Xvfb :{s.display} startade inte")
+            time.sleep(0.05)
+        if self.wm:
+            s.wm = subprocess.Popen([self.wm], env=s.env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def _start_worker(self, s: Session):
+        cmd = [sys.executable, str(ROBOT_SCRIPT), "--worker",
+               "--layout-cache", str(ROOT / f"layout_cache.{s.display}.json"), *self.robot_args]
+        # Egen processgrupp: LIME/BFUS/Chrome som roboten startar stängs med den
+        s.worker = subprocess.Popen(cmd, env=s.env, cwd=str(ROOT), stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                    text=True, encoding="utf-8", bufsize=1, start_new_session=True)
+
+    def _await_ready(self, s: Session):
+        msg = self._read(s, READY_TIMEOUT)
+        if not msg or not msg.get("ready"):
+            err = (msg or {}).get("error", "ingen respons")
+            raise SessionError(f"Session {s.index} (:{s.display}) blev inte redo: {err}")
+        s.alive = True
+
+    def close(self):
+        for s in self.running:
+            if s.worker is not None and s.worker.stdin:
+                try:
+                    s.worker.stdin.close()
+                except OSError:
+                    pass
+            _kill(s.worker, group=True)
+            _kill(s.wm)
+            _kill(s.xvfb)
+        self.running.clear()
+
+    def __enter__(self) -> "SessionManager":
+        try:
+            self.start()
+        except Exception:
+            self.close()
+            raise
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---- Protokoll
+    def _read(self, s: Session, timeout: float) -> Optional[Dict]:
+        """Nästa JSON-rad från robotens stdout (None vid timeout/EOF)."""
+        out = s.worker.stdout
+        ready, _, _ = select.select([out], [], [], timeout)
+        if not ready:
+            return None
+        line = out.readline()
+        return json.loads(line) if line.strip() else None
+
+    # ---- Körning
+    def run(self, cases: Iterable[Dict[str, str]]) -> Iterator[Dict]:
+        """Fördelar ärendena över sessionerna; lämnar ett resultat per ärende (i klar-ordning)."""
+        todo: "queue.Queue" = queue.Queue(maxsize=len(self.running) * 2)
+        results: "queue.Queue" = queue.Queue()
+
+        def serve(s: Session):
+            while s.alive:  # en död session slutar ta ärenden; övriga tar resten
+                case = todo.get()
+                if case is None:
+                    break
+                try:
+                    s.worker.stdin.write(json.dumps(case, ensure_ascii=False) + "\n")
+                    s.worker.stdin.flush()
+                    res = self._read(s, self.case_timeout)
+                except (OSError, ValueError) as e:
+                    res = None
+                    err = str(e)
+                else:
+                    err = "timeout/robot avslutad"
+                if res is None:
+                    s.alive = False
+                    res = {"case_id": case.get("case_id", ""), "ok": False, "error": f"session {s.index}: {err}"}
+                    _kill(s.worker, group=True)
+                res["session"] = s.index
+                if res.get("ok"):
+                    s.done += 1
+                else:
+                    s.failed += 1
+                results.put(res)
+            results.put(None)
+
+        threads = [threading.Thread(target=serve, args=(s,), name=f"rpa-session-{s.index}", daemon=True)
+                   for s in self.running if s.alive]
+        stopped = threading.Event()  # ingen levande session kvar
+        feed_done = object()
+
+        def feed():
+            for case in cases:
+                while not stopped.is_set():
+                    try:
+                        todo.put(case, timeout=0.2)
+                        break
+                    except queue.Full:
+                        continue
+                else:
+                    results.put(_lost(case))
+            if not stopped.is_set():
+                for _ in threads:
+                    todo.put(None)
+            results.put(feed_done)
+
+        def drain():
+            while True:
+                try:
+                    case = todo.get_nowait()
+                except queue.Empty:
+                    return
+                if case is not None:
+                    yield _lost(case)
+
+        for t in threads:
+            t.start()
+        threading.Thread(target=feed, name="rpa-feed", daemon=True).start()
+        remaining = len(threads)
+        fed = False
+        while remaining or not fed:
+            if not remaining and not stopped.is_set():
+                # Alla sessioner döda: resten av ärendena får ett felresultat i stället för att försvinna
+                stopped.set()
+                yield from drain()
+            res = results.get()
+            if res is None:
+                remaining -= 1
+            elif res is feed_done:
+                fed = True
+            else:
+                yield res
+        yield from drain()  # ett ärende som hann läggas i kön samtidigt som sista sessionen dog
+
+
+def _lost(case: Dict[str, str]) -> Dict:
+    return {"case_id": case.get("case_id", ""), "ok": False, "session": -1, "lost": True,
+            "error": "ingen levande session kvar – ärendet kördes inte"}
+
+
+def _read_cases(path: Path, limit: int) -> Iterator[Dict[str, str]]:
+    with path.open(encoding="utf-8") as f:
+        n = 0
+        for line in f:
+            if not line.strip():
+                continue
+            if limit and n >= limit:
+                return
+            n += 1
+            yield json.loads(line)
+
+
+def _size(text: str) -> Tuple[int, int]:
+    w, _, h = text.lower().partition("x")
+    return int(w), int(h)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Parallella RPA-sessioner på Xvfb-displayer")
+    ap.add_argument("--cases", type=Path, required=True, help="cases.jsonl från case_generator.py")
+    ap.add_argument("--count", type=int, default=0, help="max antal ärenden")
+    ap.add_argument("--sessions", type=int, default=2)
+    ap.add_argument("--first-display", type=int, default=FIRST_DISPLAY)
+    ap.add_argument("--size", type=_size, default=SCREEN_SIZE, help="skärmstorlek per display, t.ex. 1920x1080")
+    ap.add_argument("--wm", default=None, help="fönsterhanterare per display (t.ex. openbox)")
+    ap.add_argument("--elsmart-base", default=None, help="skickas vidare till roboten")
+    ap.add_argument("--case-timeout", type=float, default=CASE_TIMEOUT)
+    args = ap.parse_args()
+
+    robot_args = ["--elsmart-base", args.elsmart_base] if args.elsmart_base else []
+    mgr = SessionManager(args.sessions, args.first_display, args.size, args.wm, robot_args, args.case_timeout)
+    t0 = time.perf_counter()
+    with mgr:
+        print(f"{len(mgr.running)} sessioner redo på {time.perf_counter() - t0:.1f} s "
+              f"(displayer {', '.join(':%d' % s.display for s in mgr.running)})", flush=True)
+        t1 = time.perf_counter()
+        n = lost = 0
+        for res in mgr.run(_read_cases(args.cases, args.count)):
+            n += 1
+            lost += bool(res.get("lost"))
+            status = f"{res['seconds']:.1f} s" if res.get("ok") else f"FEL – {res.get('error', '')}"
+            print(f"[{res['session']}] {res['case_id']}: {status}", flush=True)
+        elapsed = time.perf_counter() - t1
+        for s in mgr.running:
+            print(f"Session {s.index} (:{s.display}): {s.done} klara, {s.failed} fel")
+    print(f"{n} ärenden på {elapsed:.1f} s = {n / elapsed * 60 if elapsed else 0:.1f} ärenden/min")
+    if lost:
+        raise SystemExit(f"{lost} ärenden kördes inte: alla sessioner dog")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+OpenCV-delen av RPA-roboten: template matching mot en given bild (BGR).
+
+Ligger separat från roboten så att matchningen kan köras utan skärm/PyAutoGUI
+(benchmarks, inspelade skärmbilder).
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+@dataclass
+class Match:
+    center: Tuple[int, int]
+    score: float
+    rect: Tuple[int, int, int, int]  # x,y,w,h
+
+
+class RPAError(RuntimeError):
+    pass
+
+
+@lru_cache(maxsize=128)
+def _load_template(path: str, mtime_ns: int) -> Optional[np.ndarray]:
+    # mtime i nyckeln: en omsparad template läses om
+    return cv2.imread(path, cv2.IMREAD_COLOR)
+
+
+def match_template(hay: np.ndarray, template_file: Path, threshold: float = 0.80,
+                   region: Optional[Tuple[int, int, int, int]] = None,
+                   origin: Tuple[int, int] = (0, 0)) -> Match:
+    """
+    Letar template_file i hay (hela bilden eller region=x,y,w,h). Koordinater i
+    hay, förskjutna med origin – för en hay som redan är en utskuren ruta
+    (rpa_capture grab(region)) är origin rutans övre vänstra hörn på skärmen.
+    """
+    if not template_file.exists():
+        raise RPAError(f"Template saknas: {template_file} (lägg PNG i templates/)")
+
+    rx, ry = origin
+    if region is not None:
+        x0, y0, rw, rh = region
+        hay = hay[y0:y0+rh, x0:x0+rw]
+        rx, ry = rx + x0, ry + y0
+
+    needle = _load_template(str(template_file), template_file.stat().st_mtime_ns)
+    if needle is None:
+        raise RPAError(f"Kunde inte läsa template: {template_file}")
+
+    if needle.shape[0] > hay.shape[0] or needle.shape[1] > hay.shape[1]:
+        raise RPAError(f"Hittade inte {template_file.name} (rutan {hay.shape[1]}x{hay.shape[0]} är mindre än templaten)")
+
+    res = cv2.matchTemplate(hay, needle, cv2.TM_CCOEFF_NORMED)
+    _, max_val, _, max_loc = cv2.minMaxLoc(res)
+
+    if max_val < threshold:
+        raise RPAError(f"Hittade inte {template_file.name} (score={max_val:.3f} < {threshold})")
+
+    th, tw = needle.shape[:2]
+    x = max_loc[0] + rx
+    y = max_loc[1] + ry
+    cx = x + tw // 2
+    cy = y + th // 2
+    return Match(center=(cx, cy), score=float(max_val), rect=(x, y, tw, th))
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+Väntor för RPA-roboten: vänta på ett tillstånd i stället för en fast paus.
+
+Roboten sov förr en fast tid efter nästan varje steg (0,8 s efter Alt+Tab och
+driver.get, 0,15 s efter varje Alt+Down, 0,05 s efter varje kortkommando).
+På en snabb maskin är det mest dödtid. wait_until() pollar i stället en
+kontroll (signatur syns, rutan har ändrats/lugnat sig, DOM-element finns,
+processens fönster syns) tills den är sann eller tiden tar slut.
+
+CONFIG styr övre gränser och pollintervall för alla väntor. STATS samlar per
+vänta hur lång tid den faktiskt tog jämfört med den gamla fasta pausen
+(legacy) – report() visar vad som sparats.
+
+Tiden räknas både i verklig tid och i summan av pauserna, så att en vänta
+där sleep inte sover (rpa_replay.py) ändå tar slut.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from rpa_vision import RPAError
+
+
+class WaitTimeout(RPAError):
+    pass
+
+
+@dataclass
+class WaitConfig:
+    max_wait: float = 6.0     # s, gräns för väntor utan egen timeout (signaturer, klick)
+    change_max: float = 1.0   # s, max för "rutan ändras" (dropdown, fönsterbyte)
+    settle_max: float = 0.3   # s, max för "rutan har lugnat sig" efter tangenttryck
+    poll: float = 0.02        # s mellan kontroller
+    # False: changed/settled är sanna direkt – vid uppspelning (rpa_replay.py)
+    # ändras bilden bara mellan handlingar, så de skulle alltid vänta ut gränsen
+    screen_probes: bool = True
+
+
+@dataclass
+class _Stat:
+    count: int = 0
+    seconds: float = 0.0
+    legacy: float = 0.0
+    longest: float = 0.0
+    timeouts: int = 0
+
+
+@dataclass
+class WaitStats:
+    stats: Dict[str, _Stat] = field(default_factory=dict)
+    # Elsmart-läsningar väntar i flera trådar samtidigt (read_elsmart_many)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, name: str, seconds: float, legacy: float, ok: bool):
+        with self._lock:
+            s = self.stats.setdefault(name, _Stat())
+            s.count += 1
+            s.seconds += seconds
+            s.legacy += legacy
+            s.longest = max(s.longest, seconds)
+            s.timeouts += 0 if ok else 1
+
+    def clear(self):
+        self.stats.clear()
+
+    def report(self) -> str:
+        if not self.stats:
+            return "Väntor: inga"
+        lines = [f"{'Vänta':<22} {'antal':>6} {'snitt':>9} {'förr':>9} {'max':>9} {'timeout':>8}"]
+        saved = 0.0
+        for name, s in sorted(self.stats.items(), key=lambda kv: -kv[1].legacy):
+            lines.append(f"{name:<22} {s.count:>6} {s.seconds / s.count * 1000:>7.0f}ms "
+                         f"{s.legacy / s.count * 1000:>7.0f}ms {s.longest * 1000:>7.0f}ms {s.timeouts:>8}")
+            saved += s.legacy - s.seconds
+        lines.append(f"Sparat mot fasta pauser: {saved:.1f} s")
+        return "\n".join(lines)
+
+
+CONFIG = WaitConfig()
+STATS = WaitStats()
+
+
+def wait_until(check: Callable[[], Any], name: str, timeout: Optional[float] = None,
+               poll: Optional[float] = None, legacy: float = 0.0,
+               sleep: Callable[[float], None] = time.sleep, required: bool = False) -> Any:
+    """
+    Pollar check() tills den ger ett sant värde, som returneras. Vid timeout
+    returneras None, eller WaitTimeout om required. legacy = den fasta paus
+    väntan ersätter (för STATS).
+    """
+    timeout = CONFIG.max_wait if timeout is None else timeout
+    poll = CONFIG.poll if poll is None else poll
+    t0 = time.perf_counter()
+    slept = 0.0
+    while True:
+        result = check()
+        if result:
+            STATS.record(name, time.perf_counter() - t0, legacy, True)
+            return result
+        if max(time.perf_counter() - t0, slept) >= timeout:
+            break
+        sleep(poll)
+        slept += poll
+    STATS.record(name, time.perf_counter() - t0, legacy, False)
+    if required:
+        raise WaitTimeout(f"Timeout efter {timeout:.1f} s: {name}")
+    return None
+
+
+# ---- Skärmkontroller (grab = rpa_capture-liknande grab(region))
+
+def changed(grab: Callable[..., np.ndarray], before: np.ndarray, region=None) -> Callable[[], bool]:
+    """Sann när rutan skiljer sig från before (en kopia tagen före handlingen)."""
+    def check() -> bool:
+        if not CONFIG.screen_probes:
+            return True
+        now = grab(region)
+        return now.shape != before.shape or not np.array_equal(now, before)
+    return check
+
+
+def settled(grab: Callable[..., np.ndarray], region=None) -> Callable[[], bool]:
+    """Sann när två grabs i rad av rutan är lika (appen har ritat klart)."""
+    last: List[Optional[np.ndarray]] = [None]
+
+    def check() -> bool:
+        if not CONFIG.screen_probes:
+            return True
+        now = grab(region)
+        prev, last[0] = last[0], now.copy()
+        return prev is not None and prev.shape == now.shape and np.array_equal(prev, now)
+    return check
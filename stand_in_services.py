@@ -0,0 +1,579 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Lokala HTTP-tjänster som står i för LIME, Elsmart och BFUS.
+
+BPA-demon anropar systemen som metodanrop i samma process. Här ligger samma
+"API" bakom riktiga HTTP-anrop (JSON, HTTP/1.1 keep-alive), med injicerad
+latens och felfrekvens, så att genomströmning kan mätas med nätverksrundor.
+
+- Tjänsterna är stdlib (ThreadingHTTPServer), en port per system.
+- Klientadaptrarna (LimeClient/ElsmartClient/BFUSClient) har samma api_*-metoder
+  som fönstren/headless-modellerna och kan ges direkt till BPAEngine.
+- Anslutningar återanvänds via ConnectionPool (keep-alive, en anslutning per
+  samtidigt anrop, återansluter om servern stängt).
+
+Kör:
+  python stand_in_services.py serve --latency-ms 20 --jitter-ms 5 --error-rate 0.01
+  python stand_in_services.py run --cases gen/10k/cases.jsonl --workers 8 --latency-ms 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import queue
+import random
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, quote, urlsplit
+
+from bfus_store import BFUSStore
+from bpa_demo_v2 import STEP_KEYS, BPAEngine, ELSMART_HTML, ElsmartSource, HeadlessLime
+from bpa_metrics import EngineMetrics
+from bpa_pipeline import QUEUE_SIZE, StagedExecutor, parse_stage_ints, pipeline, tally
+from bpa_profiling import StepProfiler, parse_steps
+
+
+HOST = "127.0.0.1"
+PORTS = {"lime": 8101, "elsmart": 8102, "bfus": 8103}
+
+
+class ServiceError(RuntimeError):
+    """Fel svar från en stand-in-tjänst (status >= 400)."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+
+
+# -----------------------------
+# Felinjektion
+# -----------------------------
+@dataclass
+class Faults:
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    seed: Optional[int] = None
+
+    def __post_init__(self):
+        self._rnd = random.Random(self.seed)
+        self._lock = threading.Lock()
+
+    def apply(self) -> bool:
+        """Väntar injicerad latens. Returnerar True om anropet ska misslyckas."""
+        with self._lock:
+            delay = self.latency_ms + (self._rnd.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0)
+            fail = self.error_rate > 0 and self._rnd.random() < self.error_rate
+        if delay > 0:
+            time.sleep(delay / 1000)
+        return fail
+
+
+# -----------------------------
+# Server
+# -----------------------------
+Route = Callable[[Dict, Dict[str, str]], object]  # (json-body, query) -> json-svar
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True  # headers och body skrivs separat – utan TCP_NODELAY väntar vi på delayed ACK
+    server: "StandInServer"
+
+    def _dispatch(self, method: str):
+        url = urlsplit(self.path)
+        route = self.server.routes.get((method, url.path))
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        if route is None:
+            return self._reply(404, {"error": f"okänd väg {method} {url.path}"})
+        if self.server.faults.apply():
+            return self._reply(503, {"error": "injicerat fel"})
+        try:
+            body = json.loads(raw) if raw else {}
+            query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            with self.server.lock:
+                result = route(body, query)
+        except (KeyError, ValueError, TypeError) as e:
+            return self._reply(400, {"error": str(e)})
+        self._reply(200, {} if result is None else result)
+
+    def _reply(self, status: int, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def log_message(self, format, *args):  # tyst – loggning per anrop förstör mätningen
+        pass
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, name: str, port: int, routes: Dict[Tuple[str, str], Route],
+                 faults: Optional[Faults] = None, host: str = HOST):
+        self.name = name
+        self.routes = routes
+        self.faults = faults or Faults()
+        self.lock = threading.Lock()  # modellerna är inte trådsäkra – ett anrop i taget mot state
+        super().__init__((host, port), _Handler)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StandInServer":
+        threading.Thread(target=self.serve_forever, name=f"{self.name}-http", daemon=True).start()
+        return self
+
+
+def lime_routes(max_cases: int = 65536) -> Dict[Tuple[str, str], Route]:
+    """
+    LIME: ett HeadlessLime per ärende (flera workers kör olika ärenden samtidigt).
+    Högst max_cases ärenden hålls (LRU, som Elsmart-sidorna) – en körning med
+    1M ärenden ska inte växa utan gräns. Taket ligger långt över antalet
+    ärenden som är i gång samtidigt (workers × kö/batch).
+    """
+    cases: "OrderedDict[str, HeadlessLime]" = OrderedDict()
+
+    def lime(case_id: str) -> HeadlessLime:
+        try:
+            cases.move_to_end(case_id)
+        except KeyError:
+            raise KeyError(f"okänt ärende: {case_id}") from None
+        return cases[case_id]
+
+    def load(body, q):
+        cases[body["case_id"]] = HeadlessLime(body)
+        cases.move_to_end(body["case_id"])
+        if len(cases) > max_cases:
+            cases.popitem(last=False)
+        return {"case_id": body["case_id"]}
+
+    def get(body, q):
+        return lime(q["case_id"]).api_get_case()
+
+    def status(body, q):
+        lime(body["case_id"]).api_set_status(body["status"], body.get("reason", ""))
+
+    def check(body, q):
+        lime(body["case_id"]).api_set_check_item(int(body["index"]), bool(body.get("done", True)))
+
+    def clear(body, q):
+        lime(body["case_id"]).api_clear_checklist()
+
+    def reset(body, q):
+        cases.clear()
+
+    return {
+        ("POST", "/case"): load,
+        ("GET", "/case"): get,
+        ("POST", "/status"): status,
+        ("POST", "/check"): check,
+        ("POST", "/checklist/clear"): clear,
+        ("POST", "/reset"): reset,
+    }
+
+
+def elsmart_routes(root: Path = ELSMART_HTML.parent, cache_size: int = 1024) -> Dict[Tuple[str, str], Route]:
+    """Elsmart: payload för en sida under root (?page=relativ/sökväg.html, default index.html)."""
+    root = root.resolve()
+    sources: "OrderedDict[str, ElsmartSource]" = OrderedDict()
+
+    def payload(body, q):
+        page = q.get("page") or "index.html"
+        src = sources.get(page)
+        if src is None:
+            path = (root / page).resolve()
+            if root not in path.parents or not path.is_file():
+                raise KeyError(f"sida saknas: {page}")
+            src = sources[page] = ElsmartSource(path)
+            if len(sources) > cache_size:
+                sources.popitem(last=False)
+        else:
+            sources.move_to_end(page)
+        return src.api_get_payload()
+
+    return {("GET", "/payload"): payload}
+
+
+def bfus_routes(store: Optional[BFUSStore] = None) -> Dict[Tuple[str, str], Route]:
+    store = store or BFUSStore()
+
+    def overview(body, q):
+        return store.update_overview(body["tjanstenr"], body["anlaggnings_id"], body["saking"])
+
+    def agreement(body, q):
+        return {"agreement_id": store.create_agreement(body)}
+
+    def overview_many(body, q):
+        return {"results": store.update_overview_many(body["items"])}
+
+    def agreements(body, q):
+        return {"results": store.create_agreements(body["items"])}
+
+    def reset(body, q):
+        store.reset()
+
+    return {
+        ("POST", "/overview"): overview,
+        ("POST", "/agreement"): agreement,
+        ("POST", "/overview/many"): overview_many,
+        ("POST", "/agreements"): agreements,
+        ("POST", "/reset"): reset,
+    }
+
+
+def start_services(faults: Optional[Faults] = None, elsmart_root: Optional[Path] = None,
+                   ports: Optional[Dict[str, int]] = None, host: str = HOST) -> Dict[str, StandInServer]:
+    """Startar alla tre tjänsterna i bakgrundstrådar. Port 0 = valfri ledig port."""
+    ports = {**PORTS, **(ports or {})}
+    routes = {
+        "lime": lime_routes(),
+        "elsmart": elsmart_routes(elsmart_root or ELSMART_HTML.parent),
+        "bfus": bfus_routes(),
+    }
+    return {name: StandInServer(name, ports[name], r, faults, host).start() for name, r in routes.items()}
+
+
+# -----------------------------
+# Klient: pool av keep-alive-anslutningar
+# -----------------------------
+class ConnectionPool:
+    """
+    Återanvänder HTTPConnection mellan anrop (keep-alive). Anslutningar lånas
+    ut en i taget; fler samtidiga anrop än maxsize öppnar tillfälliga extra.
+    """
+
+    def __init__(self, base_url: str, maxsize: int = 8, timeout: float = 10.0):
+        url = urlsplit(base_url)
+        self.host = url.hostname or HOST
+        self.port = url.port or 80
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[http.client.HTTPConnection]" = queue.LifoQueue(maxsize)
+
+    def _get(self) -> http.client.HTTPConnection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def _put(self, conn: http.client.HTTPConnection):
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def request(self, method: str, path: str, body: Optional[Dict] = None):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8") if body is not None else None
+        headers = {"Content-Type": "application/json"} if data is not None else {}
+        for attempt in (1, 2):
+            conn = self._get()
+            try:
+                conn.request(method, path, body=data, headers=headers)
+                resp = conn.getresponse()
+                raw = resp.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # Servern har stängt en vilande anslutning – försök en gång till med ny
+                conn.close()
+                if attempt == 2:
+                    raise
+                continue
+            if resp.will_close:
+                conn.close()
+            else:
+                self._put(conn)
+            payload = json.loads(raw) if raw else {}
+            if resp.status >= 400:
+                raise ServiceError(resp.status, payload.get("error", resp.reason))
+            return payload
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class LimeClient:
+    """Samma API som LimeWindow/HeadlessLime, mot LIME-tjänsten. Ett ärende per instans."""
+
+    def __init__(self, pool: ConnectionPool):
+        self.pool = pool
+        self.case_id = ""
+
+    def api_load_case(self, case: Dict[str, str]):
+        self.case_id = self.pool.request("POST", "/case", case)["case_id"]
+
+    def api_get_case(self) -> Dict[str, str]:
+        return self.pool.request("GET", f"/case?case_id={quote(self.case_id)}")
+
+    def api_set_status(self, status: str, reason: str = ""):
+        self.pool.request("POST", "/status", {"case_id": self.case_id, "status": status, "reason": reason})
+
+    def api_set_check_item(self, index: int, done: bool = True):
+        self.pool.request("POST", "/check", {"case_id": self.case_id, "index": index, "done": done})
+
+    def api_clear_checklist(self):
+        self.pool.request("POST", "/checklist/clear", {"case_id": self.case_id})
+
+    def api_reset(self):
+        self.pool.request("POST", "/reset", {})
+
+
+class ElsmartClient:
+    """Samma API som ElsmartWindow/ElsmartSource. page = sida relativt tjänstens rot."""
+
+    def __init__(self, pool: ConnectionPool, page: str = ""):
+        self.pool = pool
+        self.page = page
+
+    def api_refresh(self) -> bool:
+        return False  # tjänsten läser om sidan själv vid ändring
+
+    def api_get_payload(self) -> Dict[str, str]:
+        path = "/payload"
+        if self.page:
+            path += f"?page={quote(self.page)}"
+        return self.pool.request("GET", path)
+
+
+class BFUSClient:
+    """Samma API som BFUSWindow/HeadlessBFUS, mot BFUS-tjänsten."""
+
+    def __init__(self, pool: ConnectionPool):
+        self.pool = pool
+
+    def api_update_overview(self, tjanstenr: str, anlaggnings_id: str, saking: str):
+        self.pool.request("POST", "/overview",
+                          {"tjanstenr": tjanstenr, "anlaggnings_id": anlaggnings_id, "saking": saking})
+
+    def api_create_agreement(self, data: Dict[str, str]) -> str:
+        return self.pool.request("POST", "/agreement", data)["agreement_id"]
+
+    def api_update_overview_many(self, items: List[Dict[str, str]]) -> List[Dict]:
+        return self.pool.request("POST", "/overview/many", {"items": items})["results"]
+
+    def api_create_agreements(self, items: List[Dict[str, str]]) -> List[Dict]:
+        return self.pool.request("POST", "/agreements", {"items": items})["results"]
+
+    def api_reset(self):
+        self.pool.request("POST", "/reset", {})
+
+
+# -----------------------------
+# Genomströmningsmätning
+# -----------------------------
+def run_cases(cases, base_urls: Dict[str, str], workers: int = 4, batch_size: int = 1,
+              metrics: Optional[EngineMetrics] = None, profiler: Optional[StepProfiler] = None) -> Dict[str, float]:
+    """
+    Kör ärendena genom BPAEngine mot tjänsterna med `workers` trådar.
+    En motor per tråd; HTTP-anslutningarna delas via poolerna.
+    batch_size > 1: varje tråd tar de ärenden som redan väntar i kön (upp till
+    batch_size) och kör dem med engine.run_batch, dvs. BFUS-stegen som bulk-anrop.
+    metrics: varje tråd mäter i en egen EngineMetrics som slås ihop hit på slutet.
+    """
+    pools = {name: ConnectionPool(url, maxsize=workers) for name, url in base_urls.items()}
+    todo: "queue.Queue" = queue.Queue(maxsize=workers * max(4, batch_size))
+    counts = {"ok": 0, "parked": 0, "failed": 0}
+    lock = threading.Lock()
+
+    bind = _binder(pools)
+
+    def take() -> List[Dict]:
+        chunk = [todo.get()]
+        while chunk[-1] is not None and len(chunk) < batch_size:
+            try:
+                chunk.append(todo.get_nowait())
+            except queue.Empty:
+                break
+        return chunk
+
+    def worker():
+        lime, elsmart = LimeClient(pools["lime"]), ElsmartClient(pools["elsmart"])
+        local_metrics = EngineMetrics() if metrics is not None else None
+        engine = BPAEngine(lime, elsmart, BFUSClient(pools["bfus"]), log=lambda s: None, metrics=local_metrics,
+                           profiler=profiler)
+        while True:
+            chunk = take()
+            done = chunk[-1] is None
+            if done:
+                chunk.pop()
+            local = {"ok": 0, "parked": 0, "failed": 0}
+            if batch_size > 1:
+                seen = 0
+                try:
+                    for run in engine.run_batch(chunk, batch_size=batch_size, bind=bind):
+                        seen += 1
+                        local["failed" if run.error else "ok" if run.validated_ok else "parked"] += 1
+                except Exception:
+                    local["failed"] += len(chunk) - seen  # tråden lever vidare, resten av chunken räknas som fel
+            else:
+                for case in chunk:
+                    elsmart.page = case.get("elsmart", "")
+                    try:
+                        lime.api_load_case(case)
+                        engine.reset()
+                        for step in engine.steps():
+                            step.action()
+                        local["ok" if engine.validated_ok else "parked"] += 1
+                    except Exception:  # ServiceError/OSError, men även RuleError m.m. – tråden ska inte dö
+                        local["failed"] += 1
+            with lock:
+                for k, v in local.items():
+                    counts[k] += v
+            if done:
+                if local_metrics is not None:
+                    metrics.merge(local_metrics)
+                return
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(workers)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for case in cases:
+        todo.put(case)
+    for _ in threads:
+        todo.put(None)
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    for pool in pools.values():
+        pool.close()
+    total = sum(counts.values())
+    return {**counts, "cases": total, "seconds": elapsed, "cases_per_sec": total / elapsed if elapsed else 0.0}
+
+
+def _binder(pools: Dict[str, ConnectionPool]):
+    """bind(case) för run_batch/pipeline: laddar ärendet i LIME-tjänsten, klienter per ärende."""
+    def bind(case):
+        lime = LimeClient(pools["lime"])
+        lime.api_load_case(case)
+        return lime, ElsmartClient(pools["elsmart"], case.get("elsmart", ""))
+    return bind
+
+
+def run_pipeline(cases, base_urls: Dict[str, str], queue_size: int = QUEUE_SIZE,
+                 stage_workers: Optional[Dict[str, int]] = None, stage_queues: Optional[Dict[str, int]] = None,
+                 report_every: float = 0.0, metrics: Optional[EngineMetrics] = None,
+                 profiler: Optional[StepProfiler] = None) -> Dict[str, float]:
+    """
+    Som run_cases men med bpa_pipeline: en tråd per steg, begränsade köer mellan
+    stegen. Med stage_workers/stage_queues/report_every körs StagedExecutor
+    (trådpool och inkö per steg); max ködjup per steg hamnar i "max_depth".
+    """
+    stage_workers = stage_workers or {}
+    threads = len(STEP_KEYS) + 1 + sum(max(0, n - 1) for n in stage_workers.values())
+    pools = {name: ConnectionPool(url, maxsize=threads) for name, url in base_urls.items()}
+    engine = BPAEngine(LimeClient(pools["lime"]), ElsmartClient(pools["elsmart"]), BFUSClient(pools["bfus"]),
+                       log=lambda s: None, metrics=metrics, profiler=profiler)
+    if stage_workers or stage_queues or report_every:
+        executor = StagedExecutor(engine, bind=_binder(pools), workers=stage_workers, queue_size=queue_size,
+                                  queue_sizes=stage_queues)
+        stats = tally(executor.run(cases), executor, report_every)
+        stats["max_depth"] = {st.key: st.max_depth for st in executor.stats}
+    else:
+        stats = tally(pipeline(engine, cases, bind=_binder(pools), queue_size=queue_size))
+    for pool in pools.values():
+        pool.close()
+    return stats
+
+
+def _read_cases(path: Path, limit: int):
+    """cases.jsonl från case_generator.py; "elsmart" behålls relativt (tjänstens rot = filens katalog)."""
+    with path.open(encoding="utf-8") as f:
+        for n, line in enumerate(f):
+            if limit and n >= limit:
+                return
+            if line.strip():
+                yield json.loads(line)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="HTTP-stand-ins för LIME, Elsmart och BFUS")
+    ap.add_argument("command", choices=["serve", "run"])
+    ap.add_argument("--host", default=HOST)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--seed", type=int, default=None)
+    ap.add_argument("--cases", type=Path, default=None, help="cases.jsonl (run); default: demoärendet x --count")
+    ap.add_argument("--count", type=int, default=0, help="max antal ärenden (run)")
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--batch-size", type=int, default=1, help="> 1: BFUS-stegen som bulk-anrop (run_batch)")
+    ap.add_argument("--pipeline", action="store_true", help="en tråd per steg med köer emellan (bpa_pipeline)")
+    ap.add_argument("--queue-size", type=int, default=QUEUE_SIZE, help="kö mellan stegen (--pipeline)")
+    ap.add_argument("--stage-workers", type=parse_stage_ints, default={},
+                    help="trådar per steg (--pipeline), t.ex. create_agreement=4,update_bfus=2")
+    ap.add_argument("--stage-queues", type=parse_stage_ints, default={}, help="inkö per steg (--pipeline)")
+    ap.add_argument("--report-every", type=float, default=0.0, help="ködjup per steg var N:e sekund (--pipeline)")
+    ap.add_argument("--metrics-out", type=Path, default=None, help="latens per steg (.json eller Prometheus-text)")
+    ap.add_argument("--profile-steps", type=parse_steps, default=frozenset(), help="profilera dessa steg")
+    ap.add_argument("--profile-every", type=int, default=0, help="profilera alla steg i vart N:te ärende")
+    ap.add_argument("--profile-out", type=Path, default=Path("profiles"))
+    args = ap.parse_args()
+
+    faults = Faults(args.latency_ms, args.jitter_ms, args.error_rate, args.seed)
+
+    if args.command == "serve":
+        servers = start_services(faults, host=args.host)
+        for s in servers.values():
+            print(f"{s.name:<8} {s.base_url}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+        return
+
+    elsmart_root = args.cases.parent if args.cases else None
+    servers = start_services(faults, elsmart_root=elsmart_root, host=args.host,
+                             ports={name: 0 for name in PORTS})
+    if args.cases:
+        cases = _read_cases(args.cases, args.count)
+    else:
+        cases = ({"case_id": f"L-{n:07d}", "tjanstenr": str(400000 + n)} for n in range(args.count or 1000))
+    metrics = EngineMetrics() if args.metrics_out else None
+    profiler = None
+    if args.profile_steps or args.profile_every:
+        profiler = StepProfiler(args.profile_out, steps=args.profile_steps, every_nth=args.profile_every)
+    base_urls = {name: s.base_url for name, s in servers.items()}
+    if args.pipeline:
+        stats = run_pipeline(cases, base_urls, queue_size=args.queue_size, stage_workers=args.stage_workers,
+                             stage_queues=args.stage_queues, report_every=args.report_every,
+                             metrics=metrics, profiler=profiler)
+    else:
+        stats = run_cases(cases, base_urls, workers=args.workers, batch_size=args.batch_size,
+                          metrics=metrics, profiler=profiler)
+    for s in servers.values():
+        s.shutdown()
+    print(f"{stats['cases']} ärenden på {stats['seconds']:.2f} s = {stats['cases_per_sec']:.0f} ärenden/s "
+          f"(ok {stats['ok']}, parkerade {stats['parked']}, fel {stats['failed']})")
+    if "max_depth" in stats:
+        print("Max ködjup: " + "  ".join(f"{k} {v}" for k, v in stats["max_depth"].items()))
+    if metrics is not None:
+        metrics.export(args.metrics_out)
+        print(f"Mätvärden: {args.metrics_out}")
+
+
+if __name__ == "__main__":
+    main()
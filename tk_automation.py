@@ -0,0 +1,485 @@
+# -*- coding: utf-8 -*-
+"""
+Lokal automationssocket för Tk-klonerna (LIME/BFUS).
+
+Roboten hittar fält och knappar med template matching och skriver med
+tangentbordet – långsamt och känsligt för tema/DPI. Riktiga appar har ofta ett
+tillgänglighets-API (UIA/AT-SPI) som en robot kan använda i stället; här får
+klonerna en motsvarighet: en Unix-socket där en lokal klient kan lista
+namngivna widgets, läsa/sätta värden och trycka på knappar. Roboten använder
+den som snabbväg och faller tillbaka på bilder när socketen saknas.
+
+Namn:
+  - set_name(widget, "…") sätter ett namn explicit (t.ex. tabeller)
+  - knappar/kryssrutor heter som sin text ("✓ Pricka av" → "Pricka av")
+  - inmatningsfält heter som etiketten framför (pack) eller till vänster
+    (grid): "Tjänstenummer:" → "Tjänstenummer"
+  - widgets i ett Toplevel får fönstertiteln som prefix: "Sök tjänst/OK"
+  - dubbletter numreras: "Sök#2"
+
+Protokoll: en JSON-rad per anrop och svar.
+  {"op": "windows"}                      → {"ok": true, "windows": [...]}
+  {"op": "list"}                         → {"ok": true, "widgets": [{"name", "class", "value", ...}]}
+  {"op": "get", "name": "Tjänstenummer"} → {"ok": true, "value": "445323"}
+  {"op": "set", "name": "Säkring", "value": "16A"}   (combobox/listbox: värde eller index, tabell: radindex)
+  {"op": "invoke", "name": "Spara"}      → knappens kommando körs direkt efter svaret
+  {"op": "dialog"} / {"op": "dialog", "press": "ok"}  – Tk:s meddelanderuta (X11)
+  {"op": "close", "window": "Skapa avtal"}  → senast öppnade fönstret med titeln stängs
+Fel: {"ok": false, "error": "..."}.
+
+Allt Tk-arbete görs i huvudtråden via tk_bridge.UiBridge.call. Aktiveras med
+TK_AUTOMATION_SOCKET=<sökväg> eller TK_AUTOMATION_DIR=<katalog> (<app>.sock),
+se maybe_start(). Socketen är bara läsbar för den egna användaren.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import socket
+import socketserver
+import threading
+import time
+import tkinter as tk
+import weakref
+from pathlib import Path
+from tkinter import ttk
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from tk_bridge import UiBridge
+from tk_virtual_table import VirtualTable
+
+ENV_SOCKET = "TK_AUTOMATION_SOCKET"
+ENV_DIR = "TK_AUTOMATION_DIR"
+DIALOG = ".__tk__messagebox"  # Tk:s meddelanderuta på X11 (msgbox.tcl)
+ROWS_MAX = 50                 # rader per get på en tabell (offset/limit för fler)
+TIMEOUT_S = 5.0
+
+_names: "weakref.WeakKeyDictionary[tk.Misc, str]" = weakref.WeakKeyDictionary()
+
+
+class AutomationError(RuntimeError):
+    pass
+
+
+def set_name(widget: tk.Misc, name: str) -> tk.Misc:
+    """Explicit automationsnamn (utan fönsterprefix)."""
+    _names[widget] = name
+    return widget
+
+
+# ============================================================
+# Namn och värden (körs i huvudtråden)
+# ============================================================
+
+INPUTS = (ttk.Combobox, ttk.Entry, tk.Entry, ttk.Spinbox, tk.Spinbox, tk.Text, tk.Listbox)
+TOGGLES = (ttk.Checkbutton, tk.Checkbutton, ttk.Radiobutton, tk.Radiobutton)
+BUTTONS = (ttk.Button, tk.Button)
+LABELS = (ttk.Label, tk.Label)
+
+
+def _clean(text: str) -> str:
+    return re.sub(r"^\W+", "", str(text)).strip().rstrip(":").strip()
+
+
+def _label_for(w: tk.Misc) -> str:
+    """Etiketten som hör till ett inmatningsfält: till vänster i grid, närmast före i pack."""
+    try:
+        manager = w.winfo_manager()
+    except tk.TclError:
+        return ""
+    if manager == "grid":
+        info = w.grid_info()
+        row, col = int(info["row"]), int(info["column"])
+        if col > 0:
+            for s in w.master.grid_slaves(row=row, column=col - 1):
+                if isinstance(s, LABELS):
+                    return _clean(s.cget("text"))
+        return ""
+    siblings = w.master.winfo_children()
+    i = siblings.index(w)
+    if i > 0 and isinstance(siblings[i - 1], LABELS):
+        return _clean(siblings[i - 1].cget("text"))
+    return ""
+
+
+def _local_name(w: tk.Misc) -> str:
+    if w in _names:
+        return _names[w]
+    if isinstance(w, BUTTONS + TOGGLES):
+        return _clean(w.cget("text"))
+    if isinstance(w, INPUTS):
+        return _label_for(w)
+    return ""
+
+
+def _walk(parent: tk.Misc) -> Iterator[tk.Misc]:
+    for w in parent.winfo_children():
+        yield w
+        if not isinstance(w, VirtualTable):  # tabellen är ett löv för automationen
+            yield from _walk(w)
+
+
+def _disabled(w: tk.Misc) -> bool:
+    if isinstance(w, ttk.Widget):
+        return w.instate(["disabled"])
+    try:
+        return str(w.cget("state")) == "disabled"
+    except tk.TclError:
+        return False
+
+
+def _pick(value: Any, options: List[str]) -> int:
+    """Index för ett värde eller ett index (int) i en lista."""
+    if isinstance(value, int) and not isinstance(value, bool):
+        if not 0 <= value < len(options):
+            raise AutomationError(f"Index {value} utanför 0..{len(options) - 1}")
+        return value
+    try:
+        return options.index(str(value))
+    except ValueError:
+        raise AutomationError(f"Ogiltigt värde: {value!r}") from None
+
+
+def _get(w: tk.Misc, req: Dict[str, Any]) -> Any:
+    if isinstance(w, VirtualTable):
+        offset = int(req.get("offset", 0))
+        limit = int(req.get("limit", ROWS_MAX))
+        rows = w.rows
+        return {"columns": list(w.columns), "count": len(rows), "selected": w.selected_index(),
+                "rows": [list(rows[i]) for i in range(offset, min(len(rows), offset + limit))]}
+    if isinstance(w, tk.Listbox):
+        sel = w.curselection()
+        return {"items": list(w.get(0, "end")), "selected": sel[0] if sel else None}
+    if isinstance(w, tk.Text):
+        return w.get("1.0", "end-1c")
+    if isinstance(w, TOGGLES):
+        var = str(w.cget("variable"))
+        value = w.getvar(var) if var else ""
+        if isinstance(w, (ttk.Checkbutton, tk.Checkbutton)):
+            return str(value) == str(w.cget("onvalue"))
+        return str(value) == str(w.cget("value"))
+    if isinstance(w, INPUTS):
+        return w.get()
+    if isinstance(w, BUTTONS + LABELS):
+        return str(w.cget("text"))
+    return None
+
+
+def _set(w: tk.Misc, value: Any):
+    if _disabled(w):
+        raise AutomationError("Widgeten är inaktiv")
+    if isinstance(w, VirtualTable):
+        if value is not None and not (isinstance(value, int) and 0 <= value < len(w)):
+            raise AutomationError(f"Ogiltigt radindex: {value!r}")
+        w.select(value)
+    elif isinstance(w, tk.Listbox):
+        i = _pick(value, list(w.get(0, "end")))
+        w.selection_clear(0, "end")
+        w.selection_set(i)
+        w.activate(i)
+        w.see(i)
+        w.event_generate("<<ListboxSelect>>")
+    elif isinstance(w, ttk.Combobox):
+        values = list(w.tk.splitlist(w.cget("values")))
+        if str(w.cget("state")) == "readonly" or isinstance(value, int):
+            w.current(_pick(value, values))
+        else:
+            w.set(str(value))
+        w.event_generate("<<ComboboxSelected>>")
+    elif isinstance(w, tk.Text):
+        w.delete("1.0", "end")
+        w.insert("1.0", str(value))
+    elif isinstance(w, (ttk.Checkbutton, tk.Checkbutton)):
+        if _get(w, {}) != bool(value):
+            w.invoke()
+    elif isinstance(w, TOGGLES):
+        if value:
+            w.invoke()
+    elif isinstance(w, INPUTS):
+        readonly = str(w.cget("state")) == "readonly"
+        if readonly:
+            raise AutomationError("Fältet är skrivskyddat")
+        w.delete(0, "end")
+        w.insert(0, str(value))
+    else:
+        raise AutomationError(f"Kan inte sätta {w.winfo_class()}")
+
+
+def _kind(w: tk.Misc) -> str:
+    if isinstance(w, VirtualTable):
+        return "table"
+    return w.winfo_class()
+
+
+# ============================================================
+# Server
+# ============================================================
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        automation: AutomationServer = self.server.automation  # type: ignore[attr-defined]
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            closed = False
+            try:
+                resp = {"ok": True, **automation.bridge.call(automation.dispatch, json.loads(line))}
+            except (AutomationError, tk.TclError, ValueError, KeyError, TypeError) as e:
+                resp = {"ok": False, "error": str(e)}
+            except RuntimeError as e:  # fönstret har stängts
+                resp, closed = {"ok": False, "error": str(e)}, True
+            self.wfile.write((json.dumps(resp, ensure_ascii=False) + "\n").encode("utf-8"))
+            if closed:
+                return
+
+
+if hasattr(socketserver, "UnixStreamServer"):  # saknas på Windows → maybe_start() gör inget
+    class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+
+class AutomationServer:
+    """Serverar root-fönstrets widgets på en Unix-socket. Skapas i huvudtråden."""
+
+    def __init__(self, root: tk.Tk, path: Path):
+        self.root = root
+        self.path = Path(path)
+        self.bridge = UiBridge(root)
+        self._server: Optional[socketserver.BaseServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "AutomationServer":
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.path.exists():  # kvar från en tidigare process
+            self.path.unlink()
+        self._server = _Server(str(self.path), _Handler)
+        self._server.automation = self  # type: ignore[attr-defined]
+        os.chmod(self.path, 0o600)
+        self.bridge.start()
+        self._thread = threading.Thread(target=self._server.serve_forever, name="tk-automation", daemon=True)
+        self._thread.start()
+        self.root.bind("<Destroy>", self._on_destroy, add="+")
+        return self
+
+    def close(self):
+        self.bridge.close()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        try:
+            self.path.unlink()
+        except OSError:
+            pass
+
+    def _on_destroy(self, evt):
+        if evt.widget is self.root:
+            threading.Thread(target=self.close, daemon=True).start()  # shutdown väntar på serve_forever
+
+    # ---- Huvudtråden
+    def widgets(self) -> Dict[str, tk.Misc]:
+        found: Dict[str, tk.Misc] = {}
+        for w in _walk(self.root):
+            local = _local_name(w)
+            if not local:
+                continue
+            top = w.winfo_toplevel()
+            name = local if top is self.root else f"{top.title()}/{local}"
+            unique, n = name, 1
+            while unique in found:
+                n += 1
+                unique = f"{name}#{n}"
+            found[unique] = w
+        return found
+
+    def windows(self) -> List[str]:
+        titles = [self.root.title()]
+        titles += [w.title() for w in _walk(self.root) if isinstance(w, tk.Toplevel)]
+        dialog = self._dialog()
+        if dialog is not None:
+            titles.append(dialog["title"])
+        return titles
+
+    def _widget(self, name: str) -> tk.Misc:
+        w = self.widgets().get(name)
+        if w is None:
+            raise AutomationError(f"Okänt namn: {name}")
+        return w
+
+    def _dialog(self) -> Optional[Dict[str, Any]]:
+        tk_ = self.root.tk
+        if not int(tk_.call("winfo", "exists", DIALOG)):
+            return None
+        buttons = [str(c).rsplit(".", 1)[-1] for c in tk_.splitlist(tk_.call("winfo", "children", DIALOG))
+                   if tk_.call("winfo", "class", c) in ("Button", "TButton")]
+        message = tk_.call(f"{DIALOG}.msg", "cget", "-text") if int(tk_.call("winfo", "exists", f"{DIALOG}.msg")) else ""
+        return {"title": str(tk_.call("wm", "title", DIALOG)), "message": str(message), "buttons": buttons}
+
+    def dispatch(self, req: Dict[str, Any]) -> Dict[str, Any]:
+        op = req.get("op")
+        if op == "windows":
+            return {"windows": self.windows()}
+        if op == "list":
+            return {"widgets": [{"name": name, "class": _kind(w), "window": w.winfo_toplevel().title(),
+                                 "visible": bool(w.winfo_viewable()), "enabled": not _disabled(w),
+                                 "value": _get(w, {"limit": 0})}
+                                for name, w in self.widgets().items()]}
+        if op == "get":
+            return {"value": _get(self._widget(req["name"]), req)}
+        if op == "set":
+            _set(self._widget(req["name"]), req.get("value"))
+            return {}
+        if op == "invoke":
+            w = self._widget(req["name"])
+            if not isinstance(w, BUTTONS + TOGGLES):
+                raise AutomationError(f"{req['name']} är ingen knapp")
+            if _disabled(w):
+                raise AutomationError(f"{req['name']} är inaktiv")
+            # Efter svaret: kommandot kan öppna en modal ruta som kör en egen händelseloop
+            w.after_idle(w.invoke)
+            return {}
+        if op == "dialog":
+            dialog = self._dialog()
+            press = req.get("press")
+            if press:
+                if dialog is None or press not in dialog["buttons"]:
+                    raise AutomationError(f"Ingen dialogknapp {press!r}")
+                self.root.after_idle(lambda: self.root.tk.call(f"{DIALOG}.{press}", "invoke"))
+            return {"dialog": dialog}
+        if op == "close":
+            self._close(req["window"])
+            return {}
+        raise AutomationError(f"Okänd operation: {op!r}")
+
+    def _close(self, title: str):
+        dialog = self._dialog()
+        if dialog is not None and dialog["title"] == title:
+            self.root.tk.call("destroy", DIALOG)  # msgbox.tcl svarar som på Avbryt
+            return
+        tops = [w for w in _walk(self.root) if isinstance(w, tk.Toplevel) and w.title() == title]
+        if not tops:
+            raise AutomationError(f"Inget fönster {title!r}")
+        tops[-1].destroy()
+
+
+def socket_path(app: str, path: Optional[Path] = None) -> Optional[Path]:
+    """Explicit sökväg, annars TK_AUTOMATION_SOCKET eller TK_AUTOMATION_DIR/<app>.sock."""
+    if path:
+        return Path(path)
+    if os.environ.get(ENV_SOCKET):
+        return Path(os.environ[ENV_SOCKET])
+    if os.environ.get(ENV_DIR):
+        return Path(os.environ[ENV_DIR]) / f"{app}.sock"
+    return None
+
+
+def maybe_start(root: tk.Tk, app: str, path: Optional[Path] = None) -> Optional[AutomationServer]:
+    """Startar socketen om en sökväg är konfigurerad (och plattformen har Unix-socketar)."""
+    path = socket_path(app, path)
+    if path is None or not hasattr(socketserver, "UnixStreamServer"):
+        return None
+    return AutomationServer(root, path).start()
+
+
+# ============================================================
+# Klient (roboten)
+# ============================================================
+
+class AutomationClient:
+    def __init__(self, path: Path, timeout: float = TIMEOUT_S):
+        self.path = Path(path)
+        self.timeout = timeout
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(timeout)
+        self._sock.connect(str(self.path))
+        self._file = self._sock.makefile("rwb")
+        self.invoked: List[str] = []  # knappar som tryckts via invoke, i ordning
+
+    @classmethod
+    def connect(cls, path: Optional[Path], timeout: float = TIMEOUT_S) -> Optional["AutomationClient"]:
+        """None om socketen saknas eller ingen lyssnar (appen startad utan automation)."""
+        if path is None or not hasattr(socket, "AF_UNIX") or not Path(path).exists():
+            return None
+        try:
+            return cls(path, timeout)
+        except OSError:
+            return None
+
+    def close(self):
+        try:
+            self._file.close()
+            self._sock.close()
+        except OSError:
+            pass
+
+    def request(self, op: str, **kwargs) -> Dict[str, Any]:
+        self._file.write((json.dumps({"op": op, **kwargs}, ensure_ascii=False) + "\n").encode("utf-8"))
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            raise AutomationError("Automationssocketen stängdes")
+        resp = json.loads(line)
+        if not resp.pop("ok", False):
+            raise AutomationError(resp.get("error", "okänt fel"))
+        return resp
+
+    # ---- Bekvämlighet
+    def windows(self) -> List[str]:
+        return self.request("windows")["windows"]
+
+    def list(self) -> List[Dict[str, Any]]:
+        return self.request("list")["widgets"]
+
+    def get(self, name: str, **kwargs) -> Any:
+        return self.request("get", name=name, **kwargs)["value"]
+
+    def set(self, name: str, value: Any):
+        self.request("set", name=name, value=value)
+
+    def invoke(self, name: str):
+        self.request("invoke", name=name)
+        self.invoked.append(name)
+
+    def close_window(self, title: str):
+        self.request("close", window=title)
+
+    def wait(self, check: Callable[[], Any], what: str, timeout: Optional[float] = None, poll: float = 0.05) -> Any:
+        """Pollar check() tills den ger ett sant värde; AutomationError vid timeout."""
+        end_time = time.time() + (self.timeout if timeout is None else timeout)
+        while True:
+            result = check()
+            if result:
+                return result
+            if time.time() > end_time:
+                raise AutomationError(f"Timeout: {what}")
+            time.sleep(poll)
+
+    def wait_window(self, title: str, timeout: Optional[float] = None):
+        self.wait(lambda: title in self.windows(), f"fönstret {title!r}", timeout)
+
+    def press_dialog(self, button: str = "ok", timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Väntar in Tk:s meddelanderuta och trycker på en knapp; returnerar rutans innehåll."""
+        dialog = self.wait(lambda: self.request("dialog")["dialog"], "meddelanderuta", timeout)
+        self.request("dialog", press=button)
+        return dialog
+
+
+def main():
+    """Listar widgets i en körande klon: python tk_automation.py <socket>"""
+    import sys
+    if len(sys.argv) != 2:
+        raise SystemExit("Användning: python tk_automation.py <socket>")
+    client = AutomationClient.connect(Path(sys.argv[1]))
+    if client is None:
+        raise SystemExit(f"Ingen automationssocket på {sys.argv[1]}")
+    print("Fönster:", ", ".join(client.windows()))
+    for w in client.list():
+        flags = "" if w["enabled"] else " (inaktiv)"
+        print(f"  {w['name']:<40} {w['class']:<12} {w['value']!r}{flags}")
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
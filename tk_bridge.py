@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+Trådsäker brygga mellan bakgrundstrådar och Tk-huvudtråden.
+
+Tk får bara anropas från huvudtråden. UiBridge låter en arbetstråd:
+- posta händelser (post) som huvudtråden hanterar i en enda periodisk
+  after()-poll (~60 Hz). Per poll slås händelser av samma slag ihop:
+  "batch"-hanterare får alla på en gång (t.ex. loggrader → en insert-runda),
+  "latest"-hanterare bara den senaste (t.ex. progress).
+- anropa funktioner i huvudtråden och vänta på svaret (call). MainThreadProxy
+  gör det för alla api_*-metoder på ett fönster, så att BPAEngine kan köra i
+  en tråd mot LimeWindow/BFUSWindow utan att röra Tk själv.
+
+Varje poll har en tidsbudget; hinner den inte tömma kön tas resten nästa
+varv, så en flod av händelser inte fryser fönstren.
+"""
+
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+FRAME_MS = 16      # ~60 bilder/s
+BUDGET_MS = 8      # max tid per poll för att hantera händelser
+
+
+class _Call:
+    __slots__ = ("fn", "args", "kwargs", "done", "result", "error")
+
+    def __init__(self, fn: Callable, args: Tuple, kwargs: Dict):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class UiBridge:
+    def __init__(self, widget, frame_ms: int = FRAME_MS, budget_ms: int = BUDGET_MS):
+        self.widget = widget
+        self.frame_ms = frame_ms
+        self.budget_s = budget_ms / 1000
+        self._events: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._handlers: Dict[str, Tuple[Callable, str]] = {}
+        self._main = threading.get_ident()
+        self._closed = threading.Event()
+        self._after = None
+
+    def on(self, kind: str, handler: Callable, mode: str = "each"):
+        """
+        mode="each":   handler(*args) per händelse
+        mode="batch":  handler([args, ...]) en gång per poll
+        mode="latest": handler(*args) en gång per poll, med senaste händelsen
+        """
+        if mode not in ("each", "batch", "latest"):
+            raise ValueError(f"Okänt läge: {mode}")
+        self._handlers[kind] = (handler, mode)
+
+    # ---- Från valfri tråd
+    def post(self, kind: str, *args):
+        self._events.put((kind, args))
+
+    def call(self, fn: Callable, *args, **kwargs):
+        """Kör fn i huvudtråden och returnerar resultatet (eller kastar dess fel)."""
+        if threading.get_ident() == self._main:
+            return fn(*args, **kwargs)
+        c = _Call(fn, args, kwargs)
+        self._events.put(("__call__", c))
+        while not c.done.wait(0.1):
+            if self._closed.is_set():
+                raise RuntimeError("Fönstret är stängt")
+        if c.error is not None:
+            raise c.error
+        return c.result
+
+    # ---- Huvudtråden
+    def start(self):
+        if self._after is None:
+            self._after = self.widget.after(self.frame_ms, self._poll)
+
+    def close(self):
+        self._closed.set()
+        if self._after is not None:
+            self.widget.after_cancel(self._after)
+            self._after = None
+
+    def _poll(self):
+        self._after = None
+        if not self.widget.winfo_exists():
+            self._closed.set()
+            return
+        deadline = time.perf_counter() + self.budget_s
+        batches: Dict[str, List] = {}
+        latest: Dict[str, Tuple] = {}
+        while time.perf_counter() < deadline:
+            try:
+                kind, args = self._events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "__call__":
+                # Anrop körs direkt, i ordning med övriga händelser från samma tråd
+                self._flush(batches, latest)
+                self._run_call(args)
+                continue
+            handler, mode = self._handlers.get(kind, (None, "each"))
+            if handler is None:
+                continue
+            if mode == "batch":
+                batches.setdefault(kind, []).append(args)
+            elif mode == "latest":
+                latest[kind] = args
+            else:
+                self._flush(batches, latest)
+                handler(*args)
+        self._flush(batches, latest)
+        self._after = self.widget.after(self.frame_ms, self._poll)
+
+    def _flush(self, batches: Dict[str, List], latest: Dict[str, Tuple]):
+        for kind, items in batches.items():
+            self._handlers[kind][0](items)
+        for kind, args in latest.items():
+            self._handlers[kind][0](*args)
+        batches.clear()
+        latest.clear()
+
+    @staticmethod
+    def _run_call(c: _Call):
+        try:
+            c.result = c.fn(*c.args, **c.kwargs)
+        except BaseException as e:
+            c.error = e
+        finally:
+            c.done.set()
+
+
+class MainThreadProxy:
+    """Omsluter ett Tk-fönster: api_*-metoder körs i huvudtråden via bridge.call."""
+
+    def __init__(self, target, bridge: UiBridge):
+        self._target = target
+        self._bridge = bridge
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._target, name)
+        if not (name.startswith("api_") and callable(attr)):
+            return attr
+        bridge = self._bridge
+
+        def call(*args, **kwargs):
+            return bridge.call(attr, *args, **kwargs)
+        return call
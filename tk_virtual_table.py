@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+Virtualiserad tabell (ttk.Treeview) för stora resultatmängder.
+
+En vanlig Treeview får ett item per rad – med 100k+ rader tar insert/delete
+sekunder och fryser Tk-loopen. VirtualTable håller i stället bara så många
+Treeview-items ("slots") som syns och skriver om deras värden från en
+bakomliggande sekvens när man scrollar. Kostnaden per scroll/uppdatering är
+därmed O(synliga rader), oavsett hur lång sekvensen är.
+
+Bakomliggande sekvens: allt som har __len__ och __getitem__ (list, lazy vy).
+append() lägger till via sekvensens extend().
+"""
+
+from __future__ import annotations
+
+from tkinter import ttk
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+
+class VirtualTable(ttk.Frame):
+    def __init__(self, master, columns: Sequence[str], height: int = 12,
+                 widths: Optional[Dict[str, int]] = None, default_width: int = 120,
+                 rows: Optional[Sequence] = None):
+        super().__init__(master)
+        self.columns = tuple(columns)
+
+        self.tree = ttk.Treeview(self, columns=self.columns, show="headings",
+                                 height=height, selectmode="browse")
+        for c in self.columns:
+            self.tree.heading(c, text=c)
+            self.tree.column(c, width=(widths or {}).get(c, default_width), anchor="w")
+        self.tree.pack(side="left", fill="both", expand=True)
+
+        self.ysb = ttk.Scrollbar(self, orient="vertical", command=self._on_scrollbar)
+        self.ysb.pack(side="right", fill="y")
+
+        self._rows: Sequence = rows if rows is not None else []
+        self._offset = 0
+        self._slots: List[str] = []
+        self._attached = 0
+        self._visible = height
+        self._selected: Optional[int] = None
+        self._on_select: List[Callable[[], None]] = []
+
+        self._ensure_slots(height)
+
+        self.tree.bind("<Configure>", self._on_configure)
+        self.tree.bind("<<TreeviewSelect>>", self._on_tree_select)
+        self.tree.bind("<MouseWheel>", self._on_wheel)
+        self.tree.bind("<Button-4>", lambda e: self._scroll_units(-3))
+        self.tree.bind("<Button-5>", lambda e: self._scroll_units(3))
+        self.tree.bind("<Up>", lambda e: self._move_selection(-1))
+        self.tree.bind("<Down>", lambda e: self._move_selection(1))
+        self.tree.bind("<Prior>", lambda e: self._move_selection(-self._visible))
+        self.tree.bind("<Next>", lambda e: self._move_selection(self._visible))
+        self.tree.bind("<Home>", lambda e: self._move_selection(-len(self._rows)))
+        self.tree.bind("<End>", lambda e: self._move_selection(len(self._rows)))
+
+        self._render()
+
+    # ---- data API
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @property
+    def rows(self) -> Sequence:
+        return self._rows
+
+    def set_rows(self, rows: Sequence):
+        """Byter bakomliggande sekvens (ingen kopia) och scrollar till toppen."""
+        self._rows = rows
+        self._offset = 0
+        self._selected = None
+        self._render()
+
+    def clear(self):
+        self.set_rows([])
+
+    def append(self, items: Iterable, follow: bool = False):
+        """
+        Lägger till rader i slutet. Ritar bara om när de nya raderna hamnar i det
+        synliga fönstret (eller om follow=True, då scrollar vi till slutet).
+        """
+        old_len = len(self._rows)
+        self._rows.extend(items)  # type: ignore[attr-defined]
+        if follow:
+            self.see(len(self._rows) - 1)
+        elif old_len < self._offset + self._visible:
+            self._render()
+        else:
+            self._update_scrollbar()
+
+    def set_cell(self, index: int, column: str, value: str):
+        """
+        Uppdaterar en cell. Sekvensen måste stödja __setitem__; Treeview rörs
+        bara om raden syns just nu (annars ritas den vid nästa scroll).
+        """
+        col = self.columns.index(column)
+        row = list(self._rows[index])
+        row[col] = value
+        self._rows[index] = tuple(row)  # type: ignore[index]
+        if self._offset <= index < self._offset + self._attached:
+            self.tree.set(self._slots[index - self._offset], column, value)
+
+    def refresh(self):
+        """Ritar om synliga rader (t.ex. efter att sekvensen ändrats på plats)."""
+        self._render()
+
+    def see(self, index: int):
+        if index < self._offset:
+            self._offset = index
+        elif index >= self._offset + self._visible:
+            self._offset = index - self._visible + 1
+        self._clamp_offset()
+        self._render()
+
+    # ---- selection API
+    def selected_index(self) -> Optional[int]:
+        return self._selected
+
+    def selected_values(self) -> Optional[Sequence[str]]:
+        if self._selected is None or self._selected >= len(self._rows):
+            return None
+        return self._rows[self._selected]
+
+    def select(self, index: Optional[int]):
+        if index is not None and not (0 <= index < len(self._rows)):
+            index = None
+        self._selected = index
+        if index is not None:
+            self.see(index)
+        else:
+            self._render()
+        self._fire_select()
+
+    def bind_select(self, callback: Callable[[], None]):
+        self._on_select.append(callback)
+
+    # ---- rendering
+    def _ensure_slots(self, n: int):
+        # Nya slots skapas frånkopplade; _render kopplar in dem i ordning vid behov
+        while len(self._slots) < n:
+            slot = self.tree.insert("", "end", values=())
+            self.tree.detach(slot)
+            self._slots.append(slot)
+
+    def _clamp_offset(self):
+        max_off = max(0, len(self._rows) - self._visible)
+        self._offset = min(max(0, self._offset), max_off)
+
+    def _render(self):
+        self._clamp_offset()
+        n = len(self._rows)
+        shown = max(0, min(self._visible, n - self._offset))
+
+        for i in range(shown):
+            self.tree.item(self._slots[i], values=tuple(self._rows[self._offset + i]))
+
+        # Koppla loss slots som inte används (hellre än att radera/skapa om dem)
+        if shown < self._attached:
+            self.tree.detach(*self._slots[shown:self._attached])
+        elif shown > self._attached:
+            for i in range(self._attached, shown):
+                self.tree.move(self._slots[i], "", i)
+        self._attached = shown
+
+        sel = self._selected
+        if sel is not None and self._offset <= sel < self._offset + shown:
+            slot = self._slots[sel - self._offset]
+            if self.tree.selection() != (slot,):
+                self.tree.selection_set(slot)
+                self.tree.focus(slot)
+        elif self.tree.selection():
+            self.tree.selection_remove(*self.tree.selection())
+
+        self._update_scrollbar()
+
+    def _update_scrollbar(self):
+        n = len(self._rows)
+        if n <= self._visible:
+            self.ysb.set(0.0, 1.0)
+        else:
+            self.ysb.set(self._offset / n, (self._offset + self._visible) / n)
+
+    def _rows_that_fit(self) -> int:
+        height = self.tree.winfo_height()
+        if height <= 1:
+            return self._visible
+        rowheight = ttk.Style(self).lookup("Treeview", "rowheight") or 20
+        try:
+            rowheight = int(rowheight)
+        except (TypeError, ValueError):
+            rowheight = 20
+        header = rowheight  # rubrikraden ≈ en rad tills vi kan mäta den
+        if self._attached:
+            bbox = self.tree.bbox(self._slots[0])
+            if bbox:
+                header = bbox[1]
+        return max(1, (height - header) // max(1, rowheight))
+
+    # ---- events
+    def _on_configure(self, _evt=None):
+        fit = self._rows_that_fit()
+        if fit != self._visible:
+            self._visible = fit
+            self._ensure_slots(fit)
+            self._render()
+
+    def _on_tree_select(self, _evt=None):
+        sel = self.tree.selection()
+        if not sel:
+            # programmatisk avmarkering när vald rad scrollats ur bild – behåll valet
+            return
+        try:
+            slot_index = self._slots.index(sel[0])
+        except ValueError:
+            return
+        index = self._offset + slot_index
+        if index != self._selected:
+            self._selected = index
+            self._fire_select()
+
+    def _fire_select(self):
+        for cb in self._on_select:
+            cb()
+
+    def _on_scrollbar(self, *args):
+        if not args:
+            return
+        if args[0] == "moveto":
+            self._offset = int(float(args[1]) * len(self._rows))
+            self._clamp_offset()
+            self._render()
+        elif args[0] == "scroll":
+            step = int(args[1])
+            if len(args) > 2 and args[2] == "pages":
+                step *= self._visible
+            self._scroll_units(step)
+
+    def _on_wheel(self, evt):
+        self._scroll_units(-3 if evt.delta > 0 else 3)
+        return "break"
+
+    def _scroll_units(self, step: int):
+        self._offset += step
+        self._clamp_offset()
+        self._render()
+        return "break"
+
+    def _move_selection(self, step: int):
+        n = len(self._rows)
+        if not n:
+            return "break"
+        cur = self._selected if self._selected is not None else (self._offset - 1 if step > 0 else self._offset)
+        self.select(min(max(0, cur + step), n - 1))
+        return "break"